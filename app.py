@@ -7,11 +7,22 @@ import numpy as np
 import altair as alt
 import streamlit as st
 import pydeck as pdk
-from sklearn.metrics import accuracy_score, confusion_matrix
 import streamlit as st
-from simulate_alerts import simulate_future_prediction
 from get_weather import get_weather_data
 from blood_forecaster import BloodDemandForecaster
+from blood_expiry import expiry_frame, fefo_sort
+from history_cube import HistoryCube
+from orange_io import read_orange_csv
+from filter_index import FilterIndex
+from dataset_profile import DatasetProfile, dataset_key
+from metrics_engine import ModelMetrics
+from geo_grid import GeoGrid, cell_for_zoom, RAW_ZOOM, RAW_POINT_LIMIT
+from assignment import AssignmentEngine, DEFAULT_CAPACITY
+from geo_cost import GeoCostCache, eta_hours
+from shelter_allocation import allocate_shelters
+from deployment import recommend_deployments, deployment_summary, OPEN_STATUSES
+from prepositioning import plan_prepositioning, incident_demand
+from thresholds import DEFAULT_THRESHOLDS, WARNING, CRITICAL
 
 try:
     import joblib  # optional (only needed if you place a trained model)
@@ -28,17 +39,24 @@ from db import (
     # notifications
     add_notification, list_notifications, mark_all_read,
     # cases
-    create_case, list_cases, assign_case, update_case_status, get_case,
+    create_case, list_cases, assign_case, update_case_status, get_case, place_cases_in_shelters,
     # shelters
     list_shelters, create_shelter, update_shelter, delete_shelter, _next_numeric_id,
     # blood & resources
     read_blood_df, write_blood_df, read_resources_df, write_resources_df,
+    # stock ledger
+    STOCK_ITEMS, record_stock_movements, list_stock_movements, stock_rollup, stock_burn_rates,
+    # alert thresholds
+    list_thresholds, set_threshold, delete_threshold, refresh_alert_states,
+    current_resource_alerts, current_blood_alerts,
     # blood via DB helpers
-    list_blood, create_blood, update_blood, delete_blood,
+    create_blood, update_blood, delete_blood, blood_burn_rates,
     # Ops Planner + Audit
     write_preposition_plan, list_preposition_plans, list_audit,
     # Contact messages
-    create_contact_message, list_contact_messages
+    create_contact_message, list_contact_messages,
+    # Alert store
+    query_alerts, count_alerts, alert_level_counts, import_alert_csvs
 )
 
 # ---------------- Bootstraps & constants ----------------
@@ -62,6 +80,13 @@ st.set_page_config(page_title="AidBot — Disaster Response Dashboard", page_ico
 inject_theme()
 add_scroll_to_top_button()
 
+@st.cache_resource(show_spinner=False)
+def _daily_alert_refresh(day: str) -> int:
+    """Re-check alert states once per day: blood expiry moves with the date, not only with edits."""
+    return refresh_alert_states()
+
+_daily_alert_refresh(dt.date.today().isoformat())
+
 # === UI helpers (styling + compact tables & pagination) ======================
 st.markdown("""
 <style>
@@ -919,7 +944,9 @@ def _shelters_map_pydeck(shelters_df: pd.DataFrame):
     if shelters_df.empty:
         st.caption("No shelters to display.")
         return
+    # Only what the layer and tooltip use goes to the browser
     df = shelters_df.rename(columns={"latitude":"lat","longitude":"lon"})
+    df = df[[c for c in ("name", "capacity", "available", "lat", "lon") if c in df.columns]]
     df = df.dropna(subset=["lat","lon"])
     if df.empty:
         st.info("Shelters map: no coordinates found. Edit a shelter and add Latitude/Longitude to show pins.")
@@ -1185,6 +1212,23 @@ def _notify_admins_and_coords(msg: str):
     for adm in list_users("admin"):
         add_notification(adm["user_id"], msg)
 
+@st.cache_resource(show_spinner=False)
+def _geo_costs():
+    """Process-wide distance cache shared by the case cards' shelter lookup and the assignment engine."""
+    return GeoCostCache()
+
+def _nearest_shelters(cases: list, all_cases: list, k: int = 3) -> dict:
+    """case_id -> [(shelter, km)] for the nearest shelters with free places.
+    The cache's case set mirrors all_cases, so closed or deleted cases drop out of it."""
+    geo = _geo_costs()
+    shelters = list_shelters()
+    free = {s["shelter_id"]: s for s in shelters if (s.get("available") or 0) > 0}
+    with geo.lock:
+        geo.sync_records("shelters", shelters, "shelter_id")
+        geo.sync_records("cases", all_cases, "case_id")
+        near = geo.nearest("cases", "shelters", k=k, a_ids=[c["case_id"] for c in cases], b_ids=list(free))
+    return {cid: [(free[sid], float(km)) for sid, km in zip(ids, kms)] for cid, (ids, kms) in near.items()}
+
 def _cases_table(cases: list, volunteer: bool, admin_mode: bool=False, focus_case_id: str | None = None):
     lang = st.session_state.get("lang", "en")
     if not cases:
@@ -1207,6 +1251,7 @@ def _cases_table(cases: list, volunteer: bool, admin_mode: bool=False, focus_cas
     
     vol_list = list_volunteers()
     vol_map = {v["user_id"]: v["username"] for v in vol_list}
+    nearest = _nearest_shelters(page_cases, cases) if not volunteer else {}
     
     active_id = st.session_state.get("active_case_id")
     for c in page_cases:
@@ -1221,6 +1266,10 @@ def _cases_table(cases: list, volunteer: bool, admin_mode: bool=False, focus_cas
                 assignee_id = c.get('assigned_to')
                 st.write(f"Assigned to: {vol_map.get(assignee_id, '—')}")
                 st.write(f"Shelter: {c.get('shelter_id') or '—'}")
+                if nearest.get(cid):
+                    st.caption("Nearest open shelters: " + ", ".join(
+                        f"{s['name']} ({s['shelter_id']}) {km:.0f} km / ~{eta_hours(km):.1f} h"
+                        for s, km in nearest[cid]))
             with cols[2]:
                 st.write(f"*Coords:* {c.get('latitude','')} , {c.get('longitude','')}")
                 try:
@@ -1262,9 +1311,12 @@ def _cases_table(cases: list, volunteer: bool, admin_mode: bool=False, focus_cas
                         if sel_assign != "(none)":
                             uid = sel_assign.split("|", 1)[1].strip()
                             add_notification(uid, f"You have been assigned to case {cid}.")
-                        assign_case(cid, uid, shelter_id=shel_input or None)
+                        placed = assign_case(cid, uid, shelter_id=shel_input or None)
                         _notify_admins_and_coords(f"Case {cid} assignment updated.")
-                        st.success("Assignment updated successfully!")
+                        if placed:
+                            st.success("Assignment updated successfully!")
+                        else:
+                            st.warning(f"Volunteer updated, but shelter {shel_input} has no free places (or does not exist).")
                         st.session_state["active_case_id"] = cid
                         st.rerun()
 
@@ -1593,18 +1645,13 @@ def shelters_admin():
         _shelters_map_pydeck(pd.DataFrame(shel))
 
 # ---------- Blood (ENHANCED WITH FORECASTING - FILTER FIX) ----------
-def _expiry_status(expires_str: str) -> tuple[str, str]:
-    """Helper function for blood expiry status"""
-    if not (expires_str or "").strip():
-        return ("—", "#6b7280")
-    try:
-        d = dt.datetime.strptime(expires_str, "%Y-%m-%d").date()
-        days = (d - dt.date.today()).days
-        if days < 0:  return ("Expired", "#b91c1c")
-        if days <= 7: return ("Expires soon", "#b45309")
-        return (f"In {days} days", "#065f46")
-    except Exception:
-        return ("Invalid date", "#6b7280")
+@st.cache_data(show_spinner=False)
+def _blood_expiry_view(inventory: pd.DataFrame, today: dt.date) -> pd.DataFrame:
+    """Parse expiry dates once per inventory snapshot/day; shared by all blood tabs."""
+    if inventory.empty:
+        return expiry_frame(pd.DataFrame(columns=["id","Region","Country","BloodType","Units","ExpiresOn"]), today)
+    base = inventory.sort_values(["Country","Region","BloodType"], kind="stable").reset_index(drop=True)
+    return expiry_frame(base, today)
 
 
 def blood_tab_enhanced(role: str):
@@ -1634,6 +1681,10 @@ def blood_tab_enhanced(role: str):
             #st.write(f"**Disaster Types:** {selected_types}")
             #st.write(f"**Year Range:** {year_range}")
     
+    # One expiry computation per render, reused by inventory / alerts / matching
+    inventory = read_blood_df()
+    expiry = _blood_expiry_view(inventory, dt.date.today())
+
     # Create tabs for different blood management views
     tabs = st.tabs([
         "📦 Current Inventory",
@@ -1691,42 +1742,25 @@ def blood_tab_enhanced(role: str):
                 st.rerun()
         
         # Display inventory
-        rows = list_blood()
+        view = expiry
         
         # Apply search filter
         if search_query.strip():
             q = search_query.lower()
-            rows = [r for r in rows if (
-                q in (r.get("Region") or "").lower() or
-                q in (r.get("Country") or "").lower() or
-                q in (r.get("BloodType") or "").lower() or
-                q in (r.get("id") or "").lower()
-            )]
+            hay = (view["Region"].fillna("").astype(str) + "\n" + view["Country"].fillna("").astype(str) + "\n" +
+                   view["BloodType"].fillna("").astype(str) + "\n" + view["id"].fillna("").astype(str)).str.lower()
+            view = view[hay.str.contains(q, regex=False)]
         
-        # Apply sorting
+        # Apply sorting (FEFO rank is precomputed by the expiry engine)
         if sort_by.startswith("Soonest"):
-            def sort_key(r):
-                exp = r.get("ExpiresOn", "")
-                if not exp.strip():
-                    return (2, 9999, 9999)
-                try:
-                    d = dt.datetime.strptime(exp, "%Y-%m-%d").date()
-                    days = (d - dt.date.today()).days
-                    if days < 0:
-                        return (0, days, r.get("Units", 9999))
-                    return (1, days, r.get("Units", 9999))
-                except:
-                    return (2, 9999, 9999)
-            rows = sorted(rows, key=sort_key)
+            view = fefo_sort(view)
+        
+        view = view.assign(ExpiresOn=view["ExpiresOn"].fillna("").astype(str))
+        rows = view[["id","Region","Country","BloodType","Units","ExpiresOn","_Expiry"]].to_dict("records")
         
         if not rows:
             st.info("No blood records.")
         else:
-            # Add expiry status
-            for r in rows:
-                label, color = _expiry_status(r.get("ExpiresOn",""))
-                r["_Expiry"] = label
-            
             df = pd.DataFrame(rows).reset_index(drop=True)
             df.insert(0, "No.", range(1, len(df)+1))
             h = _auto_height(len(df))
@@ -1739,7 +1773,7 @@ def blood_tab_enhanced(role: str):
             
             st.download_button(
                 "⬇️ " + _translate("Download", lang) + " all blood (CSV)",
-                data=pd.DataFrame(rows).to_csv(index=False).encode("utf-8"),
+                data=pd.DataFrame(rows).drop(columns=["_Expiry"]).to_csv(index=False).encode("utf-8"),
                 file_name="aidbot_blood_inventory.csv", 
                 mime="text/csv",
                 key="dl_all_blood"
@@ -1840,46 +1874,9 @@ def blood_tab_enhanced(role: str):
             selected_country = st.session_state.get('sidebar_country', '(All)')
             year_range = st.session_state.get('sidebar_year_range', None)
             
-            # Apply filters
-            filtered_pred = df_pred.copy()
-            
-            # Apply disaster type filter
-            if selected_types:
-                disaster_col = None
-                for col in ['Disaster Type', 'DisasterType', 'Disaster', 'Target']:
-                    if col in filtered_pred.columns:
-                        disaster_col = col
-                        break
-                if disaster_col:
-                    filtered_pred = filtered_pred[filtered_pred[disaster_col].isin(selected_types)]
-            
-            # Apply region filter with case-insensitive matching
-            if selected_region and selected_region != "(All)":
-                region_col = 'Region' if 'Region' in filtered_pred.columns else None
-                if region_col:
-                    filtered_pred = filtered_pred[
-                        filtered_pred[region_col].str.strip().str.lower() == selected_region.strip().lower()
-                    ]
-            
-            # Apply country filter with case-insensitive matching
-            if selected_country and selected_country != "(All)":
-                country_col = 'Country' if 'Country' in filtered_pred.columns else None
-                if country_col:
-                    filtered_pred = filtered_pred[
-                        filtered_pred[country_col].str.strip().str.lower() == selected_country.strip().lower()
-                    ]
-            
-            # Apply year filter
-            if year_range:
-                year_col = None
-                for col in ['Year', 'Start Year', 'StartYear']:
-                    if col in filtered_pred.columns:
-                        year_col = col
-                        break
-                if year_col:
-                    filtered_pred[year_col] = pd.to_numeric(filtered_pred[year_col], errors='coerce')
-                    y1, y2 = year_range
-                    filtered_pred = filtered_pred[filtered_pred[year_col].between(y1, y2, inclusive='both')]
+            # Apply filters (shared bitmap index, built once per dataset)
+            filtered_pred = filter_predictions(df_pred, selected_types, selected_region, selected_country, year_range,
+                                               key=st.session_state.get('disaster_predictions_key'))
             
             # Show filter summary
             if filtered_pred.empty:
@@ -1953,46 +1950,36 @@ def blood_tab_enhanced(role: str):
         st.subheader("⚠️ Blood Expiry Alerts")
         st.caption("Identify blood units at risk of expiring")
         
-        inventory = read_blood_df()
-        
         if inventory.empty:
             st.info("No blood inventory to check.")
         else:
-            forecaster = BloodDemandForecaster()
-            days_threshold = st.slider("Alert threshold (days)", 1, 14, 7, key="expiry_threshold_slider")
-            at_risk = forecaster.check_expiry_waste(inventory, days_threshold)
-            
-            if at_risk.empty:
-                st.success(f"✅ No blood expiring within {days_threshold} days!")
+            # Same rules (BloodDaysLeft / BloodUnits thresholds) and results as the staff notifications
+            alerts = current_blood_alerts()
+            days_rule = list_thresholds().query("resource == 'BloodDaysLeft' and region == ''")
+            if alerts.empty:
+                st.success("✅ No blood record is at or below its alert thresholds!")
             else:
-                st.error(f"🚨 {len(at_risk)} blood units expiring soon!")
-                
-                # Display at-risk inventory
-                st.dataframe(at_risk, use_container_width=True, hide_index=True)
-                
-                # Summary by status
+                st.error(f"🚨 {len(alerts)} blood records need attention!")
+                st.dataframe(alerts[["Level", "Region", "Country", "BloodType", "Units", "ExpiresOn", "Detail"]],
+                             use_container_width=True, hide_index=True)
+
                 col1, col2 = st.columns(2)
                 with col1:
-                    urgent = (at_risk['Status'] == 'URGENT').sum()
-                    st.metric("🔴 Urgent (≤3 days)", urgent)
+                    st.metric("🔴 Critical", int((alerts["Severity"] == CRITICAL).sum()))
                 with col2:
-                    warning = (at_risk['Status'] == 'WARNING').sum()
-                    st.metric("🟡 Warning (4-7 days)", warning)
-                
+                    st.metric("🟡 Warning", int((alerts["Severity"] == WARNING).sum()))
+
                 # Recommendations
                 st.markdown("### 💡 Recommendations")
-                for _, row in at_risk.iterrows():
-                    if row['DaysLeft'] <= 3:
-                        st.error(
-                            f"🔴 URGENT: {row['Units']} units of {row['BloodType']} "
-                            f"in {row['Region']} expires in {row['DaysLeft']} days! "
-                            f"Consider immediate redistribution."
-                        )
+                for row in alerts.itertuples(index=False):
+                    text = f"{row.Units} units of {row.BloodType} in {row.Region}: {row.Detail}"
+                    if row.Severity == CRITICAL:
+                        st.error(f"🔴 {text}. Consider immediate redistribution.")
                     else:
-                        st.warning(
-                            f"🟡 {row['Units']} units of {row['BloodType']} "
-                            f"in {row['Region']} expires in {row['DaysLeft']} days."
-                        )
+                        st.warning(f"🟡 {text}.")
+            if not days_rule.empty:
+                st.caption(f"Default expiry rule: warning at {days_rule['warning'].iloc[0]:g} days left or fewer, "
+                           f"critical at {days_rule['critical'].iloc[0]:g}. Edit rules under Resources → Alert thresholds.")
     
     # ========================================================================
     # TAB 3: Supply-Demand Matching (FIXED WITH FILTER SYNC)
@@ -2001,7 +1988,6 @@ def blood_tab_enhanced(role: str):
         st.subheader("🔄 Supply-Demand Matching")
         st.caption("Match regional blood supply with predicted demand")
         
-        inventory = read_blood_df()
         df_pred = st.session_state.get('disaster_predictions_df')
         
         if inventory.empty:
@@ -2019,46 +2005,9 @@ def blood_tab_enhanced(role: str):
             selected_country = st.session_state.get('sidebar_country', '(All)')
             year_range = st.session_state.get('sidebar_year_range', None)
             
-            # Apply filters
-            filtered_pred = df_pred.copy()
-            
-            # Apply disaster type filter
-            if selected_types:
-                disaster_col = None
-                for col in ['Disaster Type', 'DisasterType', 'Disaster', 'Target']:
-                    if col in filtered_pred.columns:
-                        disaster_col = col
-                        break
-                if disaster_col:
-                    filtered_pred = filtered_pred[filtered_pred[disaster_col].isin(selected_types)]
-            
-            # Apply region filter with case-insensitive matching
-            if selected_region and selected_region != "(All)":
-                region_col = 'Region' if 'Region' in filtered_pred.columns else None
-                if region_col:
-                    filtered_pred = filtered_pred[
-                        filtered_pred[region_col].str.strip().str.lower() == selected_region.strip().lower()
-                    ]
-            
-            # Apply country filter with case-insensitive matching
-            if selected_country and selected_country != "(All)":
-                country_col = 'Country' if 'Country' in filtered_pred.columns else None
-                if country_col:
-                    filtered_pred = filtered_pred[
-                        filtered_pred[country_col].str.strip().str.lower() == selected_country.strip().lower()
-                    ]
-            
-            # Apply year filter
-            if year_range:
-                year_col = None
-                for col in ['Year', 'Start Year', 'StartYear']:
-                    if col in filtered_pred.columns:
-                        year_col = col
-                        break
-                if year_col:
-                    filtered_pred[year_col] = pd.to_numeric(filtered_pred[year_col], errors='coerce')
-                    y1, y2 = year_range
-                    filtered_pred = filtered_pred[filtered_pred[year_col].between(y1, y2, inclusive='both')]
+            # Apply filters (shared bitmap index, built once per dataset)
+            filtered_pred = filter_predictions(df_pred, selected_types, selected_region, selected_country, year_range,
+                                               key=st.session_state.get('disaster_predictions_key'))
             
             # Show filter summary
             if filtered_pred.empty:
@@ -2117,8 +2066,11 @@ def blood_tab_enhanced(role: str):
                         # Generate demand forecast (using filtered disasters)
                         demand_forecast = forecaster.predict_demand(disaster_preds[:50])
                         
-                        # Match with filtered inventory
-                        recommendations = forecaster.match_supply_demand(filtered_inventory, demand_forecast)
+                        # Match with filtered inventory, projected along recent consumption
+                        burn = blood_burn_rates(window_days=30)
+                        recommendations = forecaster.match_supply_demand(
+                            filtered_inventory, demand_forecast, burn_rates=burn, horizon_days=14
+                        )
                         
                         if recommendations:
                             # Filter out recommendations with 0 supply AND 0 demand
@@ -2135,6 +2087,7 @@ def blood_tab_enhanced(role: str):
                                 st.dataframe(
                                     rec_df[[
                                         'region', 'predicted_disaster', 'current_supply',
+                                        'projected_supply', 'days_of_cover',
                                         'predicted_demand', 'balance', 'coverage_percent',
                                         'status', 'action', 'priority'
                                     ]],
@@ -2181,6 +2134,31 @@ def blood_tab_enhanced(role: str):
                                             f"**{rec['region']}**: {rec['action']} "
                                             f"(Surplus: {rec['balance']} units)"
                                         )
+                                
+                                # Concrete transfer plan (all regions may supply the filtered demand)
+                                st.markdown("### 🚚 Transfer Plan")
+                                st.caption("Min-cost shipments respecting ABO/Rh compatibility, shipping units closest to expiry first.")
+                                try:
+                                    shipments, unmet = forecaster.plan_redistribution(inventory, demand_forecast)
+                                except Exception as e:
+                                    shipments, unmet = pd.DataFrame(), pd.DataFrame()
+                                    st.warning(f"Could not build a transfer plan: {e}")
+                                if shipments.empty:
+                                    st.info("No inter-region shipments needed — local stock covers what it can.")
+                                else:
+                                    st.dataframe(shipments, use_container_width=True, hide_index=True,
+                                                 height=_auto_height(len(shipments)))
+                                    st.download_button(
+                                        "⬇️ Download transfer plan (CSV)",
+                                        data=shipments.to_csv(index=False).encode("utf-8"),
+                                        file_name=f"blood_transfer_plan_{dt.datetime.now().strftime('%Y%m%d')}.csv",
+                                        mime="text/csv",
+                                        key="download_transfer_plan_csv"
+                                    )
+                                if not unmet.empty:
+                                    st.error(f"🔴 {int(unmet['units'].sum())} units of demand cannot be covered by compatible stock.")
+                                    st.dataframe(unmet, use_container_width=True, hide_index=True,
+                                                 height=_auto_height(len(unmet)))
                         else:
                             st.info("No recommendations generated. Check that both inventory and predictions exist.")
 # ---------- Resources (ENHANCED) ----------
@@ -2192,6 +2170,7 @@ def resources_tab(role: str):
     actor_id = (st.session_state.get("user") or {}).get("user_id")
 
     current = read_resources_df()
+    base = current          # what the editor starts from; saves book only the cells changed from it
     upl = st.file_uploader("Upload resources CSV (optional)", type=["csv"], key="resources_csv")
     if upl is not None and editable:
         try:
@@ -2201,7 +2180,7 @@ def resources_tab(role: str):
             if missing:
                 st.error(f"CSV missing required columns: {', '.join(missing)}")
             else:
-                current = uploaded
+                current, base = uploaded, None      # an import replaces the balances
                 st.success("CSV loaded into table. Click 'Save resources' to persist.")
         except Exception as e:
             st.error(f"Could not read CSV: {e}")
@@ -2237,9 +2216,12 @@ def resources_tab(role: str):
     col_actions = st.columns([0.69, 0.31])
     with col_actions[0]:
         if editable and st.button(_translate("Save", lang) + " resources", type="primary"):
-            write_resources_df(edited.fillna(0), actor_id=actor_id)
-            st.success("Resources saved successfully!")
-            st.rerun()
+            try:
+                write_resources_df(edited.fillna(0), actor_id=actor_id, base=base)
+                st.success("Resources saved successfully!")
+                st.rerun()
+            except ValueError as e:
+                st.error(str(e))
     with col_actions[1]:
         st.download_button(
             "⬇️ " + _translate("Download", lang) + " all resources (CSV)",
@@ -2261,7 +2243,8 @@ def resources_tab(role: str):
         with r7: fod = st.number_input("FoodKits", value=0, step=1, min_value=0, key="res_add_food")
         wat = st.number_input("WaterKits", value=0, step=1, min_value=0, key="res_add_water")
         if st.button(_translate("Create", lang) + " resource", disabled=not editable, key="res_add_btn"):
-            df = read_resources_df()
+            stored = read_resources_df()
+            df = stored
             if df.empty:
                 df = pd.DataFrame(columns=["Region","Country","Volunteers","Trucks","Boats","MedKits","FoodKits","WaterKits"])
             new = pd.DataFrame([{
@@ -2269,83 +2252,89 @@ def resources_tab(role: str):
                 "Boats": int(boa), "MedKits": int(med), "FoodKits": int(fod), "WaterKits": int(wat)
             }])
             df = pd.concat([df, new], ignore_index=True)
-            write_resources_df(df.fillna(0), actor_id=actor_id)
+            write_resources_df(df.fillna(0), actor_id=actor_id, base=stored)
             st.success("Resource row added successfully!")
             for k in ["res_add_reg","res_add_cty","res_add_vol","res_add_tru","res_add_boa","res_add_med","res_add_food","res_add_water"]:
                 if k in st.session_state: del st.session_state[k]
             st.rerun()
+
+    # ========== Stock movements (ledger) ==========
+    st.markdown("---")
+    st.markdown("### 📦 Stock Movements")
+    st.caption("Receipts, dispatches and transfers are booked in a ledger; the table above shows the resulting balances.")
+    by_label = {f"{r['Country']} - {r['Region']}": (r["Region"], r["Country"]) for _, r in read_resources_df().iterrows()}
+    locations = list(by_label)
+    if editable and locations:
+        with st.expander("Record a movement"):
+            m1, m2, m3 = st.columns(3)
+            with m1: mv_kind = st.selectbox("Type", ["receipt", "dispatch", "transfer"], key="mv_kind")
+            with m2: mv_item = st.selectbox("Item", STOCK_ITEMS, key="mv_item")
+            with m3: mv_qty = st.number_input("Quantity", value=1, step=1, min_value=1, key="mv_qty")
+            m4, m5, m6 = st.columns(3)
+            with m4:
+                mv_from = st.selectbox("From", locations, key="mv_from") if mv_kind != "receipt" else None
+            with m5:
+                mv_to = st.selectbox("To", locations, key="mv_to") if mv_kind != "dispatch" else None
+            with m6: mv_ref = st.text_input("Reference", key="mv_ref")
+            if st.button("Book movement", key="mv_book"):
+                move = {"kind": mv_kind, "item": mv_item, "quantity": int(mv_qty), "reference": mv_ref}
+                if mv_from:
+                    move["from_region"], move["from_country"] = by_label[mv_from]
+                if mv_to:
+                    move["to_region"], move["to_country"] = by_label[mv_to]
+                try:
+                    record_stock_movements([move], actor_id=actor_id)
+                    st.success("Movement booked.")
+                    st.rerun()
+                except ValueError as e:
+                    st.error(str(e))
+
+    with st.expander("Movement history and burn rates"):
+        h1, h2 = st.columns(2)
+        with h1: hist_item = st.selectbox("Item", STOCK_ITEMS, key="stock_hist_item")
+        with h2: hist_period = st.selectbox("Period", ["day", "week", "month"], index=1, key="stock_hist_period")
+        trend = stock_rollup(hist_period, item=hist_item)
+        if trend.empty:
+            st.info("No movements recorded yet.")
+        else:
+            trend = trend.groupby("period", as_index=False)[["received", "issued", "closing"]].sum()
+            st.altair_chart(
+                alt.Chart(trend.melt("period", ["received", "issued"], var_name="flow", value_name="quantity"))
+                .mark_bar().encode(x=alt.X("period:N", title=hist_period.title()), y="quantity:Q",
+                                   color="flow:N", xOffset="flow:N", tooltip=["period", "flow", "quantity"])
+                .properties(height=260, title=f"{hist_item} received vs. issued"),
+                use_container_width=True)
+        burn = stock_burn_rates(window_days=30)
+        burn = burn[(burn["item"] == hist_item) & (burn["burn_per_day"] > 0)]
+        if not burn.empty:
+            st.markdown("**30-day burn rate**")
+            st.dataframe(burn.round(2), use_container_width=True, hide_index=True)
+        recent = list_stock_movements(limit=25, item=hist_item)
+        if not recent.empty:
+            recent["ts"] = pd.to_datetime(recent["ts"], unit="s")
+            st.markdown("**Recent movements**")
+            st.dataframe(recent.drop(columns=["id"]), use_container_width=True, hide_index=True)
     # ========== ENHANCEMENT 1: Resource Status Alerts ==========
     st.markdown("---")
     st.markdown("### ⚠️ Resource Status Alerts")
-    st.caption("Automated alerts for low resource levels across regions")
+    st.caption("Automated alerts for low resource levels across regions (saved stock, checked against the alert thresholds)")
     
     if not edited.empty:
-        # Define thresholds
-        THRESHOLDS = {
-            "Volunteers": {"critical": 10, "warning": 70},
-            "Trucks": {"critical": 1, "warning": 7},
-            "Boats": {"critical": 0, "warning": 7},
-            "MedKits": {"critical": 50, "warning": 100},
-            "FoodKits": {"critical": 100, "warning": 100},
-            "WaterKits": {"critical": 100, "warning": 100}
-        }
-        
-        alerts = []
-        
-        for _, row in edited.iterrows():
-            # Skip invalid/empty rows
-            country = str(row.get('Country', '')).strip()
-            region = str(row.get('Region', '')).strip()
-            
-            # Skip if country/region is empty, "0", "None", or invalid
-            if not country or not region or country in ['0', 'None', 'nan'] or region in ['0', 'None', 'nan']:
-                continue
-            
-            location = f"{country} - {region}"
-            
-            for resource, thresholds in THRESHOLDS.items():
-                # Safe conversion: handle NaN, None, empty strings
-                raw_value = row.get(resource, 0)
-                try:
-                    value = int(float(raw_value)) if pd.notna(raw_value) else 0
-                except (ValueError, TypeError):
-                    value = 0
-                
-                if value <= thresholds["critical"]:
-                    alerts.append({
-                        "Level": "🔴 Critical",
-                        "Location": location,
-                        "Resource": resource,
-                        "Current": value,
-                        "Threshold": thresholds["critical"],
-                        "Priority": 3
-                    })
-                elif value <= thresholds["warning"]:
-                    alerts.append({
-                        "Level": "🟡 Warning",
-                        "Location": location,
-                        "Resource": resource,
-                        "Current": value,
-                        "Threshold": thresholds["warning"],
-                        "Priority": 2
-                    })
-        
-        if alerts:
-            # Sort by priority (critical first)
-            alerts_df = pd.DataFrame(alerts).sort_values("Priority", ascending=False)
-            
+        alerts_df = current_resource_alerts()
+
+        if not alerts_df.empty:
             # Show summary metrics
             col1, col2, col3 = st.columns(3)
-            critical_count = len([a for a in alerts if "Critical" in a["Level"]])
-            warning_count = len([a for a in alerts if "Warning" in a["Level"]])
-            
+            critical_count = int((alerts_df["Severity"] == CRITICAL).sum())
+            warning_count = int((alerts_df["Severity"] == WARNING).sum())
+
             with col1:
                 st.metric("🔴 Critical Alerts", critical_count)
             with col2:
                 st.metric("🟡 Warning Alerts", warning_count)
             with col3:
                 st.metric("✅ Regions Checked", len(edited))
-            
+
             # Display alerts table
             st.dataframe(
                 alerts_df[["Level", "Location", "Resource", "Current", "Threshold"]],
@@ -2356,6 +2345,27 @@ def resources_tab(role: str):
             st.success("✅ All regions have adequate resource levels!")
     else:
         st.info("Upload or create resources to see alerts.")
+
+    if editable:
+        with st.expander("⚙️ Alert thresholds"):
+            st.caption("A value at or below a threshold raises that alert. Rules with a region override the default (blank region) for that region.")
+            st.dataframe(pd.DataFrame(list_thresholds()), use_container_width=True, hide_index=True)
+            t1, t2, t3, t4 = st.columns(4)
+            with t1: t_res = st.selectbox("Resource", [t["resource"] for t in DEFAULT_THRESHOLDS], key="thr_res")
+            with t2: t_reg = st.text_input("Region (blank = default)", key="thr_reg")
+            with t3: t_warn = st.number_input("Warning at or below", value=0, step=1, key="thr_warn")
+            with t4: t_crit = st.number_input("Critical at or below", value=0, step=1, key="thr_crit")
+            b1, b2 = st.columns(2)
+            with b1:
+                if st.button("Save threshold", key="thr_save"):
+                    set_threshold(t_res, t_warn, t_crit, region=t_reg, actor_id=actor_id)
+                    st.success("Threshold saved.")
+                    st.rerun()
+            with b2:
+                if st.button("Delete threshold", key="thr_del", disabled=not t_reg.strip()):
+                    delete_threshold(t_res, region=t_reg, actor_id=actor_id)
+                    st.success("Regional threshold removed.")
+                    st.rerun()
     
     # ========== ENHANCEMENT 2: Deployment Recommendations ==========
     st.markdown("---")
@@ -2363,101 +2373,48 @@ def resources_tab(role: str):
     st.caption("Smart matching of resources to open emergency cases")
     
     if not edited.empty:
-        open_cases = [c for c in list_cases() 
-                      if c.get("status") in ["new", "acknowledged", "en_route"]]
+        open_cases = [c for c in list_cases() if c.get("status") in OPEN_STATUSES]
         
         if open_cases:
-            recommendations = []
+            # Every open case, matched to resource rows by one normalized-key join
+            rec_df = recommend_deployments(open_cases, edited)
+            summary = deployment_summary(rec_df)
+            ready, limited, insufficient = summary["ready"], summary["limited"], summary["insufficient"]
             
-            for case in open_cases[:15]:  # Limit to 15 cases for performance
-                case_country = case.get("country", "").strip()
-                case_region = case.get("region", "").strip()
-                
-                # Match by country OR region
-                matches = edited[
-                    (edited["Country"].str.strip().str.lower() == case_country.lower()) |
-                    (edited["Region"].str.strip().str.lower() == case_region.lower())
-                ]
-                
-                if not matches.empty:
-                    match = matches.iloc[0]
-                    
-                    volunteers = int(match.get("Volunteers", 0))
-                    trucks = int(match.get("Trucks", 0))
-                    medkits = int(match.get("MedKits", 0))
-                    
-                    # Deployment readiness logic
-                    can_deploy_volunteers = volunteers >= 5
-                    can_deploy_transport = trucks >= 1
-                    can_deploy_supplies = medkits >= 10
-                    
-                    if can_deploy_volunteers and can_deploy_transport and can_deploy_supplies:
-                        status = "✅ Ready"
-                        status_color = "🟢"
-                    elif can_deploy_volunteers or can_deploy_supplies:
-                        status = "⚠️ Limited"
-                        status_color = "🟡"
-                    else:
-                        status = "❌ Insufficient"
-                        status_color = "🔴"
-                    
-                    recommendations.append({
-                        "Case ID": case["case_id"],
-                        "Location": f"{case_country}, {case_region}",
-                        "Status": case.get("status", "new"),
-                        "Volunteers": volunteers,
-                        "Trucks": trucks,
-                        "MedKits": medkits,
-                        "Deployment": status,
-                        "Priority": status_color
-                    })
-                else:
-                    recommendations.append({
-                        "Case ID": case["case_id"],
-                        "Location": f"{case_country}, {case_region}",
-                        "Status": case.get("status", "new"),
-                        "Volunteers": 0,
-                        "Trucks": 0,
-                        "MedKits": 0,
-                        "Deployment": "❌ No Match",
-                        "Priority": "🔴"
-                    })
+            # Summary metrics
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("✅ Ready for Deployment", ready)
+            with col2:
+                st.metric("⚠️ Limited Resources", limited)
+            with col3:
+                st.metric("❌ Cannot Deploy", insufficient)
             
-            if recommendations:
-                rec_df = pd.DataFrame(recommendations)
-                
-                # Summary metrics
-                col1, col2, col3 = st.columns(3)
-                ready = len(rec_df[rec_df["Deployment"] == "✅ Ready"])
-                limited = len(rec_df[rec_df["Deployment"] == "⚠️ Limited"])
-                insufficient = len(rec_df[rec_df["Deployment"].str.contains("Insufficient|No Match")])
-                
-                with col1:
-                    st.metric("✅ Ready for Deployment", ready)
-                with col2:
-                    st.metric("⚠️ Limited Resources", limited)
-                with col3:
-                    st.metric("❌ Cannot Deploy", insufficient)
-                
-                # Display recommendations
-                st.dataframe(
-                    rec_df[["Case ID", "Location", "Status", "Volunteers", "Trucks", "MedKits", "Deployment"]],
-                    use_container_width=True,
-                    hide_index=True
-                )
-                
-                # Action items
-                st.markdown("#### 💡 Action Items")
-                if insufficient > 0:
-                    st.error(f"🚨 **{insufficient} cases** cannot be deployed due to lack of resources. Consider resource redistribution.")
-                if limited > 0:
-                    st.warning(f"⚠️ **{limited} cases** have limited resources. Monitor closely.")
-                if ready > 0:
-                    st.success(f"✅ **{ready} cases** are ready for immediate deployment!")
-                
-                st.info("💡 **Tip:** Assign volunteers to cases from the 'Cases' tab to activate deployment.")
-            else:
-                st.success("No deployment recommendations needed at this time.")
+            # Display recommendations, one page at a time
+            show = st.selectbox("Show", ["All", "✅ Ready", "⚠️ Limited", "❌ Cannot deploy"], key="deploy_filter")
+            if show == "❌ Cannot deploy":
+                rec_df = rec_df[rec_df["Deployment"].isin(["❌ Insufficient", "❌ No Match"])]
+            elif show != "All":
+                rec_df = rec_df[rec_df["Deployment"] == show]
+            page_df, cur, pages, key_page, total = _paginate(rec_df, "deploy_recs", page_size=25)
+            st.dataframe(
+                page_df[["Case ID", "Location", "Status", "Volunteers", "Trucks", "MedKits", "Deployment"]],
+                use_container_width=True,
+                hide_index=True,
+                height=_auto_height(len(page_df))
+            )
+            _pager(cur, pages, key_page, center_note=f"{total} cases")
+            
+            # Action items
+            st.markdown("#### 💡 Action Items")
+            if insufficient > 0:
+                st.error(f"🚨 **{insufficient} cases** cannot be deployed due to lack of resources. Consider resource redistribution.")
+            if limited > 0:
+                st.warning(f"⚠️ **{limited} cases** have limited resources. Monitor closely.")
+            if ready > 0:
+                st.success(f"✅ **{ready} cases** are ready for immediate deployment!")
+            
+            st.info("💡 **Tip:** Assign volunteers to cases from the 'Cases' tab to activate deployment.")
         else:
             st.info("No open cases requiring deployment.")
     else:
@@ -2494,13 +2451,141 @@ def resources_tab(role: str):
             # Summary table
             st.dataframe(regional_summary, use_container_width=True, hide_index=True)
 
+# ---------- Ops Planner ----------
+@st.cache_data(show_spinner=False)
+def _preposition_plan(demand: pd.DataFrame, stock: pd.DataFrame):
+    """Multi-period pre-positioning plan, cached per demand and stock content."""
+    return plan_prepositioning(demand, stock)
+
+# ---------- Multi-year scenario outlook ----------
+@st.cache_resource(show_spinner=False)
+def _scenario_run(n_trajectories: int, seed: int):
+    """Shared read-only run; cache_resource avoids pickling the counts array on every rerun."""
+    from scenario_engine import run_scenarios
+    return run_scenarios(n_trajectories=n_trajectories, seed=seed, workers=1)
+
+def scenario_outlook_panel():
+    """Monte Carlo outlook 2025–2050 from historical per-country occurrence rates."""
+    st.subheader("📈 Multi-year Outlook (Monte Carlo)")
+    with st.spinner("Simulating trajectories..."):
+        run = _scenario_run(10_000, 42)
+    regions = sorted(run.groups["region"].unique())
+    c1, c2, c3, c4 = st.columns(4)
+    with c1:
+        region = st.selectbox("Region", regions, key="mc_region")
+    with c2:
+        types = sorted(run.groups.loc[run.groups["region"] == region, "disaster_type"])
+        dtype = st.selectbox("Disaster type", types, key="mc_type")
+    with c3:
+        k = st.number_input("At least (events)", min_value=1, value=3, step=1, key="mc_k")
+    with c4:
+        by_year = st.slider("By year", 2025, 2050, 2030, key="mc_year")
+    p = run.exceedance(region, dtype, int(k), by_year)
+    st.metric(f"P(≥{int(k)} {dtype} events in {region}, 2025–{by_year})", f"{p:.1%}")
+    q = run.quantiles(cumulative=True)
+    q = q[(q["region"] == region) & (q["disaster_type"] == dtype)]
+    st.dataframe(q[["year", "mean", "q05", "q50", "q95"]], use_container_width=True, hide_index=True,
+                 height=_auto_height(len(q)))
+    st.caption(f"{run.n_trajectories:,} seeded trajectories, cumulative events since 2025.")
+
+# ---------- Alert history ----------
+def alert_history_panel(page_size: int = 25):
+    """Paginated view over the alert store (simulation runs + imported alerts/*.csv)."""
+    st.subheader("🚨 Alert History")
+    c1, c2, c3, c4 = st.columns([0.3, 0.25, 0.25, 0.2])
+    with c1:
+        country = st.text_input("Country", key="alerts_country").strip() or None
+    with c2:
+        levels = st.multiselect("Alert level", ["HIGH", "MEDIUM", "LOW"], key="alerts_levels")
+    with c3:
+        years = st.slider("Year", 2025, 2050, (2025, 2050), key="alerts_years")
+    with c4:
+        st.write("")
+        if st.button("Import alerts/*.csv", key="alerts_import"):
+            n = import_alert_csvs("alerts")
+            st.success(f"Imported {n} alerts.") if n else st.info("Nothing new to import.")
+
+    filters = dict(country=country, alert_level=levels or None, year_from=years[0], year_to=years[1])
+    total = count_alerts(**filters)
+    if total == 0:
+        st.info("No alerts match these filters.")
+        return
+    counts = alert_level_counts(**filters)
+    m1, m2, m3 = st.columns(3)
+    m1.metric("High", counts.get("HIGH", 0))
+    m2.metric("Medium", counts.get("MEDIUM", 0))
+    m3.metric("Low", counts.get("LOW", 0))
+
+    pages = max(1, (total + page_size - 1) // page_size)
+    key_page = "alerts_page"
+    cur = min(st.session_state.get(key_page, 1), pages)
+    page = query_alerts(limit=page_size, offset=(cur - 1) * page_size, **filters)
+    st.dataframe(page.drop(columns=["id"]), use_container_width=True, hide_index=True,
+                 height=_auto_height(len(page)))
+    _pager(cur, pages, key_page, center_note=f"{total} alerts")
+
 # ---------- Predictions ----------
+@st.cache_resource(show_spinner=False)
+def _prepared_predictions(key: str, _raw: pd.DataFrame):
+    """(DatasetProfile, cleaned frame) for a predictions dataset, shared across sessions by key."""
+    profile = DatasetProfile.from_frame(_raw, key)
+    return profile, profile.frame(_raw)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _model_metrics(key: str, filter_key, true_col: str, pred_cols: tuple, _data: pd.DataFrame) -> ModelMetrics:
+    """Model metrics for one (dataset, filter) combination; _data is the matching rows."""
+    return ModelMetrics.from_frame(_data, true_col, dict(pred_cols))
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _geo_grid(key: str, filter_key, kind: str, _coords: pd.DataFrame) -> GeoGrid:
+    """Multi-resolution grid over the (lat, lon) columns of one dataset + filter combination."""
+    return GeoGrid(_coords.iloc[:, 0], _coords.iloc[:, 1], kind)
+
+@st.cache_resource(show_spinner=False)
+def _predictions_cube(key: str, _keys: pd.DataFrame) -> HistoryCube:
+    """Aggregate cube over (year, region, country, type) key columns, cached per dataset."""
+    return HistoryCube.from_frame(_keys, *_keys.columns)
+
 def pick(df, *names):
     for n in names:
         if n in df.columns: return n
     return None
 
-def predictions_tabs(df):
+@st.cache_resource(show_spinner=False)
+def _filter_index(keys: pd.DataFrame, type_cols: tuple, region_col, country_col, year_col) -> FilterIndex:
+    """Bitmap filter index over the key columns, cached per content."""
+    return FilterIndex.from_frame(keys, type_cols, region_col, country_col, year_col)
+
+@st.cache_resource(show_spinner=False)
+def _keyed_filter_index(key: str, type_cols: tuple, region_col, country_col, year_col,
+                        _keys: pd.DataFrame) -> FilterIndex:
+    """As _filter_index, but cached per dataset key so reruns skip hashing the columns."""
+    return FilterIndex.from_frame(_keys, type_cols, region_col, country_col, year_col)
+
+def prediction_filter_index(df, type_cols=None, key=None) -> FilterIndex:
+    """
+    Filter index for a predictions frame; type_cols defaults to its disaster type column.
+    key identifies the frame (the cleaned predictions frame uses its profile key).
+    """
+    if type_cols is None:
+        type_cols = (pick(df, "Disaster Type", "DisasterType", "Disaster", "Target"),)
+    type_cols = tuple(c for c in type_cols if c)
+    region_col, country_col = pick(df, "Region"), pick(df, "Country")
+    year_col = pick(df, "Year", "Start Year", "StartYear")
+    keys = [c for c in dict.fromkeys((*type_cols, region_col, country_col, year_col)) if c]
+    if key is not None:
+        return _keyed_filter_index(key, type_cols, region_col, country_col, year_col, df[keys])
+    return _filter_index(df[keys], type_cols, region_col, country_col, year_col)
+
+def filter_predictions(df, types=None, region="(All)", country="(All)", year_range=None,
+                       type_cols=None, key=None):
+    """Rows of df matching the sidebar filters (labels match case/space-insensitively)."""
+    return prediction_filter_index(df, type_cols, key).apply(
+        df, types=types, regions=region, countries=country,
+        years=tuple(year_range) if year_range else None)
+
+def predictions_tabs(df, profile: DatasetProfile | None = None):
+    """df is the cleaned frame from _prepared_predictions when profile is given, else raw."""
     # ✅ CSV Validation Layer (Prevents crashes from missing columns)
     required_cols = ["Year", "Region", "Country", "Disaster Type"]
     missing = [col for col in required_cols if col not in df.columns]
@@ -2516,90 +2601,35 @@ def predictions_tabs(df):
         df["Year"] = datetime.datetime.now().year
         st.info("✅ Added missing 'Year' column automatically with current year.")
 
-    TRUE_COL    = pick(df, "Disaster Type","True","Target","Disaster_Type")
-    TREE_COL    = pick(df, "Tree")
-    NN_COL      = pick(df, "Neural Network","NeuralNetwork","NN")
-    YEAR_COL    = pick(df, "Year","Start Year","StartYear")
-    REGION_COL  = pick(df, "Region")
-    COUNTRY_COL = pick(df, "Country")
-    LAT_COL     = pick(df, "Latitude","lat","Lat")
-    LON_COL     = pick(df, "Longitude","lon","Lng","Long")
-
-    year_all_nan = True
-    if YEAR_COL:
-        df[YEAR_COL] = pd.to_numeric(df[YEAR_COL], errors="coerce")
-        year_all_nan = df[YEAR_COL].isna().all()
-
-    # Normalize labels/preds & drop junk rows
-    if TRUE_COL:
-        BAD_TRUE = {"class",
-                    "Drought Earthquake Epidemic Extreme\\ temperature Flood Other Landslide Storm Wildfire",
-                    ""}
-        def _clean(s): return None if pd.isna(s) else str(s).strip()
-        for c in [TRUE_COL, TREE_COL, NN_COL]:
-            if c and c in df.columns:
-                df[c] = df[c].map(_clean)
-        df = df[~df[TRUE_COL].isin(BAD_TRUE)].copy()
+    # Column names, cleaned label dictionaries, sidebar options and year bounds are
+    # computed once per dataset (see _prepared_predictions); reruns reuse them
+    if profile is None:
+        profile = DatasetProfile.from_frame(df)
+        df = profile.frame(df)
+    TRUE_COL    = profile.cols["true"]
+    TREE_COL    = profile.cols["tree"]
+    NN_COL      = profile.cols["nn"]
+    YEAR_COL    = profile.cols["year"]
+    REGION_COL  = profile.cols["region"]
+    COUNTRY_COL = profile.cols["country"]
+    LAT_COL     = profile.cols["lat"]
+    LON_COL     = profile.cols["lon"]
+    year_all_nan = profile.year_bounds is None
 
     # ============================================================
     # 🎯 Sidebar Filters – Fully Corrected (for Disaster, Region, Country)
     # ============================================================
     st.sidebar.header("Filters")
 
-    import re
+    # Aggregate cube over the cleaned rows: class counts come from its rollups
+    # instead of rescanning the full columns on every rerun
+    cube = None
+    if TRUE_COL and YEAR_COL and REGION_COL and COUNTRY_COL and not year_all_nan:
+        cube = _predictions_cube(profile.key, df[[YEAR_COL, REGION_COL, COUNTRY_COL, TRUE_COL]])
 
-    def clean_label(text):
-        """Remove slashes, extra spaces, and invalid entries."""
-        if not isinstance(text, str):
-            return None
-        t = text.strip().replace("\\", "").replace("  ", " ")
-        if not t or t.lower() in ["nan", "none", "(dry)"]:
-            return None
-        return t
-
-    def clean_disaster_types(series):
-        """Clean and extract valid disaster type names."""
-        items = []
-        for val in series.dropna().astype(str):
-            val = val.strip().replace("\\", "")
-            # skip known combined long string
-            if "Drought Earthquake Epidemic" in val:
-                continue
-            # split only on punctuation, NOT spaces
-            parts = [p.strip() for p in re.split(r'[;,|]', val) if p.strip()]
-            items.extend(parts)
-        # remove duplicates and bad entries
-        return sorted(set(clean_label(x) for x in items if clean_label(x)))
-
-    def clean_region_country(series):
-        """Clean Region/Country columns and remove combined multi-items."""
-        items = []
-        for val in series.dropna().astype(str):
-            val = val.strip().replace("\\", "")
-            # skip long joined entries like 'Central Asia Eastern Asia ...'
-            if "Eastern Asia" in val and "Western Asia" in val:
-                continue
-            if "Afghanistan" in val and "Yemen" in val:
-                continue
-            # split only if comma/semicolon/pipe — not spaces
-            parts = [p.strip() for p in re.split(r'[;,|]', val) if p.strip()]
-            items.extend(parts)
-        unique = sorted(set(clean_label(x) for x in items if clean_label(x)))
-        return ["(All)"] + unique
-
-    # Apply cleaning
-    if TRUE_COL:
-        dtype_opts = clean_disaster_types(df[TRUE_COL])
-    else:
-        pool = []
-        if TREE_COL:
-            pool += df[TREE_COL].dropna().astype(str).tolist()
-        if NN_COL:
-            pool += df[NN_COL].dropna().astype(str).tolist()
-        dtype_opts = clean_disaster_types(pd.Series(pool))
-
-    region_opts = clean_region_country(df[REGION_COL]) if REGION_COL else ["(All)"]
-    country_opts = clean_region_country(df[COUNTRY_COL]) if COUNTRY_COL else ["(All)"]
+    dtype_opts = profile.type_options
+    region_opts = profile.region_options
+    country_opts = profile.country_options
 
     # UI widgets
     selected_types = st.sidebar.multiselect(
@@ -2627,11 +2657,11 @@ def predictions_tabs(df):
 
     # Year filter
     if not year_all_nan:
-        y_min = int(np.nanmin(df[YEAR_COL].values))
-        y_max = int(np.nanmax(df[YEAR_COL].values))
+        y_min, y_max = profile.year_bounds
         if y_min == y_max:
             y_min = y_max - 1
         year_range = st.sidebar.slider("Year", min_value=y_min, max_value=y_max, value=(y_min, y_max))
+        st.session_state['sidebar_year_range'] = year_range
     else:
         year_range = None
         st.session_state['sidebar_disaster_types'] = selected_types
@@ -2640,29 +2670,41 @@ def predictions_tabs(df):
         st.session_state['sidebar_year_range'] = year_range if not year_all_nan else None
         st.sidebar.caption("No usable Year column detected; year filter disabled.")
 
+    # Identifies the current filter combination for memoized per-filter results
+    filter_key = (tuple(selected_types), selected_region, selected_country,
+                  tuple(year_range) if year_range else None)
+
+    def model_metrics(data: pd.DataFrame, key=None) -> ModelMetrics | None:
+        """Tree / NN metrics for data, memoized by (dataset, key); key=None means data is unfiltered."""
+        if not TRUE_COL or data.empty:
+            return None
+        pred_cols = tuple((n, c) for n, c in (("Tree", TREE_COL), ("Neural Network", NN_COL)) if c)
+        if profile.key is None:
+            return ModelMetrics.from_frame(data, TRUE_COL, dict(pred_cols))
+        return _model_metrics(profile.key, key, TRUE_COL, pred_cols, data)
+
+    # Bitmap index over the cleaned rows: type (true label, else either model's prediction),
+    # region, country and year; built once per dataset
+    filter_types = (TRUE_COL,) if TRUE_COL else (TREE_COL, NN_COL)
+
     def apply_filters(df_src: pd.DataFrame) -> pd.DataFrame:
-        mask = pd.Series(True, index=df_src.index)
-        if selected_types:
-            if TRUE_COL: mask &= df_src[TRUE_COL].astype(str).isin(selected_types)
-            else:
-                m = pd.Series(False, index=df_src.index)
-                if TREE_COL:
-                    m |= df_src[TREE_COL].astype(str).isin(selected_types)
-                if NN_COL:
-                    m |= df_src[NN_COL].astype(str).isin(selected_types)
-                mask &= m
-        if REGION_COL and selected_region != "(All)": mask &= (df_src[REGION_COL].astype(str) == selected_region)
-        if COUNTRY_COL and selected_country != "(All)": mask &= (df_src[COUNTRY_COL].astype(str) == selected_country)
-        if year_range and not year_all_nan:
-            y1, y2 = year_range
-            mask &= df_src[YEAR_COL].between(y1, y2, inclusive="both")
-        return df_src[mask].copy()
+        return filter_predictions(df_src, selected_types, selected_region, selected_country,
+                                  year_range if not year_all_nan else None, type_cols=filter_types,
+                                  key=profile.key if df_src is df else None)
 
     def class_dist_chart(data: pd.DataFrame, title="Class distribution"):
         st.subheader(title)
         TRUE = TRUE_COL
         if TRUE and not data.empty:
-            cd = data[TRUE].value_counts().reset_index()
+            if cube is not None:
+                # Same filters as apply_filters(), answered from the cube
+                cd = cube.rollup("type", types=selected_types or None,
+                                 regions=None if selected_region == "(All)" else selected_region,
+                                 countries=None if selected_country == "(All)" else selected_country,
+                                 years=tuple(year_range) if year_range else None)
+                cd = cd[["type", "events"]].astype({"events": int}).sort_values("events", ascending=False)
+            else:
+                cd = data[TRUE].value_counts().loc[lambda c: c > 0].reset_index()
             cd.columns = ["Disaster Type","Count"]
             chart = (alt.Chart(cd).mark_bar()
                      .encode(x=alt.X("Disaster Type:N", sort="-y"),
@@ -2673,37 +2715,34 @@ def predictions_tabs(df):
         else:
             st.caption("No 'Disaster Type' column found (or no rows).")
 
-    def confusion_table(data: pd.DataFrame, title="Confusion matrix (Tree)"):
+    def confusion_table(metrics: ModelMetrics | None, title="Confusion matrix (Tree)", model="Tree"):
         st.subheader(title)
-        if TRUE_COL and TREE_COL and not data.empty:
-            y_true=data[TRUE_COL].astype(str)
-            y_pred=data[TREE_COL].astype(str)
-            labels=sorted(list(set(y_true.unique()) | set(y_pred.unique())))
-            if len(labels) > 1:
-                cm=confusion_matrix(y_true,y_pred,labels=labels)
-                cm_df=pd.DataFrame(cm,index=labels,columns=labels)
-                st.dataframe(cm_df,use_container_width=True, hide_index=True)
+        if metrics is not None and model in metrics.matrices:
+            if len(metrics.labels) > 1:
+                st.dataframe(metrics.confusion(model), use_container_width=True, hide_index=True)
+                with st.expander("Per-class precision / recall / F1"):
+                    st.dataframe(metrics.per_class(model).round(3), use_container_width=True, hide_index=True)
             else:
                 st.caption("Not enough classes to build a confusion matrix.")
         else:
             st.caption("Need both true labels and Tree predictions.")
 
-    def accuracy_block(data: pd.DataFrame):
-        if TRUE_COL and not data.empty:
+    def accuracy_block(metrics: ModelMetrics | None):
+        if metrics is not None:
             blocks = []
-            if TREE_COL in data.columns:
-                a = accuracy_score(data[TRUE_COL].astype(str), data[TREE_COL].astype(str))
-                blocks.append(("Tree accuracy", f"{a*100:.1f}%"))
-            if NN_COL and NN_COL in data.columns:
-                a = accuracy_score(data[TRUE_COL].astype(str), data[NN_COL].astype(str))
-                blocks.append(("Neural Net accuracy", f"{a*100:.1f}%"))
+            if "Tree" in metrics.matrices:
+                blocks.append(("Tree accuracy", f"{metrics.accuracy('Tree')*100:.1f}%"))
+            if "Neural Network" in metrics.matrices:
+                blocks.append(("Neural Net accuracy", f"{metrics.accuracy('Neural Network')*100:.1f}%"))
+            if metrics.disagreement() is not None:
+                blocks.append(("Tree vs NN disagreement", f"{metrics.disagreement()*100:.1f}%"))
             if blocks:
                 c = st.columns(len(blocks))
                 for i, (h, v) in enumerate(blocks):
                     with c[i]:
                         st.markdown(f'<div class="kpi" style="background: linear-gradient(135deg, rgba(227,59,59,0.1) 0%, rgba(227,59,59,0.05) 100%); border-left: 4px solid #e33b3b;"><h3 style="color: #e33b3b;">{h}</h3><p style="color: #e33b3b;">{v}</p></div>', unsafe_allow_html=True)
 
-    def map_block(data: pd.DataFrame, title="Map (records with coordinates)"):
+    def map_block(data: pd.DataFrame, title="Map (records with coordinates)", key=None):
         st.subheader(title)
         if data is None or data.empty:
             st.caption("No rows to map.")
@@ -2712,35 +2751,59 @@ def predictions_tabs(df):
         if (lat_col not in data.columns) or (lon_col not in data.columns):
             st.info("This CSV has no Latitude/Longitude columns to map.")
             return
-        lat = pd.to_numeric(data[lat_col], errors="coerce")
-        lon = pd.to_numeric(data[lon_col], errors="coerce")
-        mask = lat.between(-90, 90) & lon.between(-180, 180)
-        mdf = pd.DataFrame({"lat": lat[mask], "lon": lon[mask]}).dropna()
-        if mdf.empty:
+        # Points are binned server-side (cached per dataset + filters); only cells are sent
+        coords = data[[lat_col, lon_col]]
+        square = _geo_grid(profile.key, key, "square", coords) if profile.key else GeoGrid(coords[lat_col], coords[lon_col])
+        if len(square) == 0:
             st.info("No valid numeric coordinates found in filtered data.")
             return
-        
+        zoom = st.slider("Map detail (zoom)", 2, 10, 3, key="map_zoom",
+                         help=f"Cells get finer as you zoom in; from zoom {RAW_ZOOM} up to {RAW_POINT_LIMIT:,} raw points are shown.")
+
+        def binned_heat():
+            cells = square.cells[cell_for_zoom(zoom)]
+            st.caption(f"Showing {len(square):,} disaster locations in {len(cells):,} grid cells. Darker cells indicate more incidents.")
+            heat = (
+                alt.Chart(cells)
+                .mark_rect()
+                .encode(
+                    x=alt.X("lon0:Q", scale=alt.Scale(domain=[-180, 180]), title="Longitude"), x2="lon1:Q",
+                    y=alt.Y("lat0:Q", scale=alt.Scale(domain=[-90, 90]), title="Latitude"), y2="lat1:Q",
+                    color=alt.Color("count:Q", title="Count", scale=alt.Scale(scheme="reds")),
+                    tooltip=[alt.Tooltip("count:Q", title="Count")]
+                )
+                .properties(height=320)
+            )
+            st.altair_chart(heat, use_container_width=True)
+
         # Check for Mapbox token
         if MAPBOX_TOKEN:
             # Option to toggle between heatmap and binned
             map_type = st.radio("Map visualization", ["Heatmap (Mapbox)", "Binned heat (Altair)"], index=0, horizontal=True)
             
             if map_type.startswith("Heatmap"):
-                st.caption(f"Showing {len(mdf):,} disaster locations as a density heatmap. Areas with more incidents appear brighter.")
+                grid = _geo_grid(profile.key, key, "hex", coords) if profile.key else GeoGrid(coords[lat_col], coords[lon_col], "hex")
+                mode, mdf = grid.view(zoom)
+                if mode == "points":
+                    mdf = mdf.assign(count=1)
+                st.caption(f"Showing {len(grid):,} disaster locations as a density heatmap"
+                           + (f" ({len(mdf):,} hex cells)" if mode == "cells" else "")
+                           + ". Areas with more incidents appear brighter.")
+                lat0, lon0 = grid.center()
                 layer = pdk.Layer(
                     "HeatmapLayer",
-                    data=mdf,
+                    data=mdf[["lon", "lat", "count"]],
                     get_position=["lon", "lat"],
-                    aggregation='"MEAN"',
-                    get_weight=1,
+                    aggregation='"SUM"',
+                    get_weight="count",
                     radiusPixels=60,
                 )
                 deck = pdk.Deck(
                     layers=[layer],
                     initial_view_state=pdk.ViewState(
-                        latitude=float(mdf["lat"].mean()),
-                        longitude=float(mdf["lon"].mean()),
-                        zoom=3,
+                        latitude=lat0,
+                        longitude=lon0,
+                        zoom=zoom,
                         pitch=0,
                     ),
                     map_provider="mapbox",
@@ -2749,35 +2812,11 @@ def predictions_tabs(df):
                 )
                 st.pydeck_chart(deck, use_container_width=True)
             else:
-                # Altair binned heat
-                st.caption(f"Showing {len(mdf):,} disaster locations binned by latitude/longitude. Darker cells indicate more incidents.")
-                heat = (
-                    alt.Chart(mdf)
-                    .mark_rect()
-                    .encode(
-                        x=alt.X("lon:Q", bin=alt.Bin(maxbins=30), scale=alt.Scale(domain=[-180, 180]), title="Longitude"),
-                        y=alt.Y("lat:Q", bin=alt.Bin(maxbins=30), scale=alt.Scale(domain=[-90, 90]), title="Latitude"),
-                        color=alt.Color("count():Q", title="Count", scale=alt.Scale(scheme="reds")),
-                        tooltip=[alt.Tooltip("count():Q", title="Count")]
-                    )
-                    .properties(height=320)
-                )
-                st.altair_chart(heat, use_container_width=True)
+                binned_heat()
         else:
             # No token: Altair only
-            st.caption(f"Showing {len(mdf):,} disaster locations binned by latitude/longitude. Darker cells indicate more incidents. (Set MAPBOX_TOKEN for interactive heatmap.)")
-            heat = (
-                alt.Chart(mdf)
-                .mark_rect()
-                .encode(
-                    x=alt.X("lon:Q", bin=alt.Bin(maxbins=30), scale=alt.Scale(domain=[-180, 180]), title="Longitude"),
-                    y=alt.Y("lat:Q", bin=alt.Bin(maxbins=30), scale=alt.Scale(domain=[-90, 90]), title="Latitude"),
-                    color=alt.Color("count():Q", title="Count", scale=alt.Scale(scheme="reds")),
-                    tooltip=[alt.Tooltip("count():Q", title="Count")]
-                )
-                .properties(height=320)
-            )
-            st.altair_chart(heat, use_container_width=True)
+            binned_heat()
+            st.caption("Set MAPBOX_TOKEN for interactive heatmap.")
 
     def table_and_download(data: pd.DataFrame, title="Predictions table", suffix=""):
         st.subheader(f"{title}{suffix}")
@@ -2796,13 +2835,14 @@ def predictions_tabs(df):
         
         # Collect all KPIs
         kpis = [("TOTAL ROWS", len(df))]
-        if TRUE_COL and not df.empty:
-            if TREE_COL in df.columns:
-                tree_acc = accuracy_score(df[TRUE_COL].astype(str), df[TREE_COL].astype(str))
-                kpis.append(("TREE ACCURACY", f"{tree_acc*100:.1f}%"))
-            if NN_COL and NN_COL in df.columns:
-                nn_acc = accuracy_score(df[TRUE_COL].astype(str), df[NN_COL].astype(str))
-                kpis.append(("NEURAL NET ACCURACY", f"{nn_acc*100:.1f}%"))
+        overall = model_metrics(df)
+        if overall is not None:
+            if "Tree" in overall.matrices:
+                kpis.append(("TREE ACCURACY", f"{overall.accuracy('Tree')*100:.1f}%"))
+            if "Neural Network" in overall.matrices:
+                kpis.append(("NEURAL NET ACCURACY", f"{overall.accuracy('Neural Network')*100:.1f}%"))
+            if overall.disagreement() is not None:
+                kpis.append(("TREE VS NN DISAGREEMENT", f"{overall.disagreement()*100:.1f}%"))
         
         # Display KPIs in one row
         cols = st.columns(len(kpis))
@@ -2844,9 +2884,12 @@ def predictions_tabs(df):
         else:
             st.markdown("#### KPIs (filtered)")
             st.write(f"Rows: *{len(base)}*")
-            accuracy_block(base)
+            metrics = model_metrics(base, filter_key)
+            accuracy_block(metrics)
             st.divider()
-            confusion_table(base,"Confusion matrix (Tree)")
+            class_dist_chart(base, "Class distribution (filtered)")
+            st.divider()
+            confusion_table(metrics, "Confusion matrix (Tree)")
             st.divider()
             table_and_download(base,"Predictions table"," (filtered)")
             # Ops Planner bridge
@@ -2854,15 +2897,31 @@ def predictions_tabs(df):
             reg = pick(base, "Region")
             cty = pick(base, "Country")
             if reg and cty:
-                prev = (base.groupby([reg, cty], dropna=False).size().reset_index(name="Incidents"))
-                prev["Trucks"]    = np.ceil(prev["Incidents"] / 20).astype(int)
-                prev["MedKits"]   = (prev["Incidents"] * 10).astype(int)
-                prev["WaterKits"] = (prev["Incidents"] * 10).astype(int)
-                st.dataframe(prev.rename(columns={reg:"Region", cty:"Country"}),
-                             use_container_width=True, hide_index=True, height=220)
-                if st.button("Create Ops Plan", key="create_ops_plan"):
-                    batch_id = write_preposition_plan(prev.rename(columns={reg:"Region", cty:"Country"}))
-                    st.success(f"Ops Plan created. Batch: {batch_id}")
+                demand = incident_demand(base, reg, cty, pick(base, "Year") or "Year")
+                try:
+                    with st.spinner("Optimizing pre-positioning..."):
+                        plan, shipments, summary = _preposition_plan(demand, read_resources_df())
+                except RuntimeError as e:
+                    st.error(str(e))
+                else:
+                    m1, m2, m3, m4 = st.columns(4)
+                    m1.metric("Incidents", summary["incidents"])
+                    m2.metric("Units to procure", summary["procured"])
+                    m3.metric("Units transferred", summary["shipped"])
+                    m4.metric("Uncovered units", summary["unmet"])
+                    st.caption(f"Year-by-year plan over {demand['Year'].nunique()} period(s), starting from current "
+                               f"resource balances; solved in {summary['seconds']} s.")
+                    if summary["dropped_incidents"]:
+                        st.warning(f"{summary['dropped_incidents']} predicted incident(s) have no country and are "
+                                   "not covered by this plan.")
+                    st.dataframe(plan, use_container_width=True, hide_index=True, height=220)
+                    if not shipments.empty:
+                        with st.expander(f"Transfers between countries ({len(shipments)})"):
+                            st.dataframe(shipments, use_container_width=True, hide_index=True)
+                    if st.button("Create Ops Plan", key="create_ops_plan"):
+                        batch_id = write_preposition_plan(plan, shipments,
+                                                          actor_id=(st.session_state.get("user") or {}).get("user_id"))
+                        st.success(f"Ops Plan created. Batch: {batch_id}")
             else:
                 st.caption("Need Region and Country columns to build an Ops Plan.")
 
@@ -2871,7 +2930,7 @@ def predictions_tabs(df):
         if base.empty:
             st.info("No filters selected or no matching rows.")
         else:
-            map_block(base, "Map (filtered records with coordinates)")
+            map_block(base, "Map (filtered records with coordinates)", key=filter_key)
 
     with tabs[3]:
         st.caption("Drop your trained artifacts under /models: tree_baseline.joblib and metrics.json.")
@@ -2955,34 +3014,30 @@ def predictions_tabs(df):
             COUNTRY_COL  = pick(df, "Country")
             YEAR_COL     = pick(df, "Year", "Start Year", "StartYear")
 
-            from simulate_alerts import simulate_future_prediction, load_model
+            from simulate_alerts import load_model, iter_simulate_batch, simulation_locations, save_batch_alerts
             models, encoders, scaler, meta = load_model()
 
             region_filter = selected_region if selected_region != "(All)" else None
             country_filter = selected_country if selected_country != "(All)" else None
 
-            filtered_df = df.copy()
             if 'selected_types' in locals() and selected_types:
                 selected_disaster = selected_types[0]  # pick the first one
             else:
                 selected_disaster = "(All)"
 
-            # Apply filters
+            # Apply filters (shared bitmap index over the same rows as the other tabs)
+            filtered_df = filter_predictions(
+                df, [selected_disaster] if selected_disaster != "(All)" else None,
+                selected_region, selected_country, year_range if YEAR_COL else None,
+                type_cols=(DISASTER_COL,), key=profile.key)
             if DISASTER_COL and selected_disaster and selected_disaster != "(All)":
-                filtered_df = filtered_df[filtered_df[DISASTER_COL] == selected_disaster]
                 st.caption(f"🌪 Filtered by Disaster Type: **{selected_disaster}**")
-
             if REGION_COL and selected_region != "(All)":
-                filtered_df = filtered_df[filtered_df[REGION_COL] == selected_region]
                 st.caption(f"🌍 Filtered by Region: **{selected_region}**")
-
             if COUNTRY_COL and selected_country != "(All)":
-                filtered_df = filtered_df[filtered_df[COUNTRY_COL] == selected_country]
                 st.caption(f"🗺 Filtered by Country: **{selected_country}**")
-
-            if year_range:
+            if year_range and YEAR_COL:
                 y1, y2 = year_range
-                filtered_df = filtered_df[filtered_df[YEAR_COL].between(y1, y2)]
                 st.caption(f"📅 Using historical data from: **{y1}–{y2}**")
 
             if filtered_df.empty:
@@ -2995,14 +3050,21 @@ def predictions_tabs(df):
                 year = st.slider("Select Future Year", 2025, 2050, 2030)
                 if st.button("Predict Future Disasters", type="primary"):
                     results = []
+                    total = len(simulation_locations(filtered_df))
                     progress = st.progress(0)
-                    for i, (_, row) in enumerate(filtered_df.iterrows()):
-                        result = simulate_future_prediction(row.to_dict(), models, encoders, scaler, meta, year=year, selected_disaster=selected_types)
-                        results.append(result)
-                        progress.progress((i + 1) / len(filtered_df))
+                    live = st.empty()
+                    for chunk in iter_simulate_batch(filtered_df, year, selected_disaster=selected_types,
+                                                     models=models, encoders=encoders, scaler=scaler, meta=meta):
+                        results.append(chunk)
+                        partial = pd.concat(results, ignore_index=True)
+                        progress.progress(len(partial) / total)
+                        live.dataframe(partial, use_container_width=True)
                     progress.empty()
+                    live.empty()
 
-                    df_results = pd.DataFrame(results)
+                    df_results = pd.concat(results, ignore_index=True)
+                    save_batch_alerts(df_results, year)
+                    st.caption(f"{total} unique locations from {len(filtered_df)} historical records")
                     st.dataframe(df_results, use_container_width=True)
 
                     high = (df_results["alert_level"] == "HIGH").sum()
@@ -3015,19 +3077,23 @@ def predictions_tabs(df):
                     col3.metric("Low Alerts", low)
                     st.caption("Note: Model predictions may differ from the selected filter. AidBot forecasts the most probable disaster type based on regional and environmental patterns.")
 
-# ---------- Allocation Optimizer (beta) ----------
-def _parse_skills(sk: str) -> set:
-    return {s.strip().lower() for s in (sk or "").split(",") if s.strip()}
+        st.divider()
+        scenario_outlook_panel()
+
+        st.divider()
+        alert_history_panel()
 
+# ---------- Allocation Optimizer (beta) ----------
 def optimizer_panel(role: str):
     lang = st.session_state.get("lang", "en")
     st.subheader("🍀 Allocation Optimizer (beta)")
-    st.caption("Suggests volunteer assignments for unassigned, open cases using region/country and skill match heuristics.")
+    st.caption("Suggests volunteer assignments for unassigned, open cases: an optimal matching on region/country, skills, workload and distance.")
     if role not in ("admin","coordinator"):
         st.info("Only coordinators/admins can run the optimizer.")
         return
     open_status = {"new","acknowledged","en_route","arrived"}
-    cases = [c for c in list_cases() if (c.get("status") in open_status and not c.get("assigned_to"))]
+    all_cases = list_cases()
+    cases = [c for c in all_cases if (c.get("status") in open_status and not c.get("assigned_to"))]
     vols  = list_volunteers()
     if not cases:
         st.success("No unassigned open cases. Nothing to optimize.")
@@ -3036,59 +3102,47 @@ def optimizer_panel(role: str):
         st.warning("No volunteers available.")
         return
     assigned_open = {}
-    for c in list_cases():
+    for c in all_cases:
         if c.get("assigned_to") and c.get("status") in open_status:
             assigned_open[c["assigned_to"]] = assigned_open.get(c["assigned_to"], 0) + 1
-    suggestions = []
-    used_vols = set()
-    for c in cases:
-        ranked = []
-        for v in vols:
-            vid = v["user_id"]
-            if vid in used_vols:
-                continue
-            score = 0
-            why = []
-            if (v.get("region","") or "").strip() and (c.get("region","") or "").strip():
-                if v["region"].strip().lower() == (c.get("region","") or "").strip().lower():
-                    score += 2
-                    why.append("same region")
-            if (v.get("country","") or "").strip() and (c.get("country","") or "").strip():
-                if v["country"].strip().lower() == (c.get("country","") or "").strip().lower():
-                    score += 1
-                    why.append("same country")
-            vs = _parse_skills(v.get("skills",""))
-            want = {"first aid","cpr","nursing","medical doctor","paramedic","boat operator","driving","search & rescue"}
-            overlap = len(vs & want)
-            if overlap:
-                score += overlap*3
-                why.append(f"{overlap} skill match")
-            w = assigned_open.get(vid, 0)
-            if w:
-                score -= w
-                why.append(f"-{w} workload penalty")
-            ranked.append({"v": v, "score": score, "why": ", ".join(why) if why else "generic"})
-        ranked.sort(key=lambda r: r["score"], reverse=True)
-        if ranked and ranked[0]["score"] > float("-inf"):
-            top = ranked[0]
-            v = top["v"]
-            suggestions.append({
-                "case_id": c["case_id"],
-                "victim": c.get("victim_name") or "(no name)",
-                "region": c.get("region",""),
-                "country": c.get("country",""),
-                "vol_id": v["user_id"],
-                "volunteer": v["username"],
-                "score": int(top["score"]),
-                "why": top["why"],
-            })
-            used_vols.add(v["user_id"])
+    capacity = st.number_input("Max open cases per volunteer", min_value=1, max_value=20,
+                               value=DEFAULT_CAPACITY, step=1, key="opt_capacity")
+    # Optimal matching over vectorized scores (region/country, skills, workload, distance),
+    # warm-started from this session's previous plan so only changed cases are re-solved
+    engine = st.session_state.get("assignment_engine")
+    if engine is None:
+        engine = st.session_state["assignment_engine"] = AssignmentEngine(int(capacity), geo=_geo_costs())
+    if st.button("Re-plan from scratch", key="opt_replan"):
+        engine.reset()
+    diff = engine.update(cases, vols, workload=assigned_open, capacity=int(capacity))
+    plan = engine.suggestions()
+    case_by_id = {c["case_id"]: c for c in cases}
+    name_by_id = {v["user_id"]: v["username"] for v in vols}
+    suggestions = [{
+        "case_id": row.case_id,
+        "victim": case_by_id[row.case_id].get("victim_name") or "(no name)",
+        "region": case_by_id[row.case_id].get("region",""),
+        "country": case_by_id[row.case_id].get("country",""),
+        "vol_id": row.vol_id,
+        "volunteer": name_by_id.get(row.vol_id, row.vol_id),
+        "score": row.score,
+        "why": row.why,
+    } for row in plan.itertuples()]
     if not suggestions:
         st.info("No suitable suggestions were found with current data.")
         return
     sug_df = pd.DataFrame(suggestions)
     st.dataframe(sug_df[["case_id","victim","region","country","volunteer","score","why"]],
                  use_container_width=True, hide_index=True, height=220)
+    stats = engine.last_stats
+    st.caption(f"Re-solved {stats['re_solved']} of {stats['open_cases']} open cases in {stats['seconds']}s; "
+               f"{stats['changed']} suggestion(s) changed since the last run.")
+    if not stats["full"] and len(diff):
+        with st.expander("Changes since last run"):
+            show = diff.assign(volunteer=diff["vol_id"].map(name_by_id),
+                               previous=diff["previous_vol_id"].map(name_by_id))
+            st.dataframe(show[["case_id","change","volunteer","previous"]],
+                         use_container_width=True, hide_index=True)
     if st.button(_translate("Apply", lang) + " suggested plan", type="primary", key="apply_plan"):
         for row in suggestions:
             assign_case(row["case_id"], row["vol_id"])
@@ -3097,6 +3151,58 @@ def optimizer_panel(role: str):
         st.success("Plan applied.")
         st.rerun()
 
+# ---------- Shelter Allocation ----------
+def shelter_allocation_panel(role: str):
+    st.subheader("🏠 Shelter Allocation")
+    st.caption("Places open cases without a shelter into shelters with free places, minimizing total travel distance.")
+    if role not in ("admin","coordinator"):
+        st.info("Only coordinators/admins can allocate shelters.")
+        return
+    open_status = {"new","acknowledged","en_route","arrived"}
+    cases = [c for c in list_cases() if c.get("status") in open_status and not c.get("shelter_id")]
+    shelters = list_shelters()
+    if not cases:
+        st.success("Every open case already has a shelter.")
+        return
+    max_km = st.number_input("Max distance (km, 0 = no limit)", min_value=0, value=0, step=50, key="shelter_alloc_km")
+    # Solve only on request; the stored plan is dropped as soon as cases, shelters or the limit change
+    inputs = (max_km, tuple((c["case_id"], c.get("region"), c.get("latitude"), c.get("longitude")) for c in cases),
+              tuple((s["shelter_id"], s.get("region"), s.get("latitude"), s.get("longitude"), s.get("available"))
+                    for s in shelters))
+    stored = st.session_state.get("shelter_alloc")
+    if stored is not None and stored[0] != inputs:
+        stored = st.session_state["shelter_alloc"] = None
+        st.info("Cases or shelters changed since the last plan — compute it again.")
+    if st.button("Compute shelter plan", key="compute_shelter_plan"):
+        stored = st.session_state["shelter_alloc"] = (inputs, *allocate_shelters(cases, shelters, max_km=max_km or None))
+    if stored is None:
+        st.caption(f"{len(cases)} open cases without a shelter.")
+        return
+    _, placements, unplaced = stored
+    names = {s["shelter_id"]: s.get("name") or s["shelter_id"] for s in shelters}
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Cases to place", len(cases))
+    c2.metric("Placed", len(placements))
+    c3.metric("Avg distance (km)", f"{placements['distance_km'].mean():.0f}" if len(placements) else "—")
+    if len(placements):
+        st.dataframe(placements.assign(shelter=placements["shelter_id"].map(names))[
+                         ["case_id","shelter","shelter_id","distance_km","eta_h"]],
+                     use_container_width=True, hide_index=True, height=220)
+    if len(unplaced):
+        with st.expander(f"Not placed ({len(unplaced)})"):
+            st.dataframe(unplaced, use_container_width=True, hide_index=True)
+    if len(placements) and st.button("Apply shelter plan", type="primary", key="apply_shelter_plan"):
+        try:
+            n = place_cases_in_shelters(list(placements[["case_id","shelter_id"]].itertuples(index=False, name=None)),
+                                        actor_id=(st.session_state.get("user") or {}).get("user_id"))
+        except ValueError as e:
+            st.error(f"Plan not applied, data changed meanwhile: {e}")
+        else:
+            _notify_admins_and_coords(f"Shelter allocation applied: {n} cases placed.")
+            st.session_state.pop("shelter_alloc", None)
+            st.success(f"{n} cases placed.")
+            st.rerun()
+
 # ---------- Routing ----------
 route = st.session_state.get("route", "home")
 user  = st.session_state.get("user")
@@ -3270,19 +3376,24 @@ st.subheader("Disaster Predictions Dashboard")
 
 @st.cache_data(show_spinner=False)
 def load_csv(file_bytes: bytes | None) -> pd.DataFrame:
+    # Orange header rows become dtypes; parsed frames are cached as Parquet by content hash
     if file_bytes is not None:
-        return pd.read_csv(io.BytesIO(file_bytes), low_memory=False)
+        return read_orange_csv(file_bytes)
     if os.path.exists(SAMPLE_CSV):
-        try: return pd.read_csv(SAMPLE_CSV, low_memory=False)
+        try: return read_orange_csv(SAMPLE_CSV)
         except Exception: return pd.DataFrame()
     return pd.DataFrame()
 
 up = st.file_uploader("Upload predictions CSV (from Orange)", type=["csv"])
-df_pred = load_csv(up.read() if up is not None else None)
+up_bytes = up.getvalue() if up is not None else None
+df_pred = load_csv(up_bytes)
 if df_pred.empty:
     st.info("Upload a predictions CSV to open the analytics tabs.")
 else:
-    predictions_tabs(df_pred)
+    pred_key = dataset_key(up_bytes if up_bytes is not None else SAMPLE_CSV)
+    pred_profile, df_pred = _prepared_predictions(pred_key, df_pred)
+    st.session_state['disaster_predictions_key'] = pred_key
+    predictions_tabs(df_pred, pred_profile)
 
 st.markdown("---")
 resources_tab(role=role)
@@ -3311,4 +3422,7 @@ else:
             st.code(a["payload_json"], language="json")
 
 st.markdown("---")
-optimizer_panel(role=role)
\ No newline at end of file
+optimizer_panel(role=role)
+
+st.markdown("---")
+shelter_allocation_panel(role=role)
\ No newline at end of file
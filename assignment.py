@@ -0,0 +1,578 @@
+# assignment.py — Volunteer-to-case assignment: vectorized scoring + optimal capacitated matching
+
+import contextlib
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+from blood_redistribution import REGION_CENTROIDS
+from geo_cost import GeoCostCache, haversine_km
+
+# Skills every open case currently asks for (cases carry no skill requirements yet)
+DEFAULT_CASE_SKILLS = ("first aid", "cpr", "nursing", "medical doctor", "paramedic",
+                       "boat operator", "driving", "search & rescue")
+
+REGION_WEIGHT = 2.0
+COUNTRY_WEIGHT = 1.0
+SKILL_WEIGHT = 3.0             # per overlapping skill
+WORKLOAD_WEIGHT = 1.0          # per open case already assigned
+DISTANCE_WEIGHT = 0.5          # per 100 km, when both ends have coordinates
+ASSIGN_BONUS = 1_000.0         # makes covering a case always beat leaving it open
+
+DEFAULT_CAPACITY = 3           # open cases a volunteer may hold, including current ones
+TOP_K = 12                     # candidate volunteer classes kept per case for the sparse solver
+SLOTS_PER_EDGE = 4             # slots of a class each case is linked to
+DENSE_LIMIT = 2_000_000        # cases x volunteer-slots up to which the Hungarian solver is used
+CHUNK_CASES = 512
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(x):
+    x = x.astype(np.uint64)
+    out = np.zeros(x.shape, dtype=np.uint8)
+    for shift in range(0, 64, 8):
+        out += _POPCOUNT8[(x >> np.uint64(shift)) & np.uint64(0xFF)]
+    return out
+
+
+def _norm(v):
+    return (v or "").strip().lower()
+
+
+def parse_skills(skills):
+    """Lower-cased skill set from a comma-separated string or an iterable."""
+    if isinstance(skills, str):
+        skills = skills.split(",")
+    return {_norm(s) for s in (skills or []) if _norm(s)}
+
+
+class SkillVocab:
+    """Skill name -> bit position; at most 64 distinct skills fit in one mask."""
+
+    def __init__(self, names=()):
+        self.bits = {}
+        for n in names:
+            self.bit(n)
+
+    def bit(self, name):
+        if name not in self.bits:
+            if len(self.bits) >= 64:
+                return 0
+            self.bits[name] = len(self.bits)
+        return 1 << self.bits[name]
+
+    def mask(self, skills):
+        m = 0
+        for s in parse_skills(skills):
+            m |= self.bit(s)
+        return m
+
+
+def _coords(rec):
+    """(lat, lon) from a record's own coordinates, else its region centroid, else NaN."""
+    lat, lon = rec.get("latitude"), rec.get("longitude")
+    if lat is not None and lon is not None and not (pd.isna(lat) or pd.isna(lon)):
+        return float(lat), float(lon)
+    return REGION_CENTROIDS.get((rec.get("region") or "").strip(), (np.nan, np.nan))
+
+
+class Side:
+    """Column arrays for one side of the matching (cases or volunteers)."""
+
+    def __init__(self, ids, region, country, skills, lat, lon, extra=None):
+        self.ids = np.asarray(ids, dtype=object)
+        self.region = region
+        self.country = country
+        self.skills = skills
+        self.lat = lat
+        self.lon = lon
+        self.extra = extra or {}
+        self.geo = None        # (GeoCostCache, set name) to take distances from, if any
+
+    def __len__(self):
+        return len(self.ids)
+
+    def locations(self):
+        """(code per row, unique lat, unique lon); volunteers placed by region share a few points."""
+        if not hasattr(self, "_locations"):
+            xy = np.stack([self.lat, self.lon], axis=1)
+            uniq, codes = np.unique(np.nan_to_num(xy, nan=1e9), axis=0, return_inverse=True)
+            uniq[uniq == 1e9] = np.nan
+            self._locations = (codes.ravel(), uniq[:, 0], uniq[:, 1])
+        return self._locations
+
+    def skill_codes(self):
+        """(code per row, unique skill masks); skill sets repeat a lot across people."""
+        if not hasattr(self, "_skill_codes"):
+            uniq, codes = np.unique(self.skills, return_inverse=True)
+            self._skill_codes = (codes.ravel(), uniq)
+        return self._skill_codes
+
+
+def _label_codes(values, table):
+    """Integer codes for normalized labels, shared through table; blanks -> -1."""
+    out = np.empty(len(values), dtype=np.int64)
+    for i, v in enumerate(values):
+        v = _norm(v)
+        out[i] = table.setdefault(v, len(table)) if v else -1
+    return out
+
+
+def case_side(cases, vocab, labels):
+    """Side for list_cases() dicts; label codes are shared with the volunteer side through labels."""
+    xy = np.array([_coords(c) for c in cases], dtype=float).reshape(-1, 2)
+    return Side([c["case_id"] for c in cases],
+                _label_codes([c.get("region") for c in cases], labels.setdefault("region", {})),
+                _label_codes([c.get("country") for c in cases], labels.setdefault("country", {})),
+                np.array([vocab.mask(c.get("skills_needed") or DEFAULT_CASE_SKILLS) for c in cases], dtype=np.uint64),
+                xy[:, 0], xy[:, 1])
+
+
+def set_workload(vols, workload=None, capacity=DEFAULT_CAPACITY):
+    """(Re)set the workload and remaining capacity (capacity - current open cases) of a volunteer Side."""
+    workload = workload or {}
+    load = np.array([workload.get(v, 0) for v in vols.ids], dtype=float)
+    vols.extra = {"workload": load, "capacity": np.maximum(capacity - load, 0).astype(int)}
+    return vols
+
+
+def volunteer_side(volunteers, vocab, labels, workload=None, capacity=DEFAULT_CAPACITY):
+    """Side for list_volunteers() dicts with workload / remaining capacity set."""
+    xy = np.array([_coords(v) for v in volunteers], dtype=float).reshape(-1, 2)
+    vs = Side([v["user_id"] for v in volunteers],
+              _label_codes([v.get("region") for v in volunteers], labels.setdefault("region", {})),
+              _label_codes([v.get("country") for v in volunteers], labels.setdefault("country", {})),
+              np.array([vocab.mask(v.get("skills")) for v in volunteers], dtype=np.uint64),
+              xy[:, 0], xy[:, 1])
+    return set_workload(vs, workload, capacity)
+
+
+def build_sides(cases, volunteers, workload=None, capacity=DEFAULT_CAPACITY, vocab=None, labels=None):
+    """
+    (cases Side, volunteers Side) from list_cases() / list_volunteers() dicts. Volunteers
+    get remaining capacity = capacity - current open workload.
+    """
+    vocab = vocab or SkillVocab(DEFAULT_CASE_SKILLS)
+    labels = labels if labels is not None else {}
+    return (case_side(cases, vocab, labels),
+            volunteer_side(volunteers, vocab, labels, workload, capacity))
+
+
+def pair_components(cases, vols, rows, cols):
+    """score_components() terms for case rows[i] x volunteer cols[i] (index arrays broadcast)."""
+    rows, cols = np.asarray(rows), np.asarray(cols)
+    shape = np.broadcast_shapes(rows.shape, cols.shape)
+    cr, vr = cases.region[rows], vols.region[cols]
+    cc, vc = cases.country[rows], vols.country[cols]
+    return {
+        "region": ((cr == vr) & (cr >= 0)).astype(np.float32),
+        "country": ((cc == vc) & (cc >= 0)).astype(np.float32),
+        "skills": _popcount(cases.skills[rows] & vols.skills[cols]).astype(np.float32),
+        "workload": np.broadcast_to(vols.extra["workload"][cols], shape).astype(np.float32),
+        "distance_km": haversine_km(cases.lat[rows], cases.lon[rows], vols.lat[cols], vols.lon[cols]).astype(np.float32),
+    }
+
+
+def score_components(cases, vols, rows=None, cols=None):
+    """
+    Score terms for case rows x volunteer cols (all by default) as float32 arrays:
+    region, country, skills (overlap count), workload, distance_km (NaN if unknown).
+    """
+    rows = np.arange(len(cases)) if rows is None else np.asarray(rows)
+    cols = np.arange(len(vols)) if cols is None else np.asarray(cols)
+    r, c = rows[:, None], cols[None, :]
+    cr, vr = cases.region[r], vols.region[c]
+    cc, vc = cases.country[r], vols.country[c]
+    # Distances once per distinct volunteer location and skill overlaps once per distinct
+    # (case mask, volunteer mask) pair, then gathered per cell
+    codes, ulat, ulon = vols.locations()
+    if cases.geo is not None and vols.geo is not None:
+        geo, case_set = cases.geo
+        dist = geo.distance_km(case_set, vols.geo[1], cases.ids[rows], location_ids(ulat, ulon))
+    else:
+        dist = haversine_km(cases.lat[r], cases.lon[r], ulat[None, :], ulon[None, :]).astype(np.float32)
+    c_sk, c_masks = cases.skill_codes()
+    v_sk, v_masks = vols.skill_codes()
+    overlap = _popcount(c_masks[:, None] & v_masks[None, :]).astype(np.float32)
+    return {
+        "region": ((cr == vr) & (cr >= 0)).astype(np.float32),
+        "country": ((cc == vc) & (cc >= 0)).astype(np.float32),
+        "skills": overlap[c_sk[r], v_sk[c]],
+        "workload": np.broadcast_to(vols.extra["workload"][c], (len(rows), len(cols))).astype(np.float32),
+        "distance_km": dist[:, codes[cols]],
+    }
+
+
+def location_ids(lat, lon):
+    """Stable GeoCostCache ids for volunteer locations (the same point keeps its id across rebuilds)."""
+    return [f"{a:.6f},{b:.6f}" for a, b in zip(lat, lon)]
+
+
+def combine(parts):
+    """Weighted score from score_components() terms (unknown distance costs nothing)."""
+    out = REGION_WEIGHT * parts["region"]
+    out += COUNTRY_WEIGHT * parts["country"]
+    out += SKILL_WEIGHT * parts["skills"]
+    out -= WORKLOAD_WEIGHT * parts["workload"]
+    dist = parts["distance_km"]
+    out -= np.where(np.isnan(dist), np.float32(0), dist * np.float32(DISTANCE_WEIGHT / 100.0))
+    return out
+
+
+def _top_per_row(values, k):
+    """Column indices of the k largest values in each row (unordered)."""
+    k = min(k, values.shape[1])
+    return np.argpartition(-values, k - 1, axis=1)[:, :k]
+
+
+def volunteer_classes(vols, capacity=None):
+    """
+    Group volunteers with identical scoring attributes (region, country, skills,
+    location, workload): members of a class are interchangeable. Returns
+    (representative per class, slot owners grouped by class, first slot per class).
+    Only volunteers with spare capacity get slots.
+    """
+    cap = vols.extra["capacity"] if capacity is None else capacity
+    avail = np.flatnonzero(cap > 0)
+    keys = np.stack([vols.region[avail], vols.country[avail], vols.skills[avail].view(np.int64),
+                     np.nan_to_num(vols.lat[avail], nan=1e9).view(np.int64),
+                     np.nan_to_num(vols.lon[avail], nan=1e9).view(np.int64),
+                     vols.extra["workload"][avail].astype(np.int64)], axis=1)
+    _, first, cls = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    cls = cls.ravel()
+    order = np.argsort(cls, kind="stable")
+    owners = np.repeat(avail[order], cap[avail[order]])
+    n_slots = np.bincount(cls, weights=cap[avail], minlength=len(first)).astype(np.int64)
+    return avail[first], owners, np.concatenate([[0], np.cumsum(n_slots)])
+
+
+def candidate_edges(cases, vols, top_k=TOP_K, capacity=None, case_rows=None, chunk=CHUNK_CASES):
+    """
+    Sparse slot graph: every case (or just case_rows) is linked to its top_k volunteer
+    classes. Each such edge fans out to SLOTS_PER_EDGE of the class's slots, picked
+    round-robin by case index. Identical volunteers then share the load instead of the
+    same few members winning every tie. Scores are computed per class, in case chunks.
+    Returns (case_idx, slot_idx, score, slot_owner).
+    """
+    reps, owners, first_slot = volunteer_classes(vols, capacity)
+    case_rows = np.arange(len(cases)) if case_rows is None else case_rows
+    ci, si, sc = [np.zeros(0, np.int64)], [np.zeros(0, np.int64)], [np.zeros(0, np.float32)]
+    if len(reps) and len(case_rows):
+        n_slots = np.diff(first_slot)
+        for start in range(0, len(case_rows), chunk):
+            rows = case_rows[start:start + chunk]
+            s = combine(score_components(cases, vols, rows, reps))
+            top = _top_per_row(s, top_k)
+            r = np.repeat(rows, top.shape[1])
+            k = top.ravel()
+            fan = np.minimum(n_slots[k], SLOTS_PER_EDGE)
+            r2, k2 = np.repeat(r, fan), np.repeat(k, fan)
+            j = np.arange(fan.sum()) - np.repeat(np.cumsum(fan) - fan, fan)
+            ci.append(r2)
+            si.append(first_slot[k2] + (r2 * SLOTS_PER_EDGE + j) % n_slots[k2])
+            sc.append(np.repeat(np.take_along_axis(s, top, axis=1).ravel(), fan))
+    return np.concatenate(ci), np.concatenate(si), np.concatenate(sc), owners
+
+
+def _solve_dense(cases, vols):
+    """Hungarian solve with each volunteer expanded into one column per free slot."""
+    cap = vols.extra["capacity"]
+    slots = np.repeat(np.arange(len(vols)), cap)
+    s = combine(score_components(cases, vols, None, slots))
+    r, c = linear_sum_assignment(-(s.astype(float) + ASSIGN_BONUS))
+    return r, slots[c]
+
+
+def match_slots(n_cases, n_slots, ci, si, sc, bonus=ASSIGN_BONUS):
+    """
+    Max-score matching of cases to slots over the given edges (scipy's sparse LAPJV).
+    Each case also gets a private "unassigned" column scoring bonus less than any edge,
+    so a full matching always exists and leaving a case open is the last resort.
+    """
+    shift = float(sc.max()) + 1.0 if len(sc) else 1.0          # costs must be > 0 (0 = no edge)
+    cost = np.concatenate([shift - sc.astype(float), np.full(n_cases, shift + bonus)])
+    graph = csr_matrix((cost, (np.concatenate([ci, np.arange(n_cases)]),
+                               np.concatenate([si, n_slots + np.arange(n_cases)]))),
+                       shape=(n_cases, n_slots + n_cases))
+    rows, cols = min_weight_full_bipartite_matching(graph)
+    real = cols < n_slots
+    return rows[real], cols[real]
+
+
+def _solve_sparse(cases, vols, top_k, max_rounds=12):
+    """
+    Matching on the sparse slot graph, exact for that graph. While cases stay open and
+    volunteers keep spare slots, the open cases are re-linked to the classes that still
+    have room and matched into those slots.
+    """
+    cap = vols.extra["capacity"].copy()
+    ci, si, sc, owners = candidate_edges(cases, vols, top_k, cap)
+    r, slot = match_slots(len(cases), len(owners), ci, si, sc)
+    assigned_c, assigned_v = [r], [owners[slot]]
+    for _ in range(max_rounds):
+        cap -= np.bincount(assigned_v[-1], minlength=len(cap))
+        open_cases = np.setdiff1d(np.arange(len(cases)), np.concatenate(assigned_c))
+        if len(open_cases) == 0 or not (cap > 0).any():
+            break
+        ci, si, sc, owners = candidate_edges(cases, vols, top_k, cap, open_cases)
+        # Re-index the open cases densely for the matching
+        pos = np.full(len(cases), -1)
+        pos[open_cases] = np.arange(len(open_cases))
+        r, slot = match_slots(len(open_cases), len(owners), pos[ci], si, sc)
+        if len(r) == 0:
+            break
+        assigned_c.append(open_cases[r])
+        assigned_v.append(owners[slot])
+    return np.concatenate(assigned_c), np.concatenate(assigned_v)
+
+
+def explain(parts, i):
+    """Human-readable reasons for pair i of pair_components() output."""
+    why = []
+    if parts["region"][i]:
+        why.append("same region")
+    if parts["country"][i]:
+        why.append("same country")
+    if parts["skills"][i]:
+        why.append(f"{int(parts['skills'][i])} skill match")
+    if parts["workload"][i]:
+        why.append(f"-{int(parts['workload'][i])} workload penalty")
+    if not np.isnan(parts["distance_km"][i]):
+        why.append(f"~{parts['distance_km'][i]:.0f} km")
+    return ", ".join(why) if why else "generic"
+
+
+def solve(cases_side, vols_side, top_k=TOP_K, dense_limit=DENSE_LIMIT):
+    """
+    Assignment for prepared sides: (case_idx, vol_idx) arrays. Uses the exact Hungarian
+    solver when cases x free slots <= dense_limit, else sparse LAPJV on the top-k slot graph.
+    """
+    if len(cases_side) == 0 or vols_side.extra["capacity"].sum() == 0:
+        return np.zeros(0, int), np.zeros(0, int)
+    if len(cases_side) * int(vols_side.extra["capacity"].sum()) <= dense_limit:
+        return _solve_dense(cases_side, vols_side)
+    return _solve_sparse(cases_side, vols_side, top_k)
+
+
+def suggestions_frame(cases_side, vols_side, ci, vi):
+    """case_id, vol_id, score, why for the chosen pairs, best scores first."""
+    parts = pair_components(cases_side, vols_side, ci, vi)
+    score = combine(parts)
+    out = pd.DataFrame({
+        "case_id": cases_side.ids[ci], "vol_id": vols_side.ids[vi],
+        "score": np.round(score, 2), "why": [explain(parts, i) for i in range(len(ci))],
+    })
+    return out.sort_values("score", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def assign_volunteers(cases, volunteers, workload=None, capacity=DEFAULT_CAPACITY, top_k=TOP_K):
+    """
+    Suggested assignments for unassigned cases (list_cases() dicts) and volunteers
+    (list_volunteers() dicts). workload maps user_id -> open cases already held; a
+    volunteer takes at most capacity open cases in total.
+    """
+    cs, vs = build_sides(cases, volunteers, workload, capacity)
+    ci, vi = solve(cs, vs, top_k)
+    return suggestions_frame(cs, vs, ci, vi)
+
+
+CASE_FIELDS = ("region", "country", "latitude", "longitude", "skills_needed")
+VOLUNTEER_FIELDS = ("region", "country", "latitude", "longitude", "skills")
+
+
+def _fingerprint(rec, fields):
+    return tuple(str(rec.get(f)) for f in fields)
+
+
+class AssignmentEngine:
+    """
+    Assignment state kept between optimizer runs (one per session). update() takes the
+    current unassigned open cases, volunteers and workload and warm-starts from the last
+    plan: suggestions whose case is still open and whose volunteer is unchanged and still
+    has room are kept as they are. Only new cases, cases that lost their volunteer and -
+    once capacity was freed - cases left open last time are solved again, against the
+    slots the kept suggestions leave free. A new capacity setting re-solves from scratch.
+    With a GeoCostCache, case x volunteer-location distances come from (and stay in) its
+    "assign_cases" x "assign_points" blocks, so re-solves only compute rows for cases
+    that are new or moved.
+    """
+
+    CASE_SET, POINT_SET = "assign_cases", "assign_points"
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, top_k=TOP_K, geo=None):
+        self.capacity = capacity
+        self.top_k = top_k
+        self.geo = geo
+        self.reset()
+
+    def reset(self):
+        self.vocab = SkillVocab(DEFAULT_CASE_SKILLS)
+        self.labels = {}
+        self.cases = {}            # case_id -> fingerprint, in arrival order
+        self.volunteers = {}       # user_id -> fingerprint
+        self.workload = {}
+        self.vols = None           # volunteer Side, rebuilt only when volunteers change
+        self.vol_pos = {}
+        self.plan = {}             # case_id -> {"vol_id", "score", "why"}
+        self.last_diff = _diff_frame([])
+        self.last_stats = {}
+
+    def update(self, cases, volunteers, workload=None, capacity=None):
+        """Re-plan for the current data; returns the suggestion diff (see diff())."""
+        t0 = time.perf_counter()
+        workload = workload or {}
+        capacity = self.capacity if capacity is None else capacity
+        full = self.vols is None or capacity != self.capacity
+        previous = {cid: p["vol_id"] for cid, p in self.plan.items()}
+        if full:
+            self.plan = {}
+        self.capacity = capacity
+
+        v_fp = {v["user_id"]: _fingerprint(v, VOLUNTEER_FIELDS) for v in volunteers}
+        changed_vols = {u for u, fp in self.volunteers.items() if v_fp.get(u) != fp}
+        freed = bool(v_fp.keys() - self.volunteers.keys()) or any(
+            workload.get(u, 0) < n for u, n in self.workload.items())
+        if full or changed_vols or v_fp.keys() != self.volunteers.keys():
+            self.vols = volunteer_side(volunteers, self.vocab, self.labels)
+            self.vol_pos = {u: i for i, u in enumerate(self.vols.ids)}
+        set_workload(self.vols, workload, capacity)
+
+        # Drop suggestions for cases that were closed / assigned / edited, or whose volunteer left or changed
+        c_fp = {c["case_id"]: _fingerprint(c, CASE_FIELDS) for c in cases}
+        for cid in list(self.plan):
+            vid = self.plan[cid]["vol_id"]
+            if c_fp.get(cid) != self.cases.get(cid):
+                del self.plan[cid]
+                freed = True
+            elif vid not in v_fp or vid in changed_vols:
+                del self.plan[cid]
+
+        # Volunteers whose workload grew past their capacity give up their weakest suggestions
+        per_vol = {}
+        for cid, p in self.plan.items():
+            per_vol.setdefault(p["vol_id"], []).append(cid)
+        cap = self.vols.extra["capacity"].copy()
+        for vid, cids in per_vol.items():
+            i = self.vol_pos[vid]
+            for cid in sorted(cids, key=lambda c: self.plan[c]["score"])[:max(len(cids) - cap[i], 0)]:
+                del self.plan[cid]
+            cap[i] = max(cap[i] - len(cids), 0)
+
+        todo = [cid for cid in c_fp if cid not in self.plan]
+        if not freed and not full:
+            # Cases left open last time cannot do better until capacity comes back
+            todo = [cid for cid in todo if cid in previous or c_fp[cid] != self.cases.get(cid)]
+        if todo and cap.sum() > 0:
+            recs = {c["case_id"]: c for c in cases}
+            cs = case_side([recs[cid] for cid in todo], self.vocab, self.labels)
+            vs = self.vols
+            extra, vs.extra = vs.extra, {"workload": vs.extra["workload"], "capacity": cap}
+            with self.geo.lock if self.geo is not None else contextlib.nullcontext():
+                if self.geo is not None:
+                    self._sync_geo(cases, cs, vs)
+                try:
+                    ci, vi = solve(cs, vs, self.top_k)
+                finally:
+                    vs.extra = extra
+            parts = pair_components(cs, vs, ci, vi)
+            score = combine(parts)
+            for n, (i, j) in enumerate(zip(ci, vi)):
+                self.plan[cs.ids[i]] = {"vol_id": vs.ids[j], "score": round(float(score[n]), 2),
+                                        "why": explain(parts, n)}
+
+        self.cases, self.volunteers, self.workload = c_fp, v_fp, dict(workload)
+        self.last_diff = _diff_frame(_changes(previous, self.plan, c_fp))
+        self.last_stats = {"open_cases": len(c_fp), "re_solved": len(todo), "suggested": len(self.plan),
+                           "changed": len(self.last_diff), "full": full,
+                           "seconds": round(time.perf_counter() - t0, 3)}
+        return self.last_diff
+
+    def _sync_geo(self, cases, cs, vs):
+        """Point the cache at the current open cases and volunteer locations; closed cases leave it."""
+        lat, lon = zip(*(_coords(c) for c in cases)) if cases else ((), ())
+        self.geo.sync(self.CASE_SET, [c["case_id"] for c in cases], lat, lon)
+        _, ulat, ulon = vs.locations()
+        self.geo.sync(self.POINT_SET, location_ids(ulat, ulon), ulat, ulon)
+        cs.geo, vs.geo = (self.geo, self.CASE_SET), (self.geo, self.POINT_SET)
+
+    def diff(self):
+        """Changes made by the last update(): case_id, change (added/moved/dropped), vol_id, previous_vol_id."""
+        return self.last_diff
+
+    def suggestions(self):
+        """Current plan as case_id, vol_id, score, why (same layout as suggestions_frame())."""
+        rows = [{"case_id": cid, **self.plan[cid]} for cid in self.cases if cid in self.plan]
+        out = pd.DataFrame(rows, columns=["case_id", "vol_id", "score", "why"])
+        return out.sort_values("score", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def _changes(previous, plan, order):
+    """added / moved / dropped rows between two {case_id: vol_id} plans, in case order."""
+    rows = []
+    for cid in list(order) + [c for c in previous if c not in order]:
+        old, new = previous.get(cid), plan.get(cid, {}).get("vol_id")
+        if old == new:
+            continue
+        change = "added" if old is None else "dropped" if new is None else "moved"
+        rows.append({"case_id": cid, "change": change, "vol_id": new, "previous_vol_id": old})
+    return rows
+
+
+def _diff_frame(rows):
+    return pd.DataFrame(rows, columns=["case_id", "change", "vol_id", "previous_vol_id"])
+
+
+def _synthetic(n_cases, n_vols, seed=0):
+    rng = np.random.default_rng(seed)
+    regions = list(REGION_CENTROIDS)
+    skills = list(DEFAULT_CASE_SKILLS) + ["logistics", "interpreter", "radio comms"]
+    cases = [{"case_id": f"C{i}", "region": regions[rng.integers(len(regions))],
+              "latitude": rng.uniform(-10, 50), "longitude": rng.uniform(60, 140)} for i in range(n_cases)]
+    vols = [{"user_id": f"U{i}", "region": regions[rng.integers(len(regions))],
+             "skills": ", ".join(rng.choice(skills, rng.integers(0, 4), replace=False))} for i in range(n_vols)]
+    return cases, vols
+
+
+def benchmark(n_cases=10_000, n_vols=5_000, capacity=DEFAULT_CAPACITY, top_k=TOP_K, seed=0):
+    """Timings for scoring + solving a synthetic instance (default 10k cases x 5k volunteers)."""
+    cases, vols = _synthetic(n_cases, n_vols, seed)
+    t0 = time.perf_counter()
+    cs, vs = build_sides(cases, vols, capacity=capacity)
+    t1 = time.perf_counter()
+    ci, vi = solve(cs, vs, top_k)
+    t2 = time.perf_counter()
+    load = np.bincount(vi, minlength=len(vs))
+    return {
+        "cases": n_cases, "volunteers": n_vols, "assigned": len(ci),
+        "max_per_volunteer": int(load.max()) if len(load) else 0,
+        "total_score": round(float(combine(pair_components(cs, vs, ci, vi)).sum()), 1),
+        "prepare_s": round(t1 - t0, 3), "solve_s": round(t2 - t1, 3),
+    }
+
+
+def benchmark_incremental(n_cases=10_000, n_vols=5_000, n_changed=50, capacity=DEFAULT_CAPACITY, seed=0,
+                          geo=None):
+    """Full AssignmentEngine run, then one with n_changed cases closed and n_changed new ones."""
+    cases, vols = _synthetic(n_cases + n_changed, n_vols, seed)
+    engine = AssignmentEngine(capacity, geo=geo)
+    t0 = time.perf_counter()
+    engine.update(cases[:n_cases], vols)
+    t1 = time.perf_counter()
+    diff = engine.update(cases[n_changed:], vols)
+    t2 = time.perf_counter()
+    return {"full_s": round(t1 - t0, 3), "incremental_s": round(t2 - t1, 3),
+            "re_solved": engine.last_stats["re_solved"], "diff_rows": len(diff),
+            "suggested": engine.last_stats["suggested"]}
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        print(benchmark())
+        print(benchmark_incremental())
+        print(benchmark_incremental(geo=GeoCostCache()))
@@ -0,0 +1,99 @@
+# blood_expiry.py — Vectorized blood expiry engine (days-left, status buckets, FEFO order)
+
+import datetime as dt
+import numpy as np
+import pandas as pd
+
+EXPIRES_SOON_DAYS = 7   # "Expires soon" / notification window
+URGENT_DAYS = 3         # at-risk rows at or below this are URGENT
+
+# Bucket codes (also the first FEFO sort key: expired and dated rows before undated ones)
+BUCKET_EXPIRED = 0
+BUCKET_SOON = 1
+BUCKET_OK = 2
+BUCKET_MISSING = 3
+BUCKET_INVALID = 4
+
+_BUCKET_LABELS = np.array(["Expired", "Expires soon", "", "—", "Invalid date"], dtype=object)
+_BUCKET_COLORS = np.array(["#b91c1c", "#b45309", "#065f46", "#6b7280", "#6b7280"], dtype=object)
+
+
+def expiry_frame(inventory: pd.DataFrame, today=None) -> pd.DataFrame:
+    """
+    Parse ExpiresOn once and annotate every inventory row.
+
+    Adds: DaysLeft (float, NaN when missing/invalid), ExpiryBucket (int code),
+    _Expiry (display label), ExpiryColor and FefoRank (0 = ship first).
+    Rows keep their original order; use fefo_sort() for first-expiry-first-out.
+    """
+    out = inventory.copy()
+    if "ExpiresOn" not in out.columns:
+        out["ExpiresOn"] = ""
+    if "Units" not in out.columns:
+        out["Units"] = 0
+    today = pd.Timestamp(today or dt.date.today()).normalize()
+
+    raw = out["ExpiresOn"].fillna("").astype(str).str.strip()
+    parsed = pd.to_datetime(raw, format="%Y-%m-%d", errors="coerce")
+    days = (parsed - today).dt.days.to_numpy(dtype=float)
+
+    missing = (raw == "").to_numpy()
+    invalid = np.isnan(days) & ~missing
+    bucket = np.where(days < 0, BUCKET_EXPIRED,
+             np.where(days <= EXPIRES_SOON_DAYS, BUCKET_SOON, BUCKET_OK))
+    bucket = np.where(missing, BUCKET_MISSING, np.where(invalid, BUCKET_INVALID, bucket))
+
+    label = _BUCKET_LABELS[bucket].copy()
+    ok = bucket == BUCKET_OK
+    label[ok] = ["In %d days" % d for d in days[ok].astype(int)]
+
+    out["Units"] = pd.to_numeric(out["Units"], errors="coerce").fillna(0).astype(int)
+    out["DaysLeft"] = days
+    out["ExpiryBucket"] = bucket
+    out["_Expiry"] = label
+    out["ExpiryColor"] = _BUCKET_COLORS[bucket]
+
+    # FEFO: dated rows by days left (expired first), then smaller lots; undated rows last
+    dated = ~np.isnan(days)
+    k_days = np.where(dated, days, 0)
+    k_units = np.where(dated, out["Units"].to_numpy(), 0)
+    order = np.lexsort((k_units, k_days, ~dated))
+    rank = np.empty(len(out), dtype=np.int64)
+    rank[order] = np.arange(len(out))
+    out["FefoRank"] = rank
+    return out
+
+
+def fefo_sort(frame: pd.DataFrame) -> pd.DataFrame:
+    """Return rows in first-expiry-first-out order."""
+    return frame.sort_values("FefoRank", kind="stable").reset_index(drop=True)
+
+
+def at_risk(frame: pd.DataFrame, days_threshold: int = EXPIRES_SOON_DAYS) -> pd.DataFrame:
+    """Rows expiring within days_threshold (0..threshold days left), soonest first."""
+    days = frame["DaysLeft"]
+    hit = frame[(days >= 0) & (days <= days_threshold)]
+    if hit.empty:
+        return pd.DataFrame()
+    hit = fefo_sort(hit)
+    res = hit[["id", "Region", "Country", "BloodType", "Units", "ExpiresOn"]].copy()
+    res["DaysLeft"] = hit["DaysLeft"].astype(int).to_numpy()
+    res["Status"] = np.where(res["DaysLeft"] <= URGENT_DAYS, "URGENT", "WARNING")
+    return res
+
+
+def threshold_messages(frame: pd.DataFrame) -> pd.Series:
+    """
+    Notification text per row (None when nothing to report): empty stock,
+    expired or expiring within EXPIRES_SOON_DAYS.
+    """
+    days = frame["DaysLeft"].to_numpy()
+    units = frame["Units"].to_numpy()
+    msg = np.full(len(frame), None, dtype=object)
+
+    soon = (days >= 0) & (days <= EXPIRES_SOON_DAYS)
+    expired = days < 0
+    msg[soon] = ["Blood inventory alert: record expiring in %d day(s)." % d for d in days[soon].astype(int)]
+    msg[expired] = ["Blood inventory alert: record expired %d day(s) ago." % d for d in np.abs(days[expired]).astype(int)]
+    msg[units <= 0] = "Blood inventory alert: units is 0."
+    return pd.Series(msg, index=frame.index, dtype=object)
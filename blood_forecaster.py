@@ -8,10 +8,112 @@ from datetime import datetime, timedelta
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import LabelEncoder
 import joblib
+from blood_expiry import expiry_frame, at_risk
+from blood_redistribution import plan_transfers
 
 MODELS_DIR = "models"
 os.makedirs(MODELS_DIR, exist_ok=True)
 
+# Blood units used per 1000 affected, by disaster type
+DISASTER_BLOOD_USAGE = {
+    'Earthquake': {'min': 50, 'max': 200, 'avg': 125},
+    'Flood': {'min': 20, 'max': 80, 'avg': 50},
+    'Storm': {'min': 30, 'max': 100, 'avg': 65},
+    'Epidemic': {'min': 10, 'max': 40, 'avg': 25},
+    'Drought': {'min': 5, 'max': 20, 'avg': 12},
+    'Landslide': {'min': 40, 'max': 150, 'avg': 95},
+    'Wildfire': {'min': 25, 'max': 90, 'avg': 57},
+}
+
+TRAINING_REGIONS = [
+    'Southeast Asia', 'East Asia', 'South Asia',
+    'Central Asia', 'Western Asia'
+]
+
+# Scenario cube grid: severity 1-5, season 0-3, population knots (thousands affected)
+SEVERITY_LEVELS = np.arange(1, 6)
+SEASONS = np.arange(4)
+POPULATION_KNOTS = np.array([1, 2.5, 5, 7.5, 10, 15, 20, 25, 30, 35, 40, 45, 50,
+                             60, 70, 80, 90, 100], dtype=np.float32)
+
+
+def _synthetic_block(rng, n_rows):
+    """
+    Draw n_rows synthetic records column-wise.
+    Categorical columns are built from codes with sorted categories, so the codes
+    line up with what LabelEncoder would produce (train() reuses them directly).
+    """
+    disasters = sorted(DISASTER_BLOOD_USAGE)
+    regions = sorted(TRAINING_REGIONS)
+    base_rate = np.array([DISASTER_BLOOD_USAGE[d]['avg'] for d in disasters], dtype=np.float32)
+
+    disaster_code = rng.integers(0, len(disasters), n_rows, dtype=np.int8)
+    region_code = rng.integers(0, len(regions), n_rows, dtype=np.int8)
+    pop_affected = rng.uniform(1, 100, n_rows).astype(np.float32)   # 1k to 100k people
+    severity = rng.integers(1, 6, n_rows, dtype=np.int8)            # 1-5 scale
+    season = rng.integers(0, 4, n_rows, dtype=np.int8)              # Spring..Winter
+    variance = rng.uniform(0.8, 1.2, n_rows).astype(np.float32)     # realistic variance
+
+    blood_units = (pop_affected * base_rate[disaster_code] / 1000) * (severity / np.float32(3.0)) * variance
+    blood_units = np.maximum(5, blood_units.astype(np.int32))       # minimum of 5 units
+
+    return pd.DataFrame({
+        'disaster_type': pd.Categorical.from_codes(disaster_code, categories=disasters),
+        'region': pd.Categorical.from_codes(region_code, categories=regions),
+        'population_affected_thousands': pop_affected,
+        'severity': severity,
+        'season': season,
+        'blood_units_used': blood_units,
+    })
+
+
+def iter_synthetic_chunks(n_rows, chunk_rows=1_000_000, seed=42):
+    """Yield synthetic DataFrames of at most chunk_rows rows (reproducible per seed)."""
+    n_chunks = max(1, -(-int(n_rows) // int(chunk_rows)))
+    children = np.random.SeedSequence(seed).spawn(n_chunks)
+    remaining = int(n_rows)
+    for child in children:
+        size = min(int(chunk_rows), remaining)
+        if size <= 0:
+            break
+        yield _synthetic_block(np.random.default_rng(child), size)
+        remaining -= size
+
+
+def write_synthetic_parquet(path, n_rows, chunk_rows=1_000_000, seed=42):
+    """Stream synthetic training data to a Parquet file chunk by chunk (needs pyarrow)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("pyarrow is required to write Parquet training data") from e
+
+    writer = None
+    written = 0
+    try:
+        for chunk in iter_synthetic_chunks(n_rows, chunk_rows, seed):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            written += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    print(f"✅ Wrote {written:,} synthetic records to {path}")
+    return written
+
+
+def _encode_column(encoder, series):
+    """LabelEncoder.fit_transform, but reuse codes when the column is already categorical."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        cats = list(series.cat.categories)
+        if cats == sorted(cats) and not series.isna().any():
+            encoder.classes_ = np.asarray(cats, dtype=object)
+            return series.cat.codes.to_numpy()
+    return encoder.fit_transform(series)
+
+
 class BloodDemandForecaster:
     """
     Predicts blood demand based on:
@@ -36,8 +138,9 @@ class BloodDemandForecaster:
         self.disaster_encoder = LabelEncoder()
         self.region_encoder = LabelEncoder()
         self.trained = False
+        self.scenario_cube = None
         
-    def create_synthetic_training_data(self):
+    def create_synthetic_training_data(self, n_rows=5000, seed=42):
         """
         Create synthetic training data based on real-world disaster → blood usage patterns.
         In production, replace with actual historical data.
@@ -48,64 +151,12 @@ class BloodDemandForecaster:
         - Storm: 30-100 units per 1000 affected
         - Epidemic: 10-40 units per 1000 affected
         - Drought: 5-20 units per 1000 affected (indirect)
+        
+        Every column is drawn as a whole array, so n_rows can go into the millions.
+        Use iter_synthetic_chunks / write_synthetic_parquet for larger-than-memory sets.
         """
         print("📊 Generating synthetic training data...")
-        
-        disaster_blood_usage = {
-            'Earthquake': {'min': 50, 'max': 200, 'avg': 125},
-            'Flood': {'min': 20, 'max': 80, 'avg': 50},
-            'Storm': {'min': 30, 'max': 100, 'avg': 65},
-            'Epidemic': {'min': 10, 'max': 40, 'avg': 25},
-            'Drought': {'min': 5, 'max': 20, 'avg': 12},
-            'Landslide': {'min': 40, 'max': 150, 'avg': 95},
-            'Wildfire': {'min': 25, 'max': 90, 'avg': 57},
-        }
-        
-        regions = [
-            'Southeast Asia', 'East Asia', 'South Asia', 
-            'Central Asia', 'Western Asia'
-        ]
-        
-        data = []
-        np.random.seed(42)
-        
-        # Generate 5000 synthetic historical records
-        for _ in range(5000):
-            disaster = np.random.choice(list(disaster_blood_usage.keys()))
-            region = np.random.choice(regions)
-            
-            # Population affected (in thousands)
-            pop_affected = np.random.uniform(1, 100)  # 1k to 100k people
-            
-            # Severity (1-5 scale)
-            severity = np.random.randint(1, 6)
-            
-            # Season (affects logistics and availability)
-            season = np.random.choice(['Spring', 'Summer', 'Fall', 'Winter'])
-            season_encoded = {'Spring': 0, 'Summer': 1, 'Fall': 2, 'Winter': 3}[season]
-            
-            # Calculate blood units needed based on disaster type and severity
-            base_rate = disaster_blood_usage[disaster]['avg']
-            severity_multiplier = severity / 3.0  # Scale severity impact
-            
-            blood_units = int(
-                (pop_affected * base_rate / 1000) * severity_multiplier * 
-                np.random.uniform(0.8, 1.2)  # Add realistic variance
-            )
-            
-            # Ensure minimum of 5 units
-            blood_units = max(5, blood_units)
-            
-            data.append({
-                'disaster_type': disaster,
-                'region': region,
-                'population_affected_thousands': pop_affected,
-                'severity': severity,
-                'season': season_encoded,
-                'blood_units_used': blood_units
-            })
-        
-        df = pd.DataFrame(data)
+        df = _synthetic_block(np.random.default_rng(seed), int(n_rows))
         print(f"✅ Generated {len(df)} synthetic training records")
         return df
     
@@ -129,11 +180,11 @@ class BloodDemandForecaster:
             historical_data = self.create_synthetic_training_data()
         
         # Encode categorical variables
-        historical_data['disaster_encoded'] = self.disaster_encoder.fit_transform(
-            historical_data['disaster_type']
+        historical_data['disaster_encoded'] = _encode_column(
+            self.disaster_encoder, historical_data['disaster_type']
         )
-        historical_data['region_encoded'] = self.region_encoder.fit_transform(
-            historical_data['region']
+        historical_data['region_encoded'] = _encode_column(
+            self.region_encoder, historical_data['region']
         )
         
         # Prepare features
@@ -147,9 +198,11 @@ class BloodDemandForecaster:
         
         y = historical_data['blood_units_used']
         
-        # Train model
+        # Train model (any cube from the previous fit is stale from here on)
+        self.scenario_cube = None
         self.demand_model.fit(X, y)
         self.trained = True
+        self.build_scenario_cube()
         
         # Calculate training score
         train_score = self.demand_model.score(X, y)
@@ -171,6 +224,46 @@ class BloodDemandForecaster:
         ):
             print(f"   {name}: {importance:.3f}")
     
+    def build_scenario_cube(self):
+        """
+        Evaluate the model once over the whole discrete feature grid.
+
+        The cube is indexed [disaster, region, severity-1, season, population knot];
+        predict_demand() gathers from it and interpolates between population knots
+        instead of running the forest per scenario.
+        """
+        n_d = len(self.disaster_encoder.classes_)
+        n_r = len(self.region_encoder.classes_)
+        grid = np.meshgrid(np.arange(n_d), np.arange(n_r), SEVERITY_LEVELS, SEASONS,
+                           POPULATION_KNOTS, indexing='ij')
+        X = pd.DataFrame({
+            'disaster_encoded': grid[0].ravel(),
+            'region_encoded': grid[1].ravel(),
+            'population_affected_thousands': grid[4].ravel(),
+            'severity': grid[2].ravel(),
+            'season': grid[3].ravel(),
+        })
+        cube = self.demand_model.predict(X).astype(np.float32)
+        self.scenario_cube = cube.reshape(n_d, n_r, len(SEVERITY_LEVELS), len(SEASONS), len(POPULATION_KNOTS))
+        return self.scenario_cube
+    
+    def lookup_demand(self, disaster_encoded, region_encoded, population, severity, season):
+        """
+        Vectorized cube lookup: all arguments are equal-length arrays (or scalars).
+        Population is clipped to the knot range and interpolated linearly.
+        """
+        if self.scenario_cube is None:
+            self.build_scenario_cube()
+        d, r, sev, sea, pop = np.broadcast_arrays(*map(np.atleast_1d, (
+            disaster_encoded, region_encoded, severity, season, population)))
+        pop = np.clip(pop.astype(np.float32), POPULATION_KNOTS[0], POPULATION_KNOTS[-1])
+        hi = np.clip(np.searchsorted(POPULATION_KNOTS, pop), 1, len(POPULATION_KNOTS) - 1)
+        lo = hi - 1
+        w = (pop - POPULATION_KNOTS[lo]) / (POPULATION_KNOTS[hi] - POPULATION_KNOTS[lo])
+        cell = self.scenario_cube[d, r, sev - 1, sea]
+        rows = np.arange(len(cell))
+        return (1 - w) * cell[rows, lo] + w * cell[rows, hi]
+    
     def predict_demand(self, disaster_predictions, region_populations=None):
         """
         Predict blood demand based on disaster predictions
@@ -202,74 +295,59 @@ class BloodDemandForecaster:
                 'Unknown': 40
             }
         
-        results = []
         current_season = (datetime.now().month % 12) // 3  # 0-3 for seasons
         
-        for pred in disaster_predictions:
-            region = pred.get('region', 'Unknown')
-            disaster = pred.get('predicted_disaster', 'Unknown')
-            confidence = pred.get('confidence', 50) / 100
-            year = pred.get('year', datetime.now().year)
-            
-            # Skip if disaster type not in training data
-            if disaster not in self.disaster_encoder.classes_:
-                continue
-            
-            # Encode inputs
-            disaster_encoded = self.disaster_encoder.transform([disaster])[0]
-            
-            # Handle unknown regions
-            if region in self.region_encoder.classes_:
-                region_encoded = self.region_encoder.transform([region])[0]
-            else:
-                # Use most common region encoding as fallback
-                region_encoded = 0
-            
-            population = region_populations.get(region, 40)
-            
-            # Estimate severity based on confidence
-            # High confidence = likely severe disaster
-            severity = int(np.clip(1 + (confidence * 4), 1, 5))
-            
-            # Prepare features
-            features = np.array([[
-                disaster_encoded,
-                region_encoded,
-                population,
-                severity,
-                current_season
-            ]])
-            
-            # Predict blood units needed
-            predicted_units = int(self.demand_model.predict(features)[0])
-            
-            # Adjust by confidence (lower confidence = wider range)
-            uncertainty = int(predicted_units * (1 - confidence) * 0.3)
-            
-            results.append({
-                'region': region,
-                'predicted_disaster': disaster,
-                'year': year,
-                'predicted_blood_units': predicted_units,
-                'confidence': confidence * 100,
-                'severity_estimate': severity,
-                'range_min': max(5, predicted_units - uncertainty),
-                'range_max': predicted_units + uncertainty,
-                'alert_level': self._get_alert_level(predicted_units)
-            })
-        
-        return pd.DataFrame(results)
+        preds = pd.DataFrame(list(disaster_predictions))
+        if preds.empty:
+            return pd.DataFrame()
+        for col, default in (('region', 'Unknown'), ('predicted_disaster', 'Unknown'),
+                             ('confidence', 50), ('year', datetime.now().year)):
+            preds[col] = preds[col].fillna(default) if col in preds.columns else default
+        
+        # Skip disaster types not in training data
+        preds = preds[preds['predicted_disaster'].isin(self.disaster_encoder.classes_)]
+        if preds.empty:
+            return pd.DataFrame()
+        
+        # Encode inputs; unknown regions fall back to encoding 0
+        disaster_encoded = self.disaster_encoder.transform(preds['predicted_disaster'])
+        known = preds['region'].isin(self.region_encoder.classes_).to_numpy()
+        region_encoded = np.zeros(len(preds), dtype=np.int64)
+        region_encoded[known] = self.region_encoder.transform(preds['region'][known])
+        
+        population = preds['region'].map(region_populations).fillna(40).to_numpy(dtype=float)
+        confidence = preds['confidence'].to_numpy(dtype=float) / 100
+        
+        # Estimate severity based on confidence
+        # High confidence = likely severe disaster
+        severity = np.clip(1 + (confidence * 4), 1, 5).astype(int)
+        
+        # Predict blood units needed (table gather, no model call)
+        predicted_units = self.lookup_demand(
+            disaster_encoded, region_encoded, population, severity, current_season
+        ).astype(int)
+        
+        # Adjust by confidence (lower confidence = wider range)
+        uncertainty = (predicted_units * (1 - confidence) * 0.3).astype(int)
+        
+        return pd.DataFrame({
+            'region': preds['region'].to_numpy(),
+            'predicted_disaster': preds['predicted_disaster'].to_numpy(),
+            'year': preds['year'].to_numpy(),
+            'predicted_blood_units': predicted_units,
+            'confidence': confidence * 100,
+            'severity_estimate': severity,
+            'range_min': np.maximum(5, predicted_units - uncertainty),
+            'range_max': predicted_units + uncertainty,
+            'alert_level': self._get_alert_level(predicted_units),
+        })
     
     def _get_alert_level(self, units):
-        """Categorize demand into alert levels"""
-        if units >= 100:
-            return 'HIGH'
-        elif units >= 50:
-            return 'MEDIUM'
-        else:
-            return 'LOW'
+        """Categorize demand (array of units) into alert levels"""
+        units = np.asarray(units)
+        return np.select([units >= 100, units >= 50], ['HIGH', 'MEDIUM'], 'LOW')
     
-    def match_supply_demand(self, current_inventory, demand_predictions):
+    def match_supply_demand(self, current_inventory, demand_predictions, burn_rates=None, horizon_days=14):
         """
         Match regional blood supply with predicted demand
         Returns recommendations for redistribution
@@ -277,6 +355,9 @@ class BloodDemandForecaster:
         Args:
             current_inventory: DataFrame from read_blood_df()
             demand_predictions: DataFrame from predict_demand()
+            burn_rates: optional DataFrame from db.blood_burn_rates(); when given, supply
+                is projected horizon_days ahead along the observed consumption curve
+            horizon_days: projection horizon in days
         
         Returns:
             List of redistribution recommendations
@@ -287,23 +368,31 @@ class BloodDemandForecaster:
         
         # Group current inventory by region
         supply_by_region = current_inventory.groupby('Region')['Units'].sum().to_dict()
+        burn_by_region = {}
+        if burn_rates is not None and not burn_rates.empty:
+            burn_by_region = burn_rates.groupby('region')['burn_per_day'].sum().to_dict()
         
         for _, pred in demand_predictions.iterrows():
             region = pred['region']
             needed = pred['predicted_blood_units']
             disaster = pred['predicted_disaster']
             
-            # Get current supply in region
+            # Get current supply in region, projected forward when consumption is known
             current_supply = supply_by_region.get(region, 0)
+            burn = burn_by_region.get(region, 0.0)
+            projected_supply = max(0, int(round(current_supply - burn * horizon_days)))
             
             # Calculate shortage/surplus
-            balance = current_supply - needed
-            coverage_percent = (current_supply / needed * 100) if needed > 0 else 100
+            balance = projected_supply - needed
+            coverage_percent = (projected_supply / needed * 100) if needed > 0 else 100
             
             recommendation = {
                 'region': region,
                 'predicted_disaster': disaster,
                 'current_supply': current_supply,
+                'projected_supply': projected_supply,
+                'burn_per_day': round(burn, 2),
+                'days_of_cover': round(current_supply / burn, 1) if burn > 0 else None,
                 'predicted_demand': needed,
                 'balance': balance,
                 'coverage_percent': round(coverage_percent, 1)
@@ -338,6 +427,20 @@ class BloodDemandForecaster:
         
         return recommendations
     
+    def plan_redistribution(self, current_inventory, demand_predictions, **kwargs):
+        """
+        Concrete transfer plan for predicted demand (see blood_redistribution.plan_transfers)
+        
+        Args:
+            current_inventory: DataFrame from read_blood_df()
+            demand_predictions: DataFrame from predict_demand()
+        
+        Returns:
+            (shipments, unmet) DataFrames
+        """
+        print("\n🚚 Planning blood transfers...")
+        return plan_transfers(current_inventory, demand_predictions, **kwargs)
+    
     def check_expiry_waste(self, current_inventory, days_threshold=7):
         """
         Identify blood about to expire that could be redistributed
@@ -349,33 +452,9 @@ class BloodDemandForecaster:
         Returns:
             DataFrame of at-risk blood units
         """
-        at_risk = []
-        today = datetime.now().date()
-        
-        for _, row in current_inventory.iterrows():
-            expires_str = row.get('ExpiresOn', '')
-            if not expires_str:
-                continue
-            
-            try:
-                expires_date = datetime.strptime(expires_str, '%Y-%m-%d').date()
-                days_left = (expires_date - today).days
-                
-                if 0 <= days_left <= days_threshold:
-                    at_risk.append({
-                        'id': row['id'],
-                        'Region': row['Region'],
-                        'Country': row['Country'],
-                        'BloodType': row['BloodType'],
-                        'Units': row['Units'],
-                        'ExpiresOn': expires_str,
-                        'DaysLeft': days_left,
-                        'Status': 'URGENT' if days_left <= 3 else 'WARNING'
-                    })
-            except Exception:
-                continue
-        
-        return pd.DataFrame(at_risk) if at_risk else pd.DataFrame()
+        if current_inventory is None or current_inventory.empty:
+            return pd.DataFrame()
+        return at_risk(expiry_frame(current_inventory), days_threshold)
     
     def save_model(self):
         """Save trained model to disk"""
@@ -418,11 +497,40 @@ class BloodDemandForecaster:
         self.disaster_encoder = encoders['disaster']
         self.region_encoder = encoders['region']
         self.trained = True
+        self.build_scenario_cube()
         
         print("✅ Model loaded successfully")
         return True
 
 
+def benchmark(sizes=(5_000, 1_000_000, 10_000_000), train=True, seed=42):
+    """
+    Time synthetic data generation (and optionally model training) per row count.
+    Returns a DataFrame with one row per size.
+    """
+    import time
+
+    rows = []
+    for n in sizes:
+        forecaster = BloodDemandForecaster()
+        t0 = time.perf_counter()
+        data = forecaster.create_synthetic_training_data(n_rows=n, seed=seed)
+        gen_s = time.perf_counter() - t0
+        train_s = None
+        if train:
+            t0 = time.perf_counter()
+            forecaster.train(data)
+            train_s = time.perf_counter() - t0
+        rows.append({
+            'rows': n,
+            'datagen_seconds': round(gen_s, 3),
+            'train_seconds': round(train_s, 3) if train_s is not None else None,
+            'memory_mb': round(data.memory_usage(deep=True).sum() / 1e6, 1),
+        })
+        del data
+    return pd.DataFrame(rows)
+
+
 def main():
     """Standalone training script"""
     print("="*60)
@@ -441,4 +549,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import sys
+    if "--bench" in sys.argv:
+        print(benchmark(train="--no-train" not in sys.argv).to_string(index=False))
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,198 @@
+# blood_redistribution.py — Min-cost blood transfer planner (ABO/Rh compatible, FEFO-aware)
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linprog
+from scipy.sparse import csr_matrix
+
+from blood_expiry import expiry_frame
+from geo_cost import distance_matrix
+
+BLOOD_TYPES = ["O-", "O+", "A-", "A+", "B-", "B+", "AB-", "AB+"]
+
+# Red-cell donor → recipient compatibility
+_CAN_RECEIVE_FROM = {
+    "O-":  ["O-"],
+    "O+":  ["O-", "O+"],
+    "A-":  ["O-", "A-"],
+    "A+":  ["O-", "O+", "A-", "A+"],
+    "B-":  ["O-", "B-"],
+    "B+":  ["O-", "O+", "B-", "B+"],
+    "AB-": ["O-", "A-", "B-", "AB-"],
+    "AB+": BLOOD_TYPES,
+}
+COMPATIBLE = np.array([[d in _CAN_RECEIVE_FROM[r] for r in BLOOD_TYPES] for d in BLOOD_TYPES])  # [donor, recipient]
+
+# Typical ABO/Rh mix in Asia, used to split untyped regional demand
+BLOOD_TYPE_MIX = {
+    "O+": 0.380, "A+": 0.260, "B+": 0.270, "AB+": 0.065,
+    "O-": 0.010, "A-": 0.006, "B-": 0.006, "AB-": 0.003,
+}
+
+# Approximate centroids for the region names used across the app and datasets
+REGION_CENTROIDS = {
+    "East Asia": (35.0, 115.0), "Eastern Asia": (35.0, 115.0),
+    "Southeast Asia": (5.0, 110.0), "South-Eastern Asia": (5.0, 110.0),
+    "South Asia": (23.0, 80.0), "Southern Asia": (23.0, 80.0),
+    "Central Asia": (43.0, 66.0),
+    "West Asia": (30.0, 45.0), "Western Asia": (30.0, 45.0),
+}
+
+UNKNOWN_DISTANCE_KM = 3000.0
+
+
+def region_distance_matrix(regions, coords=None):
+    """Pairwise great-circle distance (km) between region centroids; unknown → UNKNOWN_DISTANCE_KM."""
+    coords = {**REGION_CENTROIDS, **(coords or {})}
+    lat = np.array([coords.get(r, (np.nan, np.nan))[0] for r in regions], dtype=float)
+    lon = np.array([coords.get(r, (np.nan, np.nan))[1] for r in regions], dtype=float)
+    d = distance_matrix(lat, lon, lat, lon)
+    d = np.where(np.isnan(d), UNKNOWN_DISTANCE_KM, d)
+    np.fill_diagonal(d, 0.0)
+    return d
+
+
+def demand_by_type(demand: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalise demand to (region, blood_type, units).
+    Accepts predict_demand() output or any frame with region + units columns;
+    untyped demand is split with BLOOD_TYPE_MIX.
+    """
+    if demand is None or demand.empty:
+        return pd.DataFrame(columns=["region", "blood_type", "units"])
+    units_col = "units" if "units" in demand.columns else "predicted_blood_units"
+    d = demand.rename(columns={units_col: "units"})
+    if "blood_type" in d.columns:
+        out = d.groupby(["region", "blood_type"], as_index=False)["units"].sum()
+    else:
+        per_region = d.groupby("region", as_index=False)["units"].sum()
+        mix = pd.DataFrame({"blood_type": list(BLOOD_TYPE_MIX), "share": list(BLOOD_TYPE_MIX.values())})
+        out = per_region.merge(mix, how="cross")
+        out["units"] = np.round(out["units"] * out["share"]).astype(int)
+        out = out.drop(columns="share")
+    out = out[out["units"] > 0]
+    return out[["region", "blood_type", "units"]].reset_index(drop=True)
+
+
+def plan_transfers(inventory: pd.DataFrame, demand: pd.DataFrame, coords=None, distances=None,
+                   max_candidates: int = 8, cost_per_km: float = 1.0, expiry_weight: float = 5.0,
+                   substitution_penalty: float = 50.0, unmet_penalty: float = 1e6, today=None):
+    """
+    Solve a min-cost flow from inventory to regional demand.
+
+    inventory: read_blood_df() frame (id, Region, Country, BloodType, Units, ExpiresOn)
+    demand:    frame accepted by demand_by_type()
+    distances: optional {(from_region, to_region): km}, overrides centroid distances
+
+    Local stock is free to use in its own region, so only cross-region flows become
+    shipments. Expired units are excluded; among usable units the cost grows with days
+    left, so the soonest-to-expire lots are shipped first. Each lot only considers its
+    max_candidates nearest demand regions, which keeps the LP sparse.
+
+    Returns (shipments, unmet): shipments has one row per inventory id and destination,
+    unmet lists (region, blood_type, units) demand that no compatible stock can cover.
+    """
+    shipment_cols = ["inventory_id", "from_region", "from_country", "blood_type", "to_region",
+                     "recipient_type", "units", "expires_on", "days_left", "distance_km"]
+    need = demand_by_type(demand)
+    need = need[need["blood_type"].isin(BLOOD_TYPES)]
+    empty = pd.DataFrame(columns=shipment_cols)
+    if need.empty:
+        return empty, pd.DataFrame(columns=["region", "blood_type", "units"])
+
+    inv = expiry_frame(inventory, today) if inventory is not None and not inventory.empty else pd.DataFrame()
+    if not inv.empty:
+        inv = inv[(inv["Units"] > 0) & ~(inv["DaysLeft"] < 0) & inv["BloodType"].isin(BLOOD_TYPES)]
+    if inv.empty:
+        return empty, need
+
+    # Lots: rows sharing region, type and days left are interchangeable
+    inv = inv.assign(_days=inv["DaysLeft"].fillna(365.0))
+    lots = inv.groupby(["Region", "BloodType", "_days"], as_index=False, sort=False)["Units"].sum()
+
+    regions = pd.Index(pd.unique(pd.concat([lots["Region"], need["region"]], ignore_index=True)))
+    dist = region_distance_matrix(list(regions), coords)
+    for (a, b), km in (distances or {}).items():
+        if a in regions and b in regions:
+            dist[regions.get_loc(a), regions.get_loc(b)] = km
+
+    type_idx = {t: i for i, t in enumerate(BLOOD_TYPES)}
+    lot_r = regions.get_indexer(lots["Region"])
+    lot_t = lots["BloodType"].map(type_idx).to_numpy()
+    need_r = regions.get_indexer(need["region"])
+    need_t = need["blood_type"].map(type_idx).to_numpy()
+
+    # Candidate destination regions per lot region: itself + nearest demand regions
+    demand_regions = np.unique(need_r)
+    k = min(max_candidates, len(demand_regions))
+    near = demand_regions[np.argsort(dist[:, demand_regions], axis=1, kind="stable")[:, :k]]
+    allowed_region = np.zeros((len(regions), len(regions)), dtype=bool)
+    allowed_region[np.arange(len(regions))[:, None], near] = True
+    np.fill_diagonal(allowed_region, True)
+
+    # Edges lot → demand node (vectorized over all pairs, then masked)
+    ok = COMPATIBLE[lot_t][:, need_t] & allowed_region[lot_r][:, need_r]
+    li, di = np.nonzero(ok)
+    if len(li) == 0:
+        return empty, need
+
+    km = dist[lot_r[li], need_r[di]]
+    cost = (cost_per_km * km
+            + expiry_weight * lots["_days"].to_numpy()[li]
+            + substitution_penalty * (lot_t[li] != need_t[di]))
+
+    n_edges, n_need, n_lots = len(li), len(need), len(lots)
+    c = np.concatenate([cost, np.full(n_need, unmet_penalty)])
+    a_ub = csr_matrix((np.ones(n_edges), (li, np.arange(n_edges))), shape=(n_lots, n_edges + n_need))
+    a_eq = csr_matrix((np.ones(n_edges + n_need),
+                       (np.concatenate([di, np.arange(n_need)]), np.arange(n_edges + n_need))),
+                      shape=(n_need, n_edges + n_need))
+    res = linprog(c, A_ub=a_ub, b_ub=lots["Units"].to_numpy(dtype=float),
+                  A_eq=a_eq, b_eq=need["units"].to_numpy(dtype=float),
+                  bounds=(0, None), method="highs")
+    if res.status != 0:
+        raise RuntimeError(f"Transfer planner failed: {res.message}")
+
+    flow = np.round(res.x[:n_edges]).astype(int)
+    unmet_units = np.round(res.x[n_edges:]).astype(int)
+    unmet = need.assign(units=unmet_units)
+    unmet = unmet[unmet["units"] > 0].reset_index(drop=True)
+
+    moved = (flow > 0) & (lot_r[li] != need_r[di])
+    if not moved.any():
+        return empty, unmet
+    flows = pd.DataFrame({
+        "lot": li[moved], "to_region": regions[need_r[di[moved]]],
+        "recipient_type": need["blood_type"].to_numpy()[di[moved]],
+        "units": flow[moved], "distance_km": np.round(km[moved], 1),
+    })
+    return _assign_rows(inv, lots, flows)[shipment_cols], unmet
+
+
+def _assign_rows(inv, lots, flows):
+    """Spread each lot's outgoing flows over its inventory rows (cumulative interval overlap)."""
+    keys = ["Region", "BloodType", "_days"]
+    rows = inv.merge(lots[keys].reset_index().rename(columns={"index": "lot"}), on=keys)
+    rows = rows[rows["lot"].isin(flows["lot"])].sort_values(["lot", "FefoRank"], kind="stable")
+    rows["r_hi"] = rows.groupby("lot")["Units"].cumsum()
+    rows["r_lo"] = rows["r_hi"] - rows["Units"]
+
+    flows = flows.sort_values(["lot", "distance_km"], kind="stable")
+    flows["f_hi"] = flows.groupby("lot")["units"].cumsum()
+    flows["f_lo"] = flows["f_hi"] - flows["units"]
+
+    pairs = rows.merge(flows, on="lot", suffixes=("_row", ""))
+    take = np.minimum(pairs["r_hi"], pairs["f_hi"]) - np.maximum(pairs["r_lo"], pairs["f_lo"])
+    pairs = pairs.assign(units=take)[take > 0]
+    return pd.DataFrame({
+        "inventory_id": pairs["id"].to_numpy(),
+        "from_region": pairs["Region"].to_numpy(),
+        "from_country": pairs["Country"].to_numpy(),
+        "blood_type": pairs["BloodType"].to_numpy(),
+        "to_region": pairs["to_region"].to_numpy(),
+        "recipient_type": pairs["recipient_type"].to_numpy(),
+        "units": pairs["units"].astype(int).to_numpy(),
+        "expires_on": pairs["ExpiresOn"].to_numpy(),
+        "days_left": pairs["DaysLeft"].to_numpy(),
+        "distance_km": pairs["distance_km"].to_numpy(),
+    }).sort_values(["to_region", "days_left", "distance_km"], kind="stable").reset_index(drop=True)
@@ -0,0 +1,153 @@
+# dataset_profile.py — Per-dataset profile: cleaned label dictionaries, sidebar options, year bounds
+
+import os
+import re
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# Orange type/flag rows that slip through as data in hand-exported CSVs
+BAD_TRUE = {"class",
+            "Drought Earthquake Epidemic Extreme\\ temperature Flood Other Landslide Storm Wildfire",
+            ""}
+
+COLUMN_NAMES = {
+    "true": ("Disaster Type", "True", "Target", "Disaster_Type"),
+    "tree": ("Tree",),
+    "nn": ("Neural Network", "NeuralNetwork", "NN"),
+    "year": ("Year", "Start Year", "StartYear"),
+    "region": ("Region",),
+    "country": ("Country",),
+    "lat": ("Latitude", "lat", "Lat"),
+    "lon": ("Longitude", "lon", "Lng", "Long"),
+}
+LABEL_ROLES = ("true", "tree", "nn", "region", "country")
+
+
+def dataset_key(source):
+    """Cache key for a dataset: content hash for uploaded bytes, (path, mtime, size) for a file."""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha1(source).hexdigest()
+    st = os.stat(source)
+    return f"{os.path.abspath(source)}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def clean_label(text):
+    """Remove slashes, extra spaces, and invalid entries."""
+    if not isinstance(text, str):
+        return None
+    t = text.strip().replace("\\", "").replace("  ", " ")
+    if not t or t.lower() in ["nan", "none", "(dry)"]:
+        return None
+    return t
+
+
+def clean_disaster_types(values):
+    """Clean and extract valid disaster type names from distinct label values."""
+    items = []
+    for val in values:
+        val = str(val).strip().replace("\\", "")
+        # skip known combined long string
+        if "Drought Earthquake Epidemic" in val:
+            continue
+        # split only on punctuation, NOT spaces
+        items.extend(p.strip() for p in re.split(r'[;,|]', val) if p.strip())
+    return sorted({clean_label(x) for x in items if clean_label(x)})
+
+
+def clean_region_country(values):
+    """Clean distinct Region/Country values and remove combined multi-items."""
+    items = []
+    for val in values:
+        val = str(val).strip().replace("\\", "")
+        # skip long joined entries like 'Central Asia Eastern Asia ...'
+        if "Eastern Asia" in val and "Western Asia" in val:
+            continue
+        if "Afghanistan" in val and "Yemen" in val:
+            continue
+        # split only if comma/semicolon/pipe — not spaces
+        items.extend(p.strip() for p in re.split(r'[;,|]', val) if p.strip())
+    return ["(All)"] + sorted({clean_label(x) for x in items if clean_label(x)})
+
+
+def _encode(series):
+    """(codes, labels) with labels stripped and deduplicated; NaN -> code -1."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    stripped = [str(u).strip() for u in uniques]
+    labels = sorted(set(stripped))
+    pos = {l: i for i, l in enumerate(labels)}
+    remap = np.array([pos[s] for s in stripped] + [-1], dtype=np.int32)
+    return remap[codes], labels       # codes == -1 picks the trailing -1
+
+
+class DatasetProfile:
+    """
+    Everything the predictions dashboard derives from the raw label columns, computed
+    once per dataset: the resolved column names, each label column as integer codes
+    into its cleaned label dictionary, the junk-row mask, the sidebar option lists and
+    the year bounds. String processing only ever touches the distinct labels.
+    """
+
+    def __init__(self, key, n_rows, cols, codes, labels, keep, type_options, region_options,
+                 country_options, year_bounds):
+        self.key = key
+        self.n_rows = n_rows
+        self.cols = cols
+        self.codes = codes
+        self.labels = labels
+        self.keep = keep
+        self.type_options = type_options
+        self.region_options = region_options
+        self.country_options = country_options
+        self.year_bounds = year_bounds
+
+    @classmethod
+    def from_frame(cls, df, key=None):
+        cols = {role: next((n for n in names if n in df.columns), None) for role, names in COLUMN_NAMES.items()}
+        codes, labels = {}, {}
+        for role in LABEL_ROLES:
+            if cols[role]:
+                codes[role], labels[role] = _encode(df[cols[role]])
+
+        keep = np.ones(len(df), dtype=bool)
+        if "true" in codes:
+            bad = np.array([l in BAD_TRUE for l in labels["true"]] + [False])
+            keep = ~bad[codes["true"]]
+
+        def used(role):
+            # Labels still present after the junk rows are dropped
+            c = codes[role][keep]
+            return [labels[role][i] for i in np.unique(c[c >= 0])]
+
+        if "true" in codes:
+            type_options = clean_disaster_types(used("true"))
+        else:
+            type_options = clean_disaster_types([l for r in ("tree", "nn") if r in codes for l in used(r)])
+        region_options = clean_region_country(used("region")) if "region" in codes else ["(All)"]
+        country_options = clean_region_country(used("country")) if "country" in codes else ["(All)"]
+
+        year_bounds = None
+        if cols["year"]:
+            y = pd.to_numeric(df[cols["year"]], errors="coerce").to_numpy(dtype=float)[keep]
+            if np.isfinite(y).any():
+                year_bounds = (int(np.nanmin(y)), int(np.nanmax(y)))
+        return cls(key, len(df), cols, codes, labels, keep, type_options, region_options,
+                   country_options, year_bounds)
+
+    def column(self, role):
+        """Cleaned label column for role as a Categorical over the profile's dictionary."""
+        return pd.Categorical.from_codes(self.codes[role], categories=self.labels[role])
+
+    def frame(self, df):
+        """
+        df with label columns replaced by their cleaned categoricals, a numeric year
+        column and the junk rows dropped. df must be the frame the profile was built from.
+        """
+        out = df.copy(deep=False)
+        for role in self.codes:
+            out[self.cols[role]] = self.column(role)
+        year = self.cols["year"]
+        if year and not pd.api.types.is_numeric_dtype(out[year]):
+            out[year] = pd.to_numeric(out[year], errors="coerce")
+        return out[self.keep] if not self.keep.all() else out
@@ -1,6 +1,9 @@
-import os, sqlite3, time, hashlib, secrets, json, re
+import os, sqlite3, time, hashlib, secrets, json, re, threading
 from typing import Optional, Dict, Any, List
 import pandas as pd
+from blood_expiry import expiry_frame
+from thresholds import (DEFAULT_THRESHOLDS, RESOURCE_COLUMNS, resource_alerts as _resource_alerts, blood_alerts as _blood_alerts,
+                        transitions as _transitions, transition_messages as _transition_messages)
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "aidbot.db")
 
@@ -95,6 +98,8 @@ def ensure_admin(username: str = "admin", password: str = "admin123") -> None:
                              (hash_password(password), username))
                 conn.commit()
 
+_VERSIONED_TABLES = ("stock_balances", "blood_inventory", "resource_thresholds")
+
 def init_db():
     with _connect() as conn:
         # Users
@@ -168,6 +173,40 @@ def init_db():
             expires_on  TEXT
         )""")
 
+        # Blood snapshots: delta-encoded levels per (region, country, blood_type)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS blood_snapshots (
+            id          TEXT PRIMARY KEY,
+            ts          INTEGER,
+            region      TEXT,
+            country     TEXT,
+            blood_type  TEXT,
+            units       INTEGER        -- change in level at ts (delta)
+        )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_blood_snapshots_key_ts ON blood_snapshots (region, blood_type, ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_blood_snapshots_ts ON blood_snapshots (ts)")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS blood_levels (
+            region      TEXT,
+            country     TEXT,
+            blood_type  TEXT,
+            units       INTEGER,       -- last recorded level
+            updated_at  INTEGER,
+            PRIMARY KEY (region, country, blood_type)
+        )""")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS blood_snapshots_daily (
+            day         TEXT,          -- YYYY-MM-DD (local time)
+            region      TEXT,
+            country     TEXT,
+            blood_type  TEXT,
+            opening     INTEGER,
+            closing     INTEGER,
+            received    INTEGER,
+            consumed    INTEGER,
+            PRIMARY KEY (day, region, country, blood_type)
+        )""")
+
         # Resources
         conn.execute("""
         CREATE TABLE IF NOT EXISTS resources (
@@ -182,6 +221,100 @@ def init_db():
             WaterKits   INTEGER
         )""")
 
+        # Stock ledger: one row per movement; each row is a double entry (quantity leaves
+        # from_*, enters to_*), the external account standing in for the outside world
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id            TEXT PRIMARY KEY,
+            ts            INTEGER,
+            kind          TEXT,          -- receipt | dispatch | transfer | adjustment
+            item          TEXT,          -- Volunteers | Trucks | Boats | MedKits | FoodKits | WaterKits
+            quantity      INTEGER,       -- > 0
+            from_region   TEXT,
+            from_country  TEXT,
+            to_region     TEXT,
+            to_country    TEXT,
+            reference     TEXT,
+            actor_id      TEXT
+        )""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_ts ON stock_movements (ts)")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_balances (
+            region      TEXT,
+            country     TEXT,
+            item        TEXT,
+            quantity    INTEGER,       -- materialized sum of the ledger legs
+            updated_at  INTEGER,
+            PRIMARY KEY (region, country, item)
+        )""")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_daily (
+            day         TEXT,          -- YYYY-MM-DD (local time)
+            region      TEXT,
+            country     TEXT,
+            item        TEXT,
+            opening     INTEGER,
+            closing     INTEGER,
+            received    INTEGER,       -- receipts + transfers in
+            issued      INTEGER,       -- dispatches + transfers out
+            adjusted    INTEGER DEFAULT 0,   -- net editor / count corrections, kept out of received / issued
+            PRIMARY KEY (day, region, country, item)
+        )""")
+        if "adjusted" not in {r["name"] for r in conn.execute("PRAGMA table_info(stock_daily)")}:
+            # Older rollups booked adjustments as received / issued: add the column and replay the ledger
+            conn.execute("ALTER TABLE stock_daily ADD COLUMN adjusted INTEGER DEFAULT 0")
+            _rebuild_stock_daily(conn)
+
+        # Alert thresholds: a value at or below warning / critical raises that level.
+        # region '' is the default for every region; a region row overrides it.
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS resource_thresholds (
+            resource    TEXT,
+            region      TEXT DEFAULT '',
+            warning     REAL,
+            critical    REAL,
+            updated_at  INTEGER,
+            PRIMARY KEY (resource, region)
+        )""")
+        conn.executemany(
+            "INSERT OR IGNORE INTO resource_thresholds (resource, region, warning, critical, updated_at) VALUES (?,?,?,?,?)",
+            [(t["resource"], t["region"], t["warning"], t["critical"], _now()) for t in DEFAULT_THRESHOLDS])
+
+        # Data versions: bumped by triggers on every write, used as cache keys
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name     TEXT PRIMARY KEY,
+            version  INTEGER DEFAULT 0
+        )""")
+        for table in _VERSIONED_TABLES:
+            conn.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES (?, 0)", (table,))
+            for op in ("INSERT", "UPDATE", "DELETE"):
+                conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_version AFTER {op} ON {table}
+                BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+                END""")
+
+        # One-time move of the old snapshot table into the ledger
+        if not conn.execute("SELECT 1 FROM stock_movements LIMIT 1").fetchone():
+            legacy = [dict(r) for r in conn.execute("SELECT * FROM resources").fetchall()]
+            if legacy:
+                frame = pd.DataFrame(legacy).rename(columns={"region": "Region", "country": "Country"})
+                _sync_stock_to(conn, frame, reference="migrated from resources")
+
+        # Alert state: current severity per (kind, entity, resource); notifications go out on changes only
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS alert_state (
+            kind        TEXT,          -- blood | resources
+            entity      TEXT,          -- blood record id | "Country - Region"
+            resource    TEXT,
+            severity    INTEGER,       -- 1 warning | 2 critical (ok rows are not stored)
+            value       REAL,
+            threshold   REAL,
+            updated_at  INTEGER,
+            PRIMARY KEY (kind, entity, resource)
+        )""")
+
         # Allocation (history)
         conn.execute("""CREATE TABLE IF NOT EXISTS allocation_runs (
             batch_id TEXT PRIMARY KEY, created_at INTEGER
@@ -209,6 +342,38 @@ def init_db():
             created_at INTEGER
         )""")
 
+        # Disaster alerts (append-only; simulation output + imported alerts/*.csv)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS alerts (
+            id                 INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts                 TEXT,          -- ISO timestamp of the prediction
+            country            TEXT,
+            region             TEXT,
+            year               INTEGER,
+            predicted_disaster TEXT,
+            confidence         REAL,          -- percent
+            alert_level        TEXT,
+            tree_prediction    TEXT,
+            nn_prediction      TEXT,
+            tree_confidence    REAL,
+            nn_confidence      REAL,
+            temperature        REAL,
+            humidity           REAL,
+            wind_speed         REAL,
+            weather            TEXT,
+            source             TEXT           -- 'simulation' or imported file name
+        )""")
+        for col in ("country", "year", "alert_level", "ts", "source"):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_alerts_{col} ON alerts ({col})")
+
+        # Weather cache (parsed weather record per city, as JSON)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS weather_cache (
+            city       TEXT PRIMARY KEY,
+            payload    TEXT,
+            fetched_at INTEGER
+        )""")
+
         # Audit log
         conn.execute("""
         CREATE TABLE IF NOT EXISTS audit_log (
@@ -367,10 +532,19 @@ def add_notification(user_id: str, message: str):
 
 def notify_admins_coordinators(message: str):
     with _connect() as conn:
-        rows = conn.execute("SELECT user_id FROM users WHERE deleted=0 AND role IN ('admin','coordinator')").fetchall()
-        ids = [r["user_id"] for r in rows]
-    for uid in ids:
-        add_notification(uid, message)
+        _notify_staff(conn, [message])
+        conn.commit()
+
+def _notify_staff(conn: sqlite3.Connection, messages: List[str]) -> int:
+    """Queue messages for every admin and coordinator inside the caller's transaction."""
+    if not messages:
+        return 0
+    ids = [r["user_id"] for r in conn.execute(
+        "SELECT user_id FROM users WHERE deleted=0 AND role IN ('admin','coordinator')").fetchall()]
+    ts = _now()
+    conn.executemany("INSERT INTO notifications (id, user_id, message, created_at, is_read) VALUES (?,?,?,?,0)",
+                     [(secrets.token_hex(8), uid, m, ts) for m in messages for uid in ids])
+    return len(ids) * len(messages)
 
 def list_notifications(user_id: str, unread_only: bool=False) -> List[Dict[str,Any]]:
     with _connect() as conn:
@@ -431,20 +605,66 @@ def list_cases(status: Optional[str]=None, assigned_to: Optional[str]=None) -> L
         rows = conn.execute(q, tuple(args)).fetchall()
     return [dict(r) for r in rows]
 
-def assign_case(case_id: str, user_id: Optional[str], shelter_id: Optional[str]=None):
+def assign_case(case_id: str, user_id: Optional[str], shelter_id: Optional[str]=None) -> bool:
+    """
+    Set the case's volunteer and, when shelter_id names a different shelter, move the
+    case there: a place is taken only if the shelter still has one and the previous
+    shelter gets its place back. Returns False if the requested shelter was full or unknown.
+    """
+    placed = True
     with _connect() as conn:
         row = conn.execute("SELECT * FROM cases WHERE case_id=?", (case_id,)).fetchone()
-        if not row: return
+        if not row: return False
         tl = _append_timeline(row["timeline"], None, f"assigned_to={user_id or ''}")
         conn.execute("UPDATE cases SET assigned_to=?, timeline=? WHERE case_id=?", (user_id, tl, case_id))
-        if shelter_id:
-            s = conn.execute("SELECT * FROM shelters WHERE shelter_id=?", (shelter_id,)).fetchone()
-            if s:
-                new_avail = max(0, int(s["available"] or 0) - 1)
-                conn.execute("UPDATE shelters SET available=? WHERE shelter_id=?", (new_avail, shelter_id))
+        if shelter_id and shelter_id != row["shelter_id"]:
+            cur = conn.execute("UPDATE shelters SET available=available-1 WHERE shelter_id=? AND available>0",
+                               (shelter_id,))
+            placed = cur.rowcount == 1
+            if placed:
+                if row["shelter_id"]:
+                    conn.execute("UPDATE shelters SET available=MIN(available+1, COALESCE(capacity, available+1)) "
+                                 "WHERE shelter_id=?", (row["shelter_id"],))
                 tl2 = _append_timeline(tl, None, f"shelter_assigned={shelter_id}")
                 conn.execute("UPDATE cases SET shelter_id=?, timeline=? WHERE case_id=?", (shelter_id, tl2, case_id))
         conn.commit()
+    return placed
+
+def place_cases_in_shelters(placements: List[tuple], actor_id: Optional[str] = None) -> int:
+    """
+    Write (case_id, shelter_id) placements in one transaction: every target shelter
+    must still have enough places and every case must still be without a shelter,
+    otherwise nothing is written and ValueError is raised. Returns the number placed.
+    """
+    if not placements:
+        return 0
+    need: Dict[str, int] = {}
+    for _, sid in placements:
+        need[sid] = need.get(sid, 0) + 1
+    case_ids = [cid for cid, _ in placements]
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        current = {}
+        for i in range(0, len(case_ids), 500):
+            chunk = case_ids[i:i + 500]
+            rows = conn.execute(f"SELECT case_id, shelter_id, timeline FROM cases WHERE case_id IN ({','.join('?' * len(chunk))})",
+                                chunk).fetchall()
+            current.update({r["case_id"]: r for r in rows})
+        taken = [cid for cid in case_ids if cid not in current or current[cid]["shelter_id"]]
+        if taken:
+            raise ValueError(f"{len(taken)} case(s) were closed or sheltered meanwhile (e.g. {taken[0]}).")
+        for sid, n in need.items():
+            cur = conn.execute("UPDATE shelters SET available=available-? WHERE shelter_id=? AND available>=?",
+                               (n, sid, n))
+            if cur.rowcount != 1:
+                raise ValueError(f"Shelter {sid} no longer has {n} free place(s).")
+        conn.executemany("UPDATE cases SET shelter_id=?, timeline=? WHERE case_id=?", [
+            (sid, _append_timeline(current[cid]["timeline"], actor_id, f"shelter_assigned={sid}"), cid)
+            for cid, sid in placements])
+        conn.commit()
+    insert_audit(actor_id, "cases", {"action": "shelter_allocation", "rows": len(placements),
+                                     "shelters": len(need)})
+    return len(placements)
 
 def update_case_status(case_id: str, status: str):
     stamp_col = {
@@ -523,21 +743,10 @@ def list_audit(limit: int = 10) -> List[Dict[str, Any]]:
 # ─────────────────────────────────────────────
 # Blood Inventory (both DataFrame and row-level CRUD)
 # ─────────────────────────────────────────────
-def _blood_threshold_message(units: int, expires_on: str) -> Optional[str]:
-    try:
-        if units <= 0:
-            return "Blood inventory alert: units is 0."
-        if (expires_on or "").strip():
-            d = time.strptime(expires_on, "%Y-%m-%d")
-            days = int((time.mktime(d) - time.time()) // 86400)
-            if days < 0:
-                return f"Blood inventory alert: record expired {abs(days)} day(s) ago."
-            if days <= 7:
-                return f"Blood inventory alert: record expiring in {days} day(s)."
-    except Exception:
-        # ignore parse errors
-        pass
-    return None
+def _blood_alert_rows(conn: sqlite3.Connection, rows: pd.DataFrame, ids: List[str]) -> pd.DataFrame:
+    """Alerts for blood rows (Region, Units, ExpiresOn) with entity = record id, under the stored thresholds."""
+    alerts = _blood_alerts(expiry_frame(rows), _thresholds(conn))
+    return alerts.assign(entity=pd.Series(ids, dtype=object).to_numpy()[alerts["row"].to_numpy()])
 
 def read_blood_df() -> pd.DataFrame:
     with _connect() as conn:
@@ -559,22 +768,20 @@ def write_blood_df(df: pd.DataFrame, actor_id: Optional[str] = None) -> None:
     for c in ("Region","Country","BloodType","Units","ExpiresOn"):
         if c not in out.columns: out[c] = "" if c!="Units" else 0
     out["Units"] = pd.to_numeric(out["Units"], errors="coerce").fillna(0).astype(int)
+    ids = []
     with _connect() as conn:
         conn.execute("DELETE FROM blood_inventory")
         for _, r in out.iterrows():
             bid = str(r.get("id") or "") or _next_numeric_id("B", "blood_inventory", "id", width=4)
+            ids.append(bid)
             conn.execute(
                 "INSERT INTO blood_inventory (id, region, country, blood_type, units, expires_on) VALUES (?,?,?,?,?,?)",
                 (bid, str(r["Region"]), str(r["Country"]), str(r["BloodType"]), int(r["Units"]), str(r["ExpiresOn"] or ""))
             )
+        _record_blood_snapshot(conn)
+        # Threshold transitions (state + notifications) in the same transaction
+        _apply_alert_transitions(conn, "blood", _blood_alert_rows(conn, out, ids), ids, replace=True)
         conn.commit()
-    # Threshold checks + audit
-    alerts = []
-    for _, r in out.iterrows():
-        msg = _blood_threshold_message(int(r.get("Units", 0)), str(r.get("ExpiresOn","") or ""))
-        if msg: alerts.append(msg)
-    for m in alerts:
-        notify_admins_coordinators(m)
     insert_audit(actor_id, "blood_inventory", {"action":"bulk_write", "rows": len(out)})
 
 # Row-level APIs used by the UI
@@ -600,10 +807,10 @@ def create_blood(region: str, country: str, blood_type: str, units: int, expires
             "INSERT INTO blood_inventory (id, region, country, blood_type, units, expires_on) VALUES (?,?,?,?,?,?)",
             (bid, region, country, blood_type, int(units or 0), expires_on or "")
         )
+        _record_blood_snapshot(conn)
+        row = pd.DataFrame({"Region": [region], "Units": [int(units or 0)], "ExpiresOn": [expires_on or ""]})
+        _apply_alert_transitions(conn, "blood", _blood_alert_rows(conn, row, [bid]), [bid])
         conn.commit()
-    # Threshold + audit
-    msg = _blood_threshold_message(int(units or 0), expires_on or "")
-    if msg: notify_admins_coordinators(msg)
     insert_audit(actor_id, "blood_inventory", {"action":"create", "row":{
         "id": bid, "region": region, "country": country, "blood_type": blood_type, "units": int(units or 0), "expires_on": expires_on or ""
     }})
@@ -627,46 +834,669 @@ def update_blood(id: str, fields: Dict[str, Any], actor_id: Optional[str]=None)
     keys = ", ".join([f"{k}=?" for k in fields2.keys()])
     with _connect() as conn:
         conn.execute(f"UPDATE blood_inventory SET {keys} WHERE id=?", (*fields2.values(), id))
+        _record_blood_snapshot(conn)
+        row = conn.execute("SELECT region AS Region, units AS Units, expires_on AS ExpiresOn "
+                           "FROM blood_inventory WHERE id=?", (id,)).fetchone()
+        if row:
+            _apply_alert_transitions(conn, "blood", _blood_alert_rows(conn, pd.DataFrame([dict(row)]), [id]), [id])
         conn.commit()
-    # Threshold + audit
-    u = int(fields2.get("units", 0) if fields2.get("units", None) is not None else 0)
-    ex = str(fields2.get("expires_on","") or "")
-    msg = _blood_threshold_message(u, ex)
-    if msg: notify_admins_coordinators(msg)
     insert_audit(actor_id, "blood_inventory", {"action":"update", "id": id, "fields": fields2})
 
 def delete_blood(id: str) -> None:
     with _connect() as conn:
         conn.execute("DELETE FROM blood_inventory WHERE id=?", (id,))
+        conn.execute("DELETE FROM alert_state WHERE kind='blood' AND entity=?", (id,))
+        _record_blood_snapshot(conn)
         conn.commit()
     insert_audit(None, "blood_inventory", {"action":"delete", "id": id})
 
 # ─────────────────────────────────────────────
-# Resources + Allocation results
+# Blood snapshots (delta-encoded time series + daily rollup)
 # ─────────────────────────────────────────────
-def read_resources_df() -> pd.DataFrame:
+def _record_blood_snapshot(conn: sqlite3.Connection, ts: Optional[int] = None) -> int:
+    """
+    Compare current inventory levels with the last recorded ones and store one delta
+    row per (region, country, blood_type) that changed. Also folds the change into the
+    daily rollup. Runs inside the caller's transaction; returns the number of deltas.
+    """
+    ts = ts or _now()
+    day = time.strftime("%Y-%m-%d", time.localtime(ts))
+    cur = {(r["region"], r["country"], r["blood_type"]): int(r["units"] or 0) for r in conn.execute("""
+        SELECT COALESCE(region,'') AS region, COALESCE(country,'') AS country,
+               COALESCE(blood_type,'') AS blood_type, SUM(units) AS units
+          FROM blood_inventory GROUP BY 1, 2, 3
+    """)}
+    prev = {(r["region"], r["country"], r["blood_type"]): int(r["units"] or 0)
+            for r in conn.execute("SELECT region, country, blood_type, units FROM blood_levels")}
+    changes = [(k, prev.get(k, 0), cur.get(k, 0)) for k in cur.keys() | prev.keys() if cur.get(k, 0) != prev.get(k, 0)]
+    if not changes:
+        return 0
+    conn.executemany(
+        "INSERT INTO blood_snapshots (id, ts, region, country, blood_type, units) VALUES (?,?,?,?,?,?)",
+        [(secrets.token_hex(8), ts, *k, new - old) for k, old, new in changes])
+    conn.executemany("""
+        INSERT INTO blood_levels (region, country, blood_type, units, updated_at) VALUES (?,?,?,?,?)
+        ON CONFLICT(region, country, blood_type) DO UPDATE SET units=excluded.units, updated_at=excluded.updated_at
+    """, [(*k, new, ts) for k, old, new in changes])
+    conn.executemany("""
+        INSERT INTO blood_snapshots_daily (day, region, country, blood_type, opening, closing, received, consumed)
+        VALUES (?,?,?,?,?,?,?,?)
+        ON CONFLICT(day, region, country, blood_type) DO UPDATE SET
+            closing  = excluded.closing,
+            received = received + excluded.received,
+            consumed = consumed + excluded.consumed
+    """, [(day, *k, old, new, max(new - old, 0), max(old - new, 0)) for k, old, new in changes])
+    return len(changes)
+
+def record_blood_snapshot() -> int:
+    with _connect() as conn:
+        n = _record_blood_snapshot(conn)
+        conn.commit()
+    return n
+
+def compact_blood_snapshots(retain_days: int = 30) -> int:
+    """Drop raw deltas older than retain_days; the daily rollup already holds them."""
+    with _connect() as conn:
+        cur = conn.execute("DELETE FROM blood_snapshots WHERE ts < ?", (_now() - int(retain_days) * 86400,))
+        conn.commit()
+        return cur.rowcount
+
+def blood_level_history(start_ts: Optional[int] = None, end_ts: Optional[int] = None,
+                        region: Optional[str] = None, blood_type: Optional[str] = None) -> pd.DataFrame:
+    """
+    Raw level changes in [start_ts, end_ts] with the level after each change.
+    Levels are rebuilt backwards from blood_levels, so compaction never breaks them.
+    """
+    with _connect() as conn:
+        rows = conn.execute("""
+            SELECT * FROM (
+                SELECT s.rowid AS seq, s.ts, s.region, s.country, s.blood_type, s.units AS delta,
+                       l.units - COALESCE(SUM(s.units) OVER (
+                           PARTITION BY s.region, s.country, s.blood_type
+                           ORDER BY s.ts DESC, s.rowid DESC
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) AS level
+                  FROM blood_snapshots s
+                  JOIN blood_levels l USING (region, country, blood_type)
+                 WHERE (? IS NULL OR s.region = ?) AND (? IS NULL OR s.blood_type = ?)
+                   AND s.ts >= COALESCE(?, 0)
+            )
+             WHERE ts <= COALESCE(?, ts)
+             ORDER BY ts, seq
+        """, (region, region, blood_type, blood_type, start_ts, end_ts)).fetchall()
+    return pd.DataFrame([dict(r) for r in rows],
+                        columns=["ts", "region", "country", "blood_type", "delta", "level"])
+
+def blood_daily_history(start_day: Optional[str] = None, end_day: Optional[str] = None,
+                        region: Optional[str] = None, blood_type: Optional[str] = None) -> pd.DataFrame:
+    """Daily opening/closing/received/consumed per key for days in [start_day, end_day] (YYYY-MM-DD)."""
+    with _connect() as conn:
+        rows = conn.execute("""
+            SELECT day, region, country, blood_type, opening, closing, received, consumed
+              FROM blood_snapshots_daily
+             WHERE day BETWEEN COALESCE(?, '0000-00-00') AND COALESCE(?, '9999-99-99')
+               AND (? IS NULL OR region = ?) AND (? IS NULL OR blood_type = ?)
+             ORDER BY day, region, country, blood_type
+        """, (start_day, end_day, region, region, blood_type, blood_type)).fetchall()
+    return pd.DataFrame([dict(r) for r in rows],
+                        columns=["day", "region", "country", "blood_type", "opening", "closing", "received", "consumed"])
+
+def blood_burn_rates(window_days: int = 30) -> pd.DataFrame:
+    """
+    Current level, average daily consumption over the last window_days and days of cover
+    per (region, country, blood_type). days_of_cover is NULL when nothing was consumed.
+    """
+    since = time.strftime("%Y-%m-%d", time.localtime(_now() - int(window_days) * 86400))
+    with _connect() as conn:
+        rows = conn.execute("""
+            SELECT l.region, l.country, l.blood_type, l.units,
+                   COALESCE(b.consumed, 0) * 1.0 / ? AS burn_per_day,
+                   CASE WHEN COALESCE(b.consumed, 0) > 0
+                        THEN l.units * 1.0 / (b.consumed * 1.0 / ?) END AS days_of_cover
+              FROM blood_levels l
+              LEFT JOIN (
+                    SELECT region, country, blood_type, SUM(consumed) AS consumed
+                      FROM blood_snapshots_daily
+                     WHERE day >= ?
+                     GROUP BY region, country, blood_type
+              ) b USING (region, country, blood_type)
+             ORDER BY l.region, l.country, l.blood_type
+        """, (int(window_days), int(window_days), since)).fetchall()
+    return pd.DataFrame([dict(r) for r in rows],
+                        columns=["region", "country", "blood_type", "units", "burn_per_day", "days_of_cover"])
+
+# ─────────────────────────────────────────────
+# Alert store
+# ─────────────────────────────────────────────
+ALERT_COLUMNS = ["ts", "country", "region", "year", "predicted_disaster", "confidence", "alert_level",
+                 "tree_prediction", "nn_prediction", "tree_confidence", "nn_confidence",
+                 "temperature", "humidity", "wind_speed", "weather", "source"]
+
+def append_alerts(alerts, source: str = "simulation") -> int:
+    """Append alert rows (DataFrame or list of dicts) in one transaction; returns rows written."""
+    df = pd.DataFrame(alerts)
+    if df.empty:
+        return 0
+    df = df.rename(columns={"timestamp": "ts"})
+    if "ts" not in df.columns:
+        df["ts"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    if "source" not in df.columns:
+        df["source"] = source
+    df = df.reindex(columns=ALERT_COLUMNS).astype(object).where(lambda d: d.notna(), None)
+    with _connect() as conn:
+        conn.executemany(
+            f"INSERT INTO alerts ({', '.join(ALERT_COLUMNS)}) VALUES ({', '.join('?' * len(ALERT_COLUMNS))})",
+            df.itertuples(index=False, name=None))
+        conn.commit()
+    return len(df)
+
+def _alert_filters(country=None, region=None, year_from=None, year_to=None,
+                   alert_level=None, since=None, until=None):
+    clauses, params = [], []
+    for col, val in (("country", country), ("region", region), ("alert_level", alert_level)):
+        if val:
+            vals = [val] if isinstance(val, str) else list(val)
+            clauses.append(f"{col} IN ({','.join('?' * len(vals))})")
+            params += vals
+    for cond, val in (("year >= ?", year_from), ("year <= ?", year_to), ("ts >= ?", since), ("ts <= ?", until)):
+        if val is not None:
+            clauses.append(cond)
+            params.append(val)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def query_alerts(limit: int = 50, offset: int = 0, **filters) -> pd.DataFrame:
+    """
+    Newest-first page of alerts. Filters: country/region/alert_level (value or list),
+    year_from/year_to, since/until (ISO timestamps).
+    """
+    where, params = _alert_filters(**filters)
     with _connect() as conn:
-        rows = conn.execute("SELECT * FROM resources").fetchall()
+        rows = conn.execute(f"SELECT * FROM alerts{where} ORDER BY ts DESC, id DESC LIMIT ? OFFSET ?",
+                            (*params, int(limit), int(offset))).fetchall()
+    return pd.DataFrame([dict(r) for r in rows], columns=["id", *ALERT_COLUMNS])
+
+def count_alerts(**filters) -> int:
+    where, params = _alert_filters(**filters)
+    with _connect() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM alerts{where}", params).fetchone()[0]
+
+def alert_level_counts(**filters) -> Dict[str, int]:
+    where, params = _alert_filters(**filters)
+    with _connect() as conn:
+        rows = conn.execute(f"SELECT alert_level, COUNT(*) AS n FROM alerts{where} GROUP BY alert_level", params).fetchall()
+    return {r["alert_level"]: r["n"] for r in rows}
+
+def import_alert_csvs(directory: str = "alerts") -> int:
+    """
+    One-time import of legacy alerts/*.csv files. Files already imported (matched by
+    source name) are skipped, so re-running is safe. Old-format files (predicted_type,
+    confidence as a 0-1 fraction) are normalised.
+    """
+    if not os.path.isdir(directory):
+        return 0
+    with _connect() as conn:
+        done = {r[0] for r in conn.execute("SELECT DISTINCT source FROM alerts WHERE source LIKE 'file:%'")}
+    frames = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".csv") or f"file:{name}" in done:
+            continue
+        df = pd.read_csv(os.path.join(directory, name), dtype=str).rename(columns={"predicted_type": "predicted_disaster"})
+        for col in ("confidence", "tree_confidence", "nn_confidence", "temperature", "humidity", "wind_speed"):
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+        if "tree_prediction" not in df.columns and "confidence" in df.columns:
+            df["confidence"] = (df["confidence"] * 100).round(2)
+        df["year"] = pd.to_numeric(df.get("year"), errors="coerce").astype("Int64")
+        frames.append(df.assign(source=f"file:{name}"))
+    return append_alerts(pd.concat(frames, ignore_index=True)) if frames else 0
+
+# ─────────────────────────────────────────────
+# Weather cache
+# ─────────────────────────────────────────────
+def get_cached_weather(cities: List[str], max_age: int) -> Dict[str, tuple]:
+    """Cached (fetched_at, record) pairs newer than max_age seconds, keyed by city (lower-cased)."""
+    keys = list({c.strip().lower() for c in cities})
+    if not keys:
+        return {}
+    with _connect() as conn:
+        rows = conn.execute(
+            f"SELECT city, payload, fetched_at FROM weather_cache WHERE fetched_at >= ? AND city IN ({','.join('?' * len(keys))})",
+            (_now() - int(max_age), *keys)
+        ).fetchall()
+    return {r["city"]: (r["fetched_at"], json.loads(r["payload"])) for r in rows}
+
+def put_cached_weather(records: Dict[str, Dict[str, Any]]) -> None:
+    if not records:
+        return
+    ts = _now()
+    with _connect() as conn:
+        conn.executemany("""
+            INSERT INTO weather_cache (city, payload, fetched_at) VALUES (?,?,?)
+            ON CONFLICT(city) DO UPDATE SET payload=excluded.payload, fetched_at=excluded.fetched_at
+        """, [(c.strip().lower(), json.dumps(rec), ts) for c, rec in records.items()])
+        conn.commit()
+
+# ─────────────────────────────────────────────
+# Resources: stock ledger (double-entry movements + materialized balances + rollups)
+# ─────────────────────────────────────────────
+STOCK_ITEMS = list(RESOURCE_COLUMNS)
+MOVEMENT_KINDS = ("receipt", "dispatch", "transfer", "adjustment")
+EXTERNAL = ("(external)", "")      # counter-account of receipts, dispatches and adjustments
+
+def _stock_location(region: Any, country: Any) -> tuple:
+    return (str(region if region is not None else "").strip(), str(country if country is not None else "").strip())
+
+def _post_stock(conn: sqlite3.Connection, movements: List[Dict[str, Any]], actor_id: Optional[str] = None,
+                ts: Optional[int] = None) -> List[str]:
+    """
+    Book movements inside the caller's transaction. A movement is (kind, item,
+    quantity, from_region/from_country, to_region/to_country, reference); a missing side
+    is the external account, so receipts only name a destination and dispatches only a
+    source. Its two legs update stock_balances and the daily rollup; a leg that would
+    take a real location below zero raises ValueError. Returns the movement ids.
+    """
+    ts = ts or _now()
+    day = time.strftime("%Y-%m-%d", time.localtime(ts))
+    rows, legs = [], {}
+    for m in movements:
+        kind, item, qty = m.get("kind"), m.get("item"), int(m.get("quantity") or 0)
+        src = _stock_location(m.get("from_region"), m.get("from_country"))
+        dst = _stock_location(m.get("to_region"), m.get("to_country"))
+        src, dst = (src if src != ("", "") else EXTERNAL), (dst if dst != ("", "") else EXTERNAL)
+        if kind not in MOVEMENT_KINDS:
+            raise ValueError(f"Unknown movement kind: {kind!r}.")
+        if item not in STOCK_ITEMS:
+            raise ValueError(f"Unknown stock item: {item!r}.")
+        if qty <= 0:
+            raise ValueError("Movement quantity must be positive.")
+        if src == dst or (kind == "transfer" and EXTERNAL in (src, dst)):
+            raise ValueError(f"A {kind} needs two different locations.")
+        if (kind == "receipt" and src != EXTERNAL) or (kind == "dispatch" and dst != EXTERNAL):
+            raise ValueError(f"A {kind} names only its {'destination' if kind == 'receipt' else 'source'}.")
+        mid = secrets.token_hex(8)
+        rows.append((mid, ts, kind, item, qty, *src, *dst, m.get("reference") or "", actor_id or ""))
+        for loc, d in ((src, -qty), (dst, qty)):
+            leg = legs.setdefault((*loc, item), [0, 0, 0, 0])      # net, received, issued, adjusted
+            leg[0] += d
+            if kind == "adjustment":
+                leg[3] += d
+            else:
+                leg[1 if d > 0 else 2] += abs(d)
     if not rows:
-        return pd.DataFrame(columns=["Region","Country","Volunteers","Trucks","Boats","MedKits","FoodKits","WaterKits"])
+        return []
+
+    old = {}
+    for r in conn.execute("SELECT region, country, item, quantity FROM stock_balances"):
+        k = (r["region"], r["country"], r["item"])
+        if k in legs:
+            old[k] = int(r["quantity"] or 0)
+    changes = [(k, old.get(k, 0), old.get(k, 0) + leg[0]) for k, leg in legs.items()]
+    short = [(k, new) for k, _, new in changes if new < 0 and (k[0], k[1]) != EXTERNAL]
+    if short:
+        (region, country, item), new = short[0]
+        raise ValueError(f"Not enough {item} in {country} - {region}: short by {-new}.")
+
+    conn.executemany("""
+        INSERT INTO stock_movements (id, ts, kind, item, quantity, from_region, from_country,
+                                     to_region, to_country, reference, actor_id)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?)""", rows)
+    conn.executemany("""
+        INSERT INTO stock_balances (region, country, item, quantity, updated_at) VALUES (?,?,?,?,?)
+        ON CONFLICT(region, country, item) DO UPDATE SET quantity=excluded.quantity, updated_at=excluded.updated_at
+    """, [(*k, new, ts) for k, _, new in changes])
+    conn.executemany("""
+        INSERT INTO stock_daily (day, region, country, item, opening, closing, received, issued, adjusted)
+        VALUES (?,?,?,?,?,?,?,?,?)
+        ON CONFLICT(day, region, country, item) DO UPDATE SET
+            closing  = excluded.closing,
+            received = received + excluded.received,
+            issued   = issued + excluded.issued,
+            adjusted = adjusted + excluded.adjusted
+    """, [(day, *k, o, new, *legs[k][1:]) for k, o, new in changes])
+    return [r[0] for r in rows]
+
+def _rebuild_stock_daily(conn: sqlite3.Connection) -> None:
+    """Recompute the daily rollup from a full replay of stock_movements."""
+    legs = []
+    for m in conn.execute("SELECT ts, kind, item, quantity, from_region, from_country, to_region, to_country "
+                          "FROM stock_movements ORDER BY ts, rowid"):
+        day, adj = time.strftime("%Y-%m-%d", time.localtime(m["ts"])), m["kind"] == "adjustment"
+        legs.append((day, m["from_region"], m["from_country"], m["item"], -m["quantity"], adj))
+        legs.append((day, m["to_region"], m["to_country"], m["item"], m["quantity"], adj))
+    conn.execute("DELETE FROM stock_daily")
+    if not legs:
+        return
+    df = pd.DataFrame(legs, columns=["day", "region", "country", "item", "delta", "adj"])
+    flow = df["delta"].where(~df["adj"], 0)
+    df = df.assign(received=flow.clip(lower=0), issued=(-flow).clip(lower=0), adjusted=df["delta"].where(df["adj"], 0))
+    daily = df.groupby(["region", "country", "item", "day"], as_index=False)[
+        ["delta", "received", "issued", "adjusted"]].sum().sort_values(["region", "country", "item", "day"])
+    daily["closing"] = daily.groupby(["region", "country", "item"])["delta"].cumsum()
+    daily["opening"] = daily["closing"] - daily["delta"]
+    conn.executemany("""
+        INSERT INTO stock_daily (day, region, country, item, opening, closing, received, issued, adjusted)
+        VALUES (?,?,?,?,?,?,?,?,?)""",
+        daily[["day", "region", "country", "item", "opening", "closing", "received", "issued", "adjusted"]]
+        .astype({c: int for c in ("opening", "closing", "received", "issued", "adjusted")})
+        .itertuples(index=False, name=None))
+
+def _resources_frame(conn: sqlite3.Connection) -> pd.DataFrame:
+    """Balances pivoted to one row per location (Region, Country + STOCK_ITEMS); external account left out."""
+    rows = conn.execute("SELECT region, country, item, quantity FROM stock_balances "
+                        "WHERE NOT (region=? AND country=?)", EXTERNAL).fetchall()
+    cols = ["Region", "Country"] + STOCK_ITEMS
+    if not rows:
+        return pd.DataFrame(columns=cols)
     df = pd.DataFrame([dict(r) for r in rows])
-    return df[["region","country","Volunteers","Trucks","Boats","MedKits","FoodKits","WaterKits"]].rename(columns={"region":"Region","country":"Country"})
+    wide = df.pivot_table(index=["region", "country"], columns="item", values="quantity",
+                          aggfunc="sum", fill_value=0)
+    wide = wide.reindex(columns=STOCK_ITEMS, fill_value=0).astype(int).rename_axis(columns=None).reset_index()
+    return wide.rename(columns={"region": "Region", "country": "Country"})[cols]
+
+def _stock_cells(df: pd.DataFrame) -> Dict[tuple, int]:
+    """(region, country, item) -> quantity from a resources table (duplicate locations are added up)."""
+    cells: Dict[tuple, int] = {}
+    for r in df.fillna(0).to_dict("records"):
+        loc = _stock_location(r.get("Region"), r.get("Country"))
+        for item in STOCK_ITEMS:
+            qty = int(float(r.get(item) or 0))
+            if qty < 0:
+                raise ValueError(f"{item} in {loc[1]} - {loc[0]} cannot be negative.")
+            cells[(*loc, item)] = cells.get((*loc, item), 0) + qty
+    return cells
+
+def _sync_stock_to(conn: sqlite3.Connection, df: pd.DataFrame, actor_id: Optional[str] = None,
+                   reference: str = "resources editor", base: Optional[pd.DataFrame] = None) -> int:
+    """
+    Post the adjustments for the table df (one row per location). Without base the
+    balances are brought to df and locations missing from it are adjusted to zero. With
+    base (the table df was edited from) only the per-cell edits df - base are booked,
+    so movements posted since base was read and locations added meanwhile are kept;
+    locations removed from df are dropped once their balance is zero.
+    Returns the number of movements.
+    """
+    target = _stock_cells(df)
+    current = {(r["region"], r["country"], r["item"]): int(r["quantity"] or 0) for r in conn.execute(
+        "SELECT region, country, item, quantity FROM stock_balances WHERE NOT (region=? AND country=?)", EXTERNAL)}
+    before = current if base is None else _stock_cells(base)
+    moves = []
+    for k in target.keys() | before.keys():
+        d = target.get(k, 0) - before.get(k, 0)
+        if d:
+            side = "to" if d > 0 else "from"
+            moves.append({"kind": "adjustment", "item": k[2], "quantity": abs(d), "reference": reference,
+                          f"{side}_region": k[0], f"{side}_country": k[1]})
+    _post_stock(conn, moves, actor_id)
+    ts = _now()
+    conn.executemany("INSERT OR IGNORE INTO stock_balances (region, country, item, quantity, updated_at) "
+                     "VALUES (?,?,?,0,?)", [(*k, ts) for k in target])
+    conn.executemany("DELETE FROM stock_balances WHERE region=? AND country=? AND item=? AND quantity=0",
+                     [k for k in before if k not in target])
+    return len(moves)
+
+def _resource_transitions(conn: sqlite3.Connection) -> int:
+    frame = _resources_frame(conn)
+    return _apply_alert_transitions(conn, "resources", _resource_alert_rows(conn, frame), _locations(frame), replace=True)
 
-def write_resources_df(df: pd.DataFrame, actor_id: Optional[str] = None):
+def read_resources_df() -> pd.DataFrame:
+    """Current stock per location, read from the materialized balances."""
     with _connect() as conn:
-        conn.execute("DELETE FROM resources")
-        for _, r in df.fillna(0).iterrows():
-            conn.execute("""
-            INSERT INTO resources (id, region, country, Volunteers, Trucks, Boats, MedKits, FoodKits, WaterKits)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                secrets.token_hex(6), str(r.get("Region","")), str(r.get("Country","")),
-                int(r.get("Volunteers",0)), int(r.get("Trucks",0)), int(r.get("Boats",0)),
-                int(r.get("MedKits",0)), int(r.get("FoodKits",0)), int(r.get("WaterKits",0))
-            ))
+        return _resources_frame(conn)
+
+def write_resources_df(df: pd.DataFrame, actor_id: Optional[str] = None,
+                       base: Optional[pd.DataFrame] = None) -> int:
+    """
+    Save the resources editor as adjustment movements in one transaction. base is the
+    table the editor was showing: only the cells changed from it are booked (see
+    _sync_stock_to), so concurrent movements survive. Without base (CSV import) df
+    replaces the balances. Raises ValueError on negative amounts or an edit that would
+    take a balance below zero.
+    """
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        n = _sync_stock_to(conn, df, actor_id, base=base)
+        _resource_transitions(conn)
+        conn.commit()
+    insert_audit(actor_id, "resources", {"action": "bulk_write", "rows": int(len(df)), "movements": n})
+    return n
+
+def record_stock_movements(movements: List[Dict[str, Any]], actor_id: Optional[str] = None) -> List[str]:
+    """
+    Book receipts / dispatches / transfers / adjustments (see _post_stock) in one
+    transaction; nothing is written if any of them is invalid or would overdraw a
+    location (ValueError). Returns the movement ids.
+    """
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        ids = _post_stock(conn, movements, actor_id)
+        _resource_transitions(conn)
         conn.commit()
-    # Audit only (no thresholds by default)
-    insert_audit(actor_id, "resources", {"action":"bulk_write", "rows": int(len(df))})
+    insert_audit(actor_id, "stock_movements", {"action": "record", "rows": len(ids)})
+    return ids
+
+def list_stock_movements(limit: int = 50, item: Optional[str] = None, region: Optional[str] = None) -> pd.DataFrame:
+    """Newest-first movements, optionally for one item and / or touching one region."""
+    with _connect() as conn:
+        rows = conn.execute("""
+            SELECT id, ts, kind, item, quantity, from_region, from_country, to_region, to_country, reference, actor_id
+              FROM stock_movements
+             WHERE (? IS NULL OR item = ?) AND (? IS NULL OR from_region = ? OR to_region = ?)
+             ORDER BY ts DESC, rowid DESC LIMIT ?
+        """, (item, item, region, region, region, int(limit))).fetchall()
+    return pd.DataFrame([dict(r) for r in rows],
+                        columns=["id", "ts", "kind", "item", "quantity", "from_region", "from_country",
+                                 "to_region", "to_country", "reference", "actor_id"])
+
+_PERIODS = {"day": "day", "week": "strftime('%Y-W%W', day)", "month": "substr(day, 1, 7)"}
+
+def stock_rollup(period: str = "day", start_day: Optional[str] = None, end_day: Optional[str] = None,
+                 region: Optional[str] = None, item: Optional[str] = None) -> pd.DataFrame:
+    """
+    Opening / closing / received / issued / adjusted per (period, region, country, item)
+    from the daily rollup; period is day, week or month. Days without movements are not stored,
+    so opening is the first stored day's opening and closing the last stored day's.
+    """
+    if period not in _PERIODS:
+        raise ValueError(f"period must be one of {', '.join(_PERIODS)}")
+    with _connect() as conn:
+        rows = conn.execute(f"""
+            SELECT period, region, country, item,
+                   MAX(CASE WHEN first_day THEN opening END) AS opening,
+                   MAX(CASE WHEN last_day THEN closing END)  AS closing,
+                   SUM(received) AS received, SUM(issued) AS issued, SUM(adjusted) AS adjusted
+              FROM (
+                    SELECT {_PERIODS[period]} AS period, region, country, item, opening, closing, received, issued,
+                           adjusted,
+                           day = MIN(day) OVER w AS first_day, day = MAX(day) OVER w AS last_day
+                      FROM stock_daily
+                     WHERE day BETWEEN COALESCE(?, '0000-00-00') AND COALESCE(?, '9999-99-99')
+                       AND (? IS NULL OR region = ?) AND (? IS NULL OR item = ?)
+                       AND NOT (region = ? AND country = ?)
+                    WINDOW w AS (PARTITION BY {_PERIODS[period]}, region, country, item)
+              )
+             GROUP BY period, region, country, item
+             ORDER BY period, region, country, item
+        """, (start_day, end_day, region, region, item, item, *EXTERNAL)).fetchall()
+    return pd.DataFrame([dict(r) for r in rows],
+                        columns=["period", "region", "country", "item", "opening", "closing", "received", "issued",
+                                 "adjusted"])
+
+def stock_burn_rates(window_days: int = 30) -> pd.DataFrame:
+    """
+    Current balance, average daily issue (dispatches and transfers out, not editor
+    adjustments) over the last window_days and days of cover per (region, country, item). days_of_cover is NULL when nothing was issued.
+    """
+    since = time.strftime("%Y-%m-%d", time.localtime(_now() - int(window_days) * 86400))
+    with _connect() as conn:
+        rows = conn.execute("""
+            SELECT b.region, b.country, b.item, b.quantity,
+                   COALESCE(d.issued, 0) * 1.0 / ? AS burn_per_day,
+                   CASE WHEN COALESCE(d.issued, 0) > 0
+                        THEN b.quantity * 1.0 / (d.issued * 1.0 / ?) END AS days_of_cover
+              FROM stock_balances b
+              LEFT JOIN (
+                    SELECT region, country, item, SUM(issued) AS issued
+                      FROM stock_daily
+                     WHERE day >= ?
+                     GROUP BY region, country, item
+              ) d USING (region, country, item)
+             WHERE NOT (b.region = ? AND b.country = ?)
+             ORDER BY b.region, b.country, b.item
+        """, (int(window_days), int(window_days), since, *EXTERNAL)).fetchall()
+    return pd.DataFrame([dict(r) for r in rows],
+                        columns=["region", "country", "item", "quantity", "burn_per_day", "days_of_cover"])
+
+def check_stock_ledger() -> pd.DataFrame:
+    """Balances that differ from a full replay of the ledger (empty when consistent)."""
+    with _connect() as conn:
+        rows = conn.execute("""
+            SELECT region, country, item, SUM(delta) AS ledger
+              FROM (SELECT from_region AS region, from_country AS country, item, -quantity AS delta FROM stock_movements
+                    UNION ALL
+                    SELECT to_region, to_country, item, quantity FROM stock_movements)
+             GROUP BY region, country, item
+        """).fetchall()
+        ledger = pd.DataFrame([dict(r) for r in rows], columns=["region", "country", "item", "ledger"])
+        bal = pd.DataFrame([dict(r) for r in conn.execute("SELECT region, country, item, quantity FROM stock_balances")],
+                           columns=["region", "country", "item", "quantity"])
+    m = ledger.merge(bal, on=["region", "country", "item"], how="outer").fillna({"ledger": 0, "quantity": 0})
+    return m[m["ledger"] != m["quantity"]].reset_index(drop=True)
+
+# ─────────────────────────────────────────────
+# Alert thresholds + data versions
+# ─────────────────────────────────────────────
+_alert_cache: Dict[tuple, pd.DataFrame] = {}
+_alert_cache_lock = threading.Lock()       # Streamlit serves sessions from several threads
+
+def data_version(*names: str) -> tuple:
+    """Current write counters of the given tables (see _VERSIONED_TABLES)."""
+    with _connect() as conn:
+        rows = dict(conn.execute(
+            f"SELECT name, version FROM data_versions WHERE name IN ({','.join('?' * len(names))})", names
+        ).fetchall())
+    return tuple(rows.get(n, 0) for n in names)
+
+def _thresholds(conn: sqlite3.Connection) -> pd.DataFrame:
+    rows = conn.execute("SELECT resource, region, warning, critical FROM resource_thresholds "
+                        "ORDER BY resource, region").fetchall()
+    return pd.DataFrame([dict(r) for r in rows], columns=["resource", "region", "warning", "critical"])
+
+def list_thresholds() -> pd.DataFrame:
+    with _connect() as conn:
+        return _thresholds(conn)
+
+def set_threshold(resource: str, warning: float, critical: float, region: str = "",
+                  actor_id: Optional[str] = None) -> None:
+    with _connect() as conn:
+        conn.execute("""
+        INSERT INTO resource_thresholds (resource, region, warning, critical, updated_at) VALUES (?,?,?,?,?)
+        ON CONFLICT(resource, region) DO UPDATE SET warning=excluded.warning, critical=excluded.critical,
+                                                    updated_at=excluded.updated_at
+        """, (resource, (region or "").strip(), float(warning), float(critical), _now()))
+        _refresh_alert_states(conn)
+        conn.commit()
+    insert_audit(actor_id, "resource_thresholds", {"action": "set", "resource": resource, "region": region,
+                                                   "warning": warning, "critical": critical})
+
+def delete_threshold(resource: str, region: str = "", actor_id: Optional[str] = None) -> None:
+    with _connect() as conn:
+        conn.execute("DELETE FROM resource_thresholds WHERE resource=? AND region=?", (resource, (region or "").strip()))
+        _refresh_alert_states(conn)
+        conn.commit()
+    insert_audit(actor_id, "resource_thresholds", {"action": "delete", "resource": resource, "region": region})
+
+def _cached_alerts(key: tuple, compute) -> pd.DataFrame:
+    with _alert_cache_lock:
+        if key not in _alert_cache:
+            if len(_alert_cache) > 16:
+                _alert_cache.clear()
+            _alert_cache[key] = compute()
+        return _alert_cache[key].copy()
+
+def current_resource_alerts() -> pd.DataFrame:
+    """Threshold alerts over the stored resources, recomputed only when resources or thresholds change."""
+    key = ("resources", *data_version("stock_balances", "resource_thresholds"))
+    return _cached_alerts(key, lambda: _resource_alerts(read_resources_df(), list_thresholds()))
+
+def _blood_alerts_with_records() -> pd.DataFrame:
+    expiry = expiry_frame(read_blood_df())
+    alerts = _blood_alerts(expiry, list_thresholds())
+    rows = alerts["row"].to_numpy()
+    return alerts.assign(**{c: expiry[c].to_numpy()[rows] for c in ("Country", "BloodType", "Units", "ExpiresOn")})
+
+def current_blood_alerts() -> pd.DataFrame:
+    """Threshold alerts over the blood inventory with each record's Country, BloodType, Units and
+    ExpiresOn (per day, as days-left moves with the date)."""
+    key = ("blood", *data_version("blood_inventory", "resource_thresholds"), time.strftime("%Y-%m-%d"))
+    return _cached_alerts(key, _blood_alerts_with_records)
+
+# ─────────────────────────────────────────────
+# Alert state (notify on transitions, coalesce bursts into digests)
+# ─────────────────────────────────────────────
+_ALERT_KINDS = {"blood": ("Blood inventory", "record(s)"), "resources": ("Resource", "location(s)")}
+
+def _locations(resources: pd.DataFrame) -> List[str]:
+    """Alert entity of each resources row ("Country - Region", as in resource_alerts())."""
+    return (resources["Country"].astype(str).str.strip() + " - " + resources["Region"].astype(str).str.strip()).tolist()
+
+def _resource_alert_rows(conn: sqlite3.Connection, resources: pd.DataFrame) -> pd.DataFrame:
+    alerts = _resource_alerts(resources, _thresholds(conn))
+    return alerts.assign(entity=alerts["Location"])
+
+def _apply_alert_transitions(conn: sqlite3.Connection, kind: str, current: pd.DataFrame,
+                             present: List[str], replace: bool = False) -> int:
+    """
+    Compare freshly evaluated alerts of one kind (entity, Resource, Severity, Current,
+    Threshold[, Detail]) with alert_state, store the new state and queue notifications
+    for the entities whose severity changed, all inside the caller's transaction.
+    present lists the entities that were evaluated; with replace=True they are the whole
+    kind and stored entities missing from it (deleted rows) are dropped silently.
+    Up to DIGEST_AFTER changes are sent one by one, more become a single digest.
+    Returns the number of transitions.
+    """
+    present = list(dict.fromkeys(present))
+    rows = conn.execute("SELECT entity, resource AS Resource, severity AS Severity FROM alert_state WHERE kind=?",
+                        (kind,)).fetchall()
+    previous = pd.DataFrame([dict(r) for r in rows], columns=["entity", "Resource", "Severity"])
+    previous = previous[previous["entity"].isin(present)]
+    changes = _transitions(previous, current)
+
+    if replace:
+        conn.execute("DELETE FROM alert_state WHERE kind=?", (kind,))
+    else:
+        conn.executemany("DELETE FROM alert_state WHERE kind=? AND entity=?", [(kind, e) for e in present])
+    ts = _now()
+    conn.executemany(
+        "INSERT OR REPLACE INTO alert_state (kind, entity, resource, severity, value, threshold, updated_at) "
+        "VALUES (?,?,?,?,?,?,?)",
+        [(kind, r.entity, r.Resource, int(r.Severity), float(r.Current), float(r.Threshold), ts)
+         for r in current.sort_values("Severity", kind="stable").itertuples(index=False)])
+    label, noun = _ALERT_KINDS[kind]
+    _notify_staff(conn, _transition_messages(changes, label, noun))
+    return len(changes)
+
+def _refresh_alert_states(conn: sqlite3.Connection) -> int:
+    """Re-evaluate every stored blood record and resources row (after threshold edits, or daily for expiry)."""
+    blood = pd.DataFrame([dict(r) for r in conn.execute(
+        "SELECT id, region AS Region, units AS Units, expires_on AS ExpiresOn FROM blood_inventory").fetchall()],
+        columns=["id", "Region", "Units", "ExpiresOn"])
+    ids = blood["id"].tolist()
+    n = _apply_alert_transitions(conn, "blood", _blood_alert_rows(conn, blood, ids), ids, replace=True)
+    return n + _resource_transitions(conn)
+
+def refresh_alert_states() -> int:
+    """Public entry for _refresh_alert_states(); returns the number of transitions notified."""
+    with _connect() as conn:
+        n = _refresh_alert_states(conn)
+        conn.commit()
+    return n
+
+def list_alert_states(kind: Optional[str] = None) -> List[Dict[str, Any]]:
+    with _connect() as conn:
+        if kind:
+            rows = conn.execute("SELECT * FROM alert_state WHERE kind=? ORDER BY severity DESC, entity", (kind,)).fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM alert_state ORDER BY kind, severity DESC, entity").fetchall()
+    return [dict(r) for r in rows]
 
 def write_run_outputs(alloc_df: pd.DataFrame, remain_df: pd.DataFrame) -> str:
     batch_id = "B-" + secrets.token_hex(6)
@@ -678,15 +1508,23 @@ def write_run_outputs(alloc_df: pd.DataFrame, remain_df: pd.DataFrame) -> str:
     return batch_id
 
 # NEW: pre-position plan writer + lister
-def write_preposition_plan(df_plan: pd.DataFrame) -> str:
-    """Store a pre-position (Ops Plan) table as CSV under table_name='preposition_plan'."""
+def write_preposition_plan(df_plan: pd.DataFrame, shipments: Optional[pd.DataFrame] = None,
+                           actor_id: Optional[str] = None) -> str:
+    """
+    Store a pre-position (Ops Plan) table as CSV under table_name='preposition_plan';
+    its transfers, when given, go into the same batch as 'preposition_shipments'.
+    """
     batch_id = "B-" + secrets.token_hex(6)
     with _connect() as conn:
         conn.execute("INSERT INTO allocation_runs (batch_id, created_at) VALUES (?,?)", (batch_id, _now()))
         conn.execute("INSERT INTO allocation_outputs (batch_id, table_name, payload_csv) VALUES (?,?,?)",
                      (batch_id, "preposition_plan", df_plan.to_csv(index=False)))
+        if shipments is not None:
+            conn.execute("INSERT INTO allocation_outputs (batch_id, table_name, payload_csv) VALUES (?,?,?)",
+                         (batch_id, "preposition_shipments", shipments.to_csv(index=False)))
         conn.commit()
-    insert_audit(None, "preposition_plan", {"action":"create", "batch_id": batch_id, "rows": int(len(df_plan))})
+    insert_audit(actor_id, "preposition_plan", {"action":"create", "batch_id": batch_id, "rows": int(len(df_plan)),
+                                                "shipments": 0 if shipments is None else int(len(shipments))})
     return batch_id
 
 def list_preposition_plans(limit: int = 10) -> List[Dict[str, Any]]:
@@ -0,0 +1,123 @@
+# deployment.py — Vectorized deployment readiness: open cases joined to resource rows on normalized keys
+
+import time
+
+import numpy as np
+import pandas as pd
+
+OPEN_STATUSES = ("new", "acknowledged", "en_route")
+
+# Readiness rules
+MIN_VOLUNTEERS = 5
+MIN_TRUCKS = 1
+MIN_MEDKITS = 10
+
+READY, LIMITED, INSUFFICIENT, NO_MATCH = "✅ Ready", "⚠️ Limited", "❌ Insufficient", "❌ No Match"
+PRIORITY = {READY: "🟢", LIMITED: "🟡", INSUFFICIENT: "🔴", NO_MATCH: "🔴"}
+
+COLUMNS = ["Case ID", "Location", "Status", "Volunteers", "Trucks", "MedKits", "Deployment", "Priority"]
+
+
+def normalize_key(series):
+    """Stripped, lower-cased strings; missing values become ""."""
+    return series.astype(object).where(series.notna(), "").astype(str).str.strip().str.lower()
+
+
+def _first_row(keys):
+    """Frame key -> position of the first resource row carrying that (non-blank) key."""
+    pos = pd.Series(np.arange(len(keys)), index=keys.to_numpy())
+    pos = pos[pos.index != ""]
+    return pos[~pos.index.duplicated()]
+
+
+def recommend_deployments(cases, resources):
+    """
+    One row per case (list_cases() dicts or a DataFrame with case_id, country, region,
+    status), matched to the first resource row (Region, Country, Volunteers, Trucks,
+    MedKits, ...) whose country or region equals the case's, compared stripped and
+    case-insensitively; blank keys never match. Readiness: all of volunteers, trucks and
+    medkits above their minimum is Ready, volunteers or medkits alone is Limited.
+    """
+    cases = pd.DataFrame(cases)
+    if cases.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    for c in ("case_id", "country", "region", "status"):
+        if c not in cases.columns:
+            cases[c] = None
+    n = len(cases)
+
+    # First matching resource row per case: min over the country match and the region match
+    none = len(resources) if resources is not None else 0
+    match = np.full(n, none, dtype=np.int64)
+    if none:
+        for case_col, res_col in (("country", "Country"), ("region", "Region")):
+            if res_col in resources.columns:
+                first = _first_row(normalize_key(resources[res_col]))
+                hit = first.reindex(normalize_key(cases[case_col]).to_numpy(), fill_value=none).to_numpy()
+                match = np.minimum(match, hit)
+    matched = match < none
+
+    def amounts(col):
+        out = np.zeros(n, dtype=np.int64)
+        if matched.any() and col in resources.columns:
+            vals = pd.to_numeric(resources[col], errors="coerce").fillna(0).to_numpy()
+            out[matched] = vals[match[matched]].astype(np.int64)
+        return out
+
+    vol, trucks, medkits = amounts("Volunteers"), amounts("Trucks"), amounts("MedKits")
+    ok_vol, ok_truck, ok_med = vol >= MIN_VOLUNTEERS, trucks >= MIN_TRUCKS, medkits >= MIN_MEDKITS
+    deployment = np.select([~matched, ok_vol & ok_truck & ok_med, ok_vol | ok_med],
+                           [NO_MATCH, READY, LIMITED], default=INSUFFICIENT)
+
+    country = cases["country"].fillna("").astype(str).str.strip()
+    region = cases["region"].fillna("").astype(str).str.strip()
+    out = pd.DataFrame({
+        "Case ID": cases["case_id"].to_numpy(),
+        "Location": (country + ", " + region).to_numpy(),
+        "Status": cases["status"].fillna("new").to_numpy(),
+        "Volunteers": vol, "Trucks": trucks, "MedKits": medkits,
+        "Deployment": deployment,
+    })
+    out["Priority"] = out["Deployment"].map(PRIORITY)
+    return out[COLUMNS]
+
+
+def deployment_summary(rec):
+    """Counts of ready / limited / cannot-deploy cases."""
+    d = rec["Deployment"]
+    return {"ready": int((d == READY).sum()), "limited": int((d == LIMITED).sum()),
+            "insufficient": int(d.isin([INSUFFICIENT, NO_MATCH]).sum())}
+
+
+def _synthetic(n_cases, n_resources, seed=0):
+    rng = np.random.default_rng(seed)
+    countries = np.array([f"Country {i}" for i in range(400)], dtype=object)
+    regions = np.array([f"Region {i}" for i in range(40)], dtype=object)
+    cases = pd.DataFrame({
+        "case_id": [f"C{i}" for i in range(n_cases)],
+        "country": countries[rng.integers(0, len(countries), n_cases)],
+        "region": regions[rng.integers(0, len(regions), n_cases)],
+        "status": np.array(OPEN_STATUSES, dtype=object)[rng.integers(0, 3, n_cases)],
+    })
+    resources = pd.DataFrame({
+        "Region": [f" {r.upper()} " for r in regions[rng.integers(0, len(regions), n_resources)]],
+        "Country": countries[rng.integers(0, len(countries), n_resources)],
+        "Volunteers": rng.integers(0, 20, n_resources), "Trucks": rng.integers(0, 3, n_resources),
+        "MedKits": rng.integers(0, 30, n_resources),
+    })
+    return cases, resources
+
+
+def benchmark(n_cases=100_000, n_resources=5_000, seed=0):
+    """Timing for recommend_deployments() on synthetic data (default 100k open cases x 5k resource rows)."""
+    cases, resources = _synthetic(n_cases, n_resources, seed)
+    t0 = time.perf_counter()
+    rec = recommend_deployments(cases, resources)
+    t1 = time.perf_counter()
+    return {"cases": n_cases, "resources": n_resources, **deployment_summary(rec), "seconds": round(t1 - t0, 3)}
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        print(benchmark())
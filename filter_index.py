@@ -0,0 +1,105 @@
+# filter_index.py — Bitmap filter index (type / region / country) + sorted year index for a dataset
+
+import numpy as np
+import pandas as pd
+
+ALL = "(All)"
+
+
+def normalize_label(value):
+    """Matching key for a label: backslashes dropped, whitespace collapsed, case-folded."""
+    return " ".join(str(value).replace("\\", "").split()).lower()
+
+
+def _bitmaps(series):
+    """{normalized label: packed row bitmap} for one column, built from its distinct values."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    n = len(codes)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    out = {}
+    for i, value in enumerate(uniques):
+        bits = np.zeros(n, dtype=bool)
+        bits[order[bounds[i]:bounds[i + 1]]] = True
+        key = normalize_label(value)
+        # Labels differing only by case / spacing share one bitmap
+        out[key] = np.bitwise_or(out[key], np.packbits(bits)) if key in out else np.packbits(bits)
+    return out
+
+
+class FilterIndex:
+    """
+    Row index over one dataset, built once: a packed bitmap per distinct disaster type,
+    region and country (keyed by normalize_label) and the row order sorted by year.
+
+    mask() resolves any filter combination by AND-ing bitmaps; the year range is two
+    np.searchsorted calls on the sorted years. A dimension whose column is absent is
+    not filtered, an unknown label matches no rows.
+    """
+
+    def __init__(self, n_rows, bitmaps, year_sorted=None, year_order=None):
+        self.n_rows = n_rows
+        self.bitmaps = bitmaps
+        self.year_sorted = year_sorted
+        self.year_order = year_order
+
+    @classmethod
+    def from_frame(cls, df, type_cols=(), region_col=None, country_col=None, year_col=None):
+        """
+        type_cols may name several columns (e.g. Tree and Neural Network predictions);
+        a row then matches a type if any of them has it.
+        """
+        bitmaps = {}
+        types = {}
+        for c in type_cols:
+            if c and c in df.columns:
+                for k, b in _bitmaps(df[c]).items():
+                    types[k] = np.bitwise_or(types[k], b) if k in types else b
+        if types:
+            bitmaps["types"] = types
+        if region_col and region_col in df.columns:
+            bitmaps["regions"] = _bitmaps(df[region_col])
+        if country_col and country_col in df.columns:
+            bitmaps["countries"] = _bitmaps(df[country_col])
+        year_sorted = year_order = None
+        if year_col and year_col in df.columns:
+            y = pd.to_numeric(df[year_col], errors="coerce").to_numpy(dtype=float)
+            year_order = np.argsort(y, kind="stable")     # NaN years sort last, never inside a range
+            year_sorted = y[year_order]
+        return cls(len(df), bitmaps, year_sorted, year_order)
+
+    def _dim(self, dim, labels):
+        """OR of the bitmaps for labels, or None when the dimension is unfiltered."""
+        if dim not in self.bitmaps or not labels:
+            return None
+        labels = [labels] if isinstance(labels, str) else list(labels)
+        labels = [l for l in labels if l != ALL]
+        if not labels:
+            return None
+        table = self.bitmaps[dim]
+        empty = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        return np.bitwise_or.reduce([table.get(normalize_label(l), empty) for l in labels])
+
+    def year_rows(self, lo, hi):
+        """Row positions with lo <= year <= hi."""
+        a = np.searchsorted(self.year_sorted, lo, side="left")
+        b = np.searchsorted(self.year_sorted, hi, side="right")
+        return self.year_order[a:b]
+
+    def mask(self, types=None, regions=None, countries=None, years=None):
+        """Boolean row mask; regions / countries accept one label or a list, "(All)" means no filter."""
+        packed = np.full((self.n_rows + 7) // 8, 0xFF, dtype=np.uint8)
+        for dim, labels in (("types", types), ("regions", regions), ("countries", countries)):
+            b = self._dim(dim, labels)
+            if b is not None:
+                packed &= b
+        m = np.unpackbits(packed, count=self.n_rows).astype(bool)
+        if years is not None and self.year_sorted is not None:
+            in_range = np.zeros(self.n_rows, dtype=bool)
+            in_range[self.year_rows(*years)] = True
+            m &= in_range
+        return m
+
+    def apply(self, df, **filters):
+        """Rows of df (the frame the index was built from) matching the filters."""
+        return df[self.mask(**filters)]
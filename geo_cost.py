@@ -0,0 +1,276 @@
+# geo_cost.py — Vectorized haversine / travel-time matrices with a tile-keyed incremental cache
+
+import time
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+DETOUR_FACTOR = 1.3        # road distance / great-circle distance
+ROAD_SPEED_KMH = 40.0      # average speed in disaster conditions
+TILE_DEG = 20.0            # cache tile size in degrees; coarse keeps the block count small
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; arguments broadcast, NaN coordinates give NaN."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def distance_matrix(lat_a, lon_a, lat_b, lon_b):
+    """[len(a), len(b)] great-circle distances in km."""
+    lat_a, lon_a = np.asarray(lat_a, dtype=float), np.asarray(lon_a, dtype=float)
+    lat_b, lon_b = np.asarray(lat_b, dtype=float), np.asarray(lon_b, dtype=float)
+    return haversine_km(lat_a[:, None], lon_a[:, None], lat_b[None, :], lon_b[None, :])
+
+
+def eta_hours(km, speed_kmh=ROAD_SPEED_KMH, detour=DETOUR_FACTOR):
+    """Estimated travel time for great-circle distances km."""
+    return np.asarray(km) * detour / speed_kmh
+
+
+def tile_of(lat, lon, tile_deg=TILE_DEG):
+    """Cache tile for a coordinate, None when it is missing or out of range."""
+    if lat is None or lon is None or not (abs(lat) <= 90 and abs(lon) <= 180):   # False for NaN
+        return None
+    return int(np.floor(lat / tile_deg)), int(np.floor(lon / tile_deg))
+
+
+class _Tile:
+    """Members of one set inside one tile: ids in block row order plus their coordinates."""
+
+    def __init__(self):
+        self.ids = []
+        self.pos = {}
+        self.lat = np.zeros(0)
+        self.lon = np.zeros(0)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, i, lat, lon):
+        self.pos[i] = len(self.ids)
+        self.ids.append(i)
+        self.lat = np.append(self.lat, lat)
+        self.lon = np.append(self.lon, lon)
+
+    def drop(self, i):
+        """Swap-remove i; returns (its position, position of the member moved into it)."""
+        p, last = self.pos.pop(i), len(self.ids) - 1
+        if p != last:
+            moved = self.ids[last]
+            self.ids[p], self.pos[moved] = moved, p
+            self.lat[p], self.lon[p] = self.lat[last], self.lon[last]
+        self.ids.pop()
+        self.lat, self.lon = self.lat[:last], self.lon[:last]
+        return p, last
+
+
+class GeoCostCache:
+    """
+    Distance / ETA matrices between named entity sets ("cases", "volunteers",
+    "shelters", ...), cached per pair of tiles. Every entity lives in the TILE_DEG tile
+    of its coordinates; a block holds the distances between the members of one tile of
+    set a and one tile of set b. Blocks are patched in place as entities change: a moved
+    entity gets its row (or column) recomputed, an added one gets a new row, a removed
+    one is swap-removed. The work per change is one row against the cached counterpart
+    tiles, never a whole matrix. Entities without coordinates get NaN distances.
+    """
+
+    def __init__(self, tile_deg=TILE_DEG, speed_kmh=ROAD_SPEED_KMH, detour=DETOUR_FACTOR):
+        self.tile_deg = tile_deg
+        self.speed_kmh = speed_kmh
+        self.detour = detour
+        self.coords = {}       # set -> {id: (lat, lon)}
+        self.tiles = {}        # set -> {id: tile}
+        self.members = {}      # (set, tile) -> _Tile
+        self.blocks = {}       # (set a, tile a, set b, tile b) -> float32 matrix
+        self._block_keys = {}  # (set, tile) -> block keys that involve it
+        self.stats = {"blocks_computed": 0, "blocks_reused": 0, "pairs_computed": 0}
+        self.lock = threading.RLock()    # hold while updating + querying from shared (threaded) callers
+
+    # ---- block maintenance ----
+    def _distances(self, lat, lon, tile):
+        d = haversine_km(lat, lon, tile.lat, tile.lon).astype(np.float32)
+        self.stats["pairs_computed"] += d.size
+        return d
+
+    def _patch(self, name, tile, i, op):
+        """Apply a member change of (name, tile) to every cached block that involves it."""
+        side = (name, tile)
+        for key in list(self._block_keys.get(side, ())):
+            a, b = (key[0], key[1]), (key[2], key[3])
+            if a == b:                               # set against itself: just recompute later
+                self._drop_block(key)
+                continue
+            blk = self.blocks[key]
+            other = self.members[b if a == side else a]
+            t = self.members[side]
+            if not len(other):
+                self._drop_block(key)
+                continue
+            if a != side:
+                blk = blk.T                          # view: work on columns as rows
+            if op == "drop":
+                p, last = i
+                if p != last:
+                    blk[p] = blk[last]
+                blk = blk[:last]
+            else:
+                p = t.pos[i]
+                row = self._distances(t.lat[p], t.lon[p], other)
+                if op == "move":
+                    blk[p] = row
+                else:
+                    blk = np.vstack([blk, row[None, :]])
+            self.blocks[key] = blk if a == side else blk.T
+
+    def _drop_block(self, key):
+        self.blocks.pop(key, None)
+        for side in ((key[0], key[1]), (key[2], key[3])):
+            self._block_keys.get(side, set()).discard(key)
+
+    # ---- entity updates ----
+    def upsert(self, name, ids, lat, lon):
+        """Add or move entities of a set; returns how many actually changed."""
+        coords = self.coords.setdefault(name, {})
+        tiles = self.tiles.setdefault(name, {})
+        changed = 0
+        for i, a, b in zip(ids, lat, lon):
+            a = None if a is None or a != a else float(a)       # NaN -> None
+            b = None if b is None or b != b else float(b)
+            if i in coords and coords[i] == (a, b):
+                continue
+            changed += 1
+            old, new = tiles.get(i), tile_of(a, b, self.tile_deg)
+            coords[i], tiles[i] = (a, b), new
+            if old is not None and old == new:
+                t = self.members[(name, new)]
+                t.lat[t.pos[i]], t.lon[t.pos[i]] = a, b
+                self._patch(name, new, i, "move")
+                continue
+            if old is not None:
+                self._patch(name, old, self.members[(name, old)].drop(i), "drop")
+            if new is not None:
+                self.members.setdefault((name, new), _Tile()).add(i, a, b)
+                self._patch(name, new, i, "add")
+        return changed
+
+    def remove(self, name, ids):
+        """Drop entities from a set; returns how many were present."""
+        coords, tiles = self.coords.get(name, {}), self.tiles.get(name, {})
+        removed = 0
+        for i in ids:
+            if i not in coords:
+                continue
+            removed += 1
+            tile = tiles.pop(i)
+            del coords[i]
+            if tile is not None:
+                self._patch(name, tile, self.members[(name, tile)].drop(i), "drop")
+        return removed
+
+    def sync(self, name, ids, lat, lon):
+        """Make a set contain exactly these entities; returns the number added, moved or removed."""
+        ids = list(ids)
+        gone = set(self.coords.get(name, {})) - set(ids)
+        return self.remove(name, gone) + self.upsert(name, ids, lat, lon)
+
+    def sync_records(self, name, records, id_col, lat_col="latitude", lon_col="longitude"):
+        """sync() from list_*() dicts."""
+        return self.sync(name, [r[id_col] for r in records],
+                         [_float(r.get(lat_col)) for r in records], [_float(r.get(lon_col)) for r in records])
+
+    # ---- queries ----
+    def _block(self, a, ta, b, tb):
+        key = (a, ta, b, tb)
+        blk = self.blocks.get(key)
+        if blk is None:
+            ma, mb = self.members[(a, ta)], self.members[(b, tb)]
+            blk = self.blocks[key] = distance_matrix(ma.lat, ma.lon, mb.lat, mb.lon).astype(np.float32)
+            self._block_keys.setdefault((a, ta), set()).add(key)
+            self._block_keys.setdefault((b, tb), set()).add(key)
+            self.stats["blocks_computed"] += 1
+            self.stats["pairs_computed"] += blk.size
+        else:
+            self.stats["blocks_reused"] += 1
+        return blk
+
+    def _groups(self, name, ids):
+        """{tile: (output positions, positions inside the tile)} for the located ids."""
+        tiles = self.tiles.get(name, {})
+        groups = {}
+        for pos, i in enumerate(ids):
+            tile = tiles.get(i)
+            if tile is not None:
+                groups.setdefault(tile, []).append(pos)
+        out = {}
+        for tile, rows in groups.items():
+            where = self.members[(name, tile)].pos
+            out[tile] = (np.array(rows), np.array([where[ids[r]] for r in rows]))
+        return out
+
+    def distance_km(self, a, b, a_ids=None, b_ids=None):
+        """[len(a_ids), len(b_ids)] km between entities of sets a and b (all members by default)."""
+        a_ids = list(self.coords.get(a, {}) if a_ids is None else a_ids)
+        b_ids = list(self.coords.get(b, {}) if b_ids is None else b_ids)
+        out = np.full((len(a_ids), len(b_ids)), np.nan, dtype=np.float32)
+        groups_b = self._groups(b, b_ids)
+        for ta, (rows, pa) in self._groups(a, a_ids).items():
+            for tb, (cols, pb) in groups_b.items():
+                out[np.ix_(rows, cols)] = self._block(a, ta, b, tb)[np.ix_(pa, pb)]
+        return out
+
+    def eta_hours(self, a, b, a_ids=None, b_ids=None):
+        return eta_hours(self.distance_km(a, b, a_ids, b_ids), self.speed_kmh, self.detour)
+
+    def nearest(self, a, b, k=3, a_ids=None, b_ids=None):
+        """Per entity of a: ([k] ids of b, [k] km) nearest first; unknown distances left out."""
+        a_ids = list(self.coords.get(a, {}) if a_ids is None else a_ids)
+        b_ids = np.array(list(self.coords.get(b, {}) if b_ids is None else b_ids), dtype=object)
+        d = self.distance_km(a, b, a_ids, b_ids)
+        order = np.argsort(np.where(np.isnan(d), np.inf, d), axis=1, kind="stable")[:, :k]
+        out = {}
+        for r, i in enumerate(a_ids):
+            cols = order[r][~np.isnan(d[r, order[r]])]
+            out[i] = (list(b_ids[cols]), d[r, cols])
+        return out
+
+
+def _float(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def benchmark(n_a=5_000, n_b=2_000, n_moved=50, seed=0):
+    """Full matrix vs. cached matrix after n_moved entities of set a move."""
+    rng = np.random.default_rng(seed)
+    lat_a, lon_a = rng.uniform(-10, 50, n_a), rng.uniform(60, 140, n_a)
+    lat_b, lon_b = rng.uniform(-10, 50, n_b), rng.uniform(60, 140, n_b)
+    cache = GeoCostCache()
+    cache.sync("cases", range(n_a), lat_a, lon_a)
+    cache.sync("volunteers", range(n_b), lat_b, lon_b)
+    t0 = time.perf_counter()
+    distance_matrix(lat_a, lon_a, lat_b, lon_b)
+    t1 = time.perf_counter()
+    cache.distance_km("cases", "volunteers")
+    t2 = time.perf_counter()
+    moved = rng.choice(n_a, n_moved, replace=False)
+    before = cache.stats["pairs_computed"]
+    t3 = time.perf_counter()
+    cache.upsert("cases", moved, lat_a[moved] + 0.1, lon_a[moved] + 0.1)
+    t4 = time.perf_counter()
+    cache.distance_km("cases", "volunteers")
+    t5 = time.perf_counter()
+    return {"direct_s": round(t1 - t0, 3), "cached_first_s": round(t2 - t1, 3),
+            "move_s": round(t4 - t3, 3), "query_after_move_s": round(t5 - t4, 3),
+            "pairs_recomputed": cache.stats["pairs_computed"] - before, "pairs_total": n_a * n_b}
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        print(benchmark())
@@ -0,0 +1,86 @@
+# geo_grid.py — Multi-resolution square / hex binning of lat-lon points for map payloads
+
+import numpy as np
+import pandas as pd
+
+LEVELS = (4.0, 2.0, 1.0, 0.5, 0.25)    # cell size in degrees, coarse -> fine
+RAW_ZOOM = 9                           # from this map zoom on, raw points are sent ...
+RAW_POINT_LIMIT = 5_000                # ... if there are at most this many
+SQRT3 = np.sqrt(3.0)
+
+
+def valid_points(lat, lon):
+    """(lat, lon) float arrays with NaN and out-of-range coordinates dropped."""
+    lat = pd.to_numeric(pd.Series(lat), errors="coerce").to_numpy(dtype=float)
+    lon = pd.to_numeric(pd.Series(lon), errors="coerce").to_numpy(dtype=float)
+    ok = (np.abs(lat) <= 90) & (np.abs(lon) <= 180)      # False for NaN
+    return lat[ok], lon[ok]
+
+
+def square_cells(lat, lon, cell):
+    """Counts per cell x cell degree square: lon, lat (centre), lon0/lon1/lat0/lat1 (edges), count."""
+    ncol = int(np.ceil(360 / cell))
+    ix = np.minimum(np.floor((lon + 180) / cell), ncol - 1).astype(np.int64)
+    iy = np.floor((lat + 90) / cell).astype(np.int64)
+    codes, counts = np.unique(iy * ncol + ix, return_counts=True)
+    lon0 = (codes % ncol) * cell - 180
+    lat0 = (codes // ncol) * cell - 90
+    return pd.DataFrame({"lon": lon0 + cell / 2, "lat": lat0 + cell / 2,
+                         "lon0": lon0, "lon1": lon0 + cell, "lat0": lat0, "lat1": lat0 + cell,
+                         "count": counts})
+
+
+def hex_cells(lat, lon, size):
+    """Counts per pointy-top hexagon of circumradius size degrees: lon, lat (centre), count."""
+    q = (SQRT3 / 3 * lon - lat / 3) / size
+    r = (2 / 3 * lat) / size
+    # Cube-coordinate rounding, vectorized
+    x, z = q, r
+    y = -x - z
+    rx, ry, rz = np.round(x), np.round(y), np.round(z)
+    dx, dy, dz = np.abs(rx - x), np.abs(ry - y), np.abs(rz - z)
+    fix_x = (dx > dy) & (dx > dz)
+    fix_z = ~fix_x & (dz >= dy)
+    rx = np.where(fix_x, -ry - rz, rx)
+    rz = np.where(fix_z, -rx - ry, rz)
+    qi, ri = rx.astype(np.int64), rz.astype(np.int64)
+    span = int(np.ceil(400 / size))                    # axial coords fit in (-span, span)
+    codes, counts = np.unique((qi + span) * (2 * span) + (ri + span), return_counts=True)
+    qi, ri = codes // (2 * span) - span, codes % (2 * span) - span
+    return pd.DataFrame({"lon": size * SQRT3 * (qi + ri / 2), "lat": size * 1.5 * ri, "count": counts})
+
+
+def cell_for_zoom(zoom, levels=LEVELS):
+    """Coarsest level no larger than ~1/8 of the visible span at this web-map zoom."""
+    target = 45.0 / 2 ** zoom
+    finer = [c for c in levels if c <= target]
+    return max(finer) if finer else min(levels)
+
+
+class GeoGrid:
+    """
+    Point set pre-binned at every level in LEVELS (square or hex cells). view() picks the
+    level for a map zoom and returns only aggregated cells, or the raw points once the
+    map is zoomed in far enough and the point count is small.
+    """
+
+    def __init__(self, lat, lon, kind="square", levels=LEVELS):
+        self.lat, self.lon = valid_points(lat, lon)
+        self.kind = kind
+        binner = hex_cells if kind == "hex" else square_cells
+        self.cells = {c: binner(self.lat, self.lon, c) for c in levels}
+
+    def __len__(self):
+        return len(self.lat)
+
+    def points(self):
+        return pd.DataFrame({"lon": self.lon, "lat": self.lat})
+
+    def view(self, zoom):
+        """("points", frame) or ("cells", frame) for a map zoom."""
+        if zoom >= RAW_ZOOM and len(self) <= RAW_POINT_LIMIT:
+            return "points", self.points()
+        return "cells", self.cells[cell_for_zoom(zoom, tuple(self.cells))]
+
+    def center(self):
+        return (float(self.lat.mean()), float(self.lon.mean())) if len(self) else (0.0, 0.0)
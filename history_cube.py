@@ -0,0 +1,195 @@
+# history_cube.py — Precomputed aggregate cube (year × region × country × type) for disaster datasets
+
+import os
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from orange_io import read_orange_csv
+
+CUBE_DIR = os.path.join("cache", "cubes")
+
+# Cube measure -> source column ("events" is a row count)
+MEASURES = {
+    "events": None,
+    "deaths": "Total Deaths",
+    "affected": "Total Affected",
+    "damages": "Total Damages ('000 US$)",
+}
+DIMS = ("year", "region", "country", "type")
+
+
+def _file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+class HistoryCube:
+    """
+    Dense aggregate cube values[measure, year, location, type], where a location is a
+    distinct (region, country) pair. All keys are dictionary-encoded: years is a
+    contiguous int range and regions / countries / types are sorted label lists.
+
+    slice/rollup queries turn filters into index arrays over each axis and reduce a
+    small sub-cube, so they never touch the source rows.
+    """
+
+    def __init__(self, values, years, regions, countries, types, loc_region, loc_country):
+        self.values = values
+        self.years = np.asarray(years)
+        self.regions = list(regions)
+        self.countries = list(countries)
+        self.types = list(types)
+        self.loc_region = np.asarray(loc_region)
+        self.loc_country = np.asarray(loc_country)
+
+    # ---------- build / persist ----------
+    @classmethod
+    def from_frame(cls, df, year="Year", region="Region", country="Country", type="Disaster Type"):
+        """Aggregate a row-level frame; rows without a usable year are skipped."""
+        y = pd.to_numeric(df[year], errors="coerce")
+        ok = y.notna().to_numpy()
+        y = y.to_numpy()[ok].astype(int)
+        label = lambda c: df[c][ok].astype(object).fillna("Unknown").astype(str).str.strip().to_numpy()
+        reg, cty, typ = label(region), label(country), label(type)
+
+        years = np.arange(y.min(), y.max() + 1) if len(y) else np.arange(0)
+        regions, r_code = np.unique(reg, return_inverse=True)
+        countries, c_code = np.unique(cty, return_inverse=True)
+        types, t_code = np.unique(typ, return_inverse=True)
+        pairs, l_code = np.unique(np.stack([r_code, c_code], axis=1), axis=0, return_inverse=True)
+        l_code = l_code.ravel()
+
+        shape = (len(years), len(pairs), len(types))
+        flat = np.ravel_multi_index((y - (years[0] if len(years) else 0), l_code, t_code), shape)
+        size = int(np.prod(shape))
+        values = np.zeros((len(MEASURES),) + shape)
+        for m, col in enumerate(MEASURES.values()):
+            w = None if col is None or col not in df.columns else \
+                pd.to_numeric(df[col][ok], errors="coerce").fillna(0).to_numpy(dtype=float)
+            if col is None or w is not None:
+                values[m] = np.bincount(flat, weights=w, minlength=size).reshape(shape)
+        return cls(values, years, regions, countries, types, pairs[:, 0], pairs[:, 1])
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "values.npy"), self.values)
+        with open(os.path.join(directory, "dims.json"), "w") as f:
+            json.dump({
+                "measures": list(MEASURES), "years": self.years.tolist(),
+                "regions": self.regions, "countries": self.countries, "types": self.types,
+                "loc_region": self.loc_region.tolist(), "loc_country": self.loc_country.tolist(),
+            }, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        with open(os.path.join(directory, "dims.json"), "r") as f:
+            d = json.load(f)
+        values = np.load(os.path.join(directory, "values.npy"), mmap_mode="r" if mmap else None)
+        return cls(values, d["years"], d["regions"], d["countries"], d["types"], d["loc_region"], d["loc_country"])
+
+    @classmethod
+    def for_csv(cls, path, cache_dir=CUBE_DIR):
+        """
+        Cube for a CSV file (Orange or plain), rebuilt only when the file content changes
+        (cache key is a content hash).
+        """
+        key = f"{os.path.splitext(os.path.basename(path))[0]}-{_file_hash(path)}"
+        directory = os.path.join(cache_dir, key)
+        if os.path.exists(os.path.join(directory, "dims.json")):
+            return cls.load(directory)
+        cube = cls.from_frame(read_orange_csv(path))
+        cube.save(directory)
+        return cube
+
+    # ---------- queries ----------
+    def _axis_index(self, years=None, regions=None, countries=None, types=None):
+        yi = np.arange(len(self.years))
+        if years is not None:
+            if isinstance(years, tuple) and len(years) == 2:
+                yi = yi[(self.years >= years[0]) & (self.years <= years[1])]
+            else:
+                yi = yi[np.isin(self.years, list(years))]
+        loc = np.ones(len(self.loc_region), dtype=bool)
+        if regions:
+            loc &= np.isin(self.loc_region, self._codes(self.regions, regions))
+        if countries:
+            loc &= np.isin(self.loc_country, self._codes(self.countries, countries))
+        ti = np.arange(len(self.types))
+        if types:
+            ti = self._codes(self.types, types)
+        return yi, np.flatnonzero(loc), ti
+
+    @staticmethod
+    def _codes(labels, wanted):
+        wanted = [wanted] if isinstance(wanted, str) else wanted
+        pos = {v: i for i, v in enumerate(labels)}
+        return np.array([pos[w.strip()] for w in wanted if w.strip() in pos], dtype=int)
+
+    @staticmethod
+    def _take(arr, idx, axis, size):
+        """Index one axis; contiguous runs (year ranges, one region's locations) stay views."""
+        if len(idx) == size:
+            return arr
+        if len(idx) and idx[-1] - idx[0] + 1 == len(idx):
+            return arr[(slice(None),) * axis + (slice(idx[0], idx[-1] + 1),)]
+        return np.take(arr, idx, axis=axis)
+
+    def slice(self, **filters):
+        """Sub-cube values[measure, year, location, type] for the filters (years=(lo, hi) or list)."""
+        yi, li, ti = self._axis_index(**filters)
+        _, n_y, n_l, n_t = self.values.shape
+        sub = self._take(self._take(self._take(self.values, yi, 1, n_y), li, 2, n_l), ti, 3, n_t)
+        return sub, yi, li, ti
+
+    def total(self, **filters):
+        """{measure: sum} over the filtered cells."""
+        sub = self.slice(**filters)[0]
+        return dict(zip(MEASURES, sub.sum(axis=(1, 2, 3)).tolist()))
+
+    def rollup(self, by=("type",), **filters):
+        """
+        Aggregate the filtered cells by any of DIMS; returns one row per non-empty group
+        with a column per measure.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        sub, yi, li, ti = self.slice(**filters)
+        if "year" not in by:
+            sub = sub.sum(axis=1, keepdims=True)
+        if "type" not in by:
+            sub = sub.sum(axis=3, keepdims=True)
+        # Collapse the location axis to the requested location grouping
+        if "region" in by and "country" in by:
+            uniq = np.arange(len(li))
+        else:
+            codes = (self.loc_region if "region" in by else self.loc_country)[li] \
+                if ("region" in by or "country" in by) else np.zeros(len(li), dtype=int)
+            uniq, inv = np.unique(codes, return_inverse=True)
+            onehot = np.zeros((len(li), len(uniq)))
+            onehot[np.arange(len(li)), inv] = 1.0
+            sub = np.moveaxis(np.tensordot(sub, onehot, axes=([2], [0])), 3, 2)   # (M, Y, G, T)
+
+        m, ny, ng, nt = sub.shape
+        cells = sub.reshape(m, -1)
+        keep = cells[0] > 0
+        iy, ig, it = (a.ravel()[keep] for a in np.meshgrid(np.arange(ny), np.arange(ng), np.arange(nt), indexing="ij"))
+        out = {}
+        for d in by:
+            if d == "year":
+                out["year"] = self.years[yi][iy]
+            elif d == "type":
+                out["type"] = np.array(self.types, dtype=object)[ti][it]
+            elif d == "region":
+                rc = self.loc_region[li][uniq[ig]] if "country" in by else uniq[ig]
+                out["region"] = np.array(self.regions, dtype=object)[rc]
+            elif d == "country":
+                cc = self.loc_country[li][uniq[ig]] if "region" in by else uniq[ig]
+                out["country"] = np.array(self.countries, dtype=object)[cc]
+        for k, name in enumerate(MEASURES):
+            out[name] = cells[k][keep]
+        return pd.DataFrame(out)
@@ -0,0 +1,111 @@
+# metrics_engine.py — Confusion matrices, accuracy, per-class P/R/F1 and model disagreement via np.bincount
+
+import numpy as np
+import pandas as pd
+
+
+def _codes(series, labels):
+    """Codes of series into the shared label list (-1 for missing / unknown)."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        pos = {str(c).strip(): i for i, c in enumerate(labels)}
+        remap = np.array([pos.get(str(c).strip(), -1) for c in series.cat.categories] + [-1], dtype=np.int64)
+        return remap[series.cat.codes.to_numpy()]
+    codes = pd.Categorical(series.astype(object).map(lambda v: None if pd.isna(v) else str(v).strip()),
+                           categories=labels).codes
+    return codes.astype(np.int64)
+
+
+def _labels(columns):
+    """Sorted union of the (stripped) labels appearing in the columns."""
+    out = set()
+    for s in columns:
+        values = s.cat.categories if isinstance(s.dtype, pd.CategoricalDtype) else s.dropna().unique()
+        out.update(str(v).strip() for v in values)
+    return sorted(out)
+
+
+class ModelMetrics:
+    """
+    Confusion matrices for each model against the true labels (rows = true, columns =
+    predicted, over the shared labels) plus the Tree-vs-NN agreement matrix. Rows with
+    a missing true label or prediction are left out of the matrices that need them.
+    """
+
+    def __init__(self, labels, matrices, disagreement_matrix=None):
+        self.labels = labels
+        self.matrices = matrices
+        self.disagreement_matrix = disagreement_matrix
+
+    @classmethod
+    def from_frame(cls, df, true_col, pred_cols):
+        """
+        pred_cols maps model name -> prediction column. All confusion matrices (and the
+        model-vs-model matrix when there are two models) come from one np.bincount.
+        """
+        pred_cols = {name: c for name, c in pred_cols.items() if c and c in df.columns}
+        labels = _labels([df[true_col], *(df[c] for c in pred_cols.values())])
+        k = len(labels)
+        t = _codes(df[true_col], labels)
+        preds = {name: _codes(df[c], labels) for name, c in pred_cols.items()}
+
+        pairs = [(t, p) for p in preds.values()]
+        if len(preds) == 2:
+            pairs.append(tuple(preds.values()))
+        flat = []
+        for slot, (a, b) in enumerate(pairs):
+            ok = (a >= 0) & (b >= 0)
+            flat.append(slot * k * k + a[ok] * k + b[ok])
+        flat = np.concatenate(flat) if flat else np.zeros(0, dtype=np.int64)
+        counts = np.bincount(flat, minlength=len(pairs) * k * k).reshape(len(pairs), k, k)
+        matrices = dict(zip(preds, counts[:len(preds)]))
+        disagreement = counts[len(preds)] if len(preds) == 2 else None
+        return cls(labels, matrices, disagreement)
+
+    def confusion(self, model):
+        """Confusion matrix for model as a labelled DataFrame."""
+        return pd.DataFrame(self.matrices[model], index=self.labels, columns=self.labels)
+
+    def accuracy(self, model):
+        cm = self.matrices[model]
+        n = cm.sum()
+        return float(np.trace(cm) / n) if n else float("nan")
+
+    def per_class(self, model):
+        """Per-label precision, recall, F1 and support (true count); labels never seen are dropped."""
+        cm = self.matrices[model].astype(float)
+        tp = np.diag(cm)
+        predicted, support = cm.sum(axis=0), cm.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.where(predicted > 0, tp / predicted, 0.0)
+            recall = np.where(support > 0, tp / support, 0.0)
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        out = pd.DataFrame({"label": self.labels, "precision": precision, "recall": recall,
+                            "f1": f1, "support": support.astype(int)})
+        return out[(support > 0) | (predicted > 0)].reset_index(drop=True)
+
+    def macro_f1(self, model):
+        pc = self.per_class(model)
+        return float(pc["f1"].mean()) if len(pc) else float("nan")
+
+    def disagreement(self):
+        """Share of rows where the two models predict different labels (None with < 2 models)."""
+        if self.disagreement_matrix is None:
+            return None
+        n = self.disagreement_matrix.sum()
+        return float(1 - np.trace(self.disagreement_matrix) / n) if n else float("nan")
+
+    def disagreement_pairs(self, top=10):
+        """Most frequent (model A label, model B label) disagreements with counts."""
+        if self.disagreement_matrix is None:
+            return pd.DataFrame(columns=["first", "second", "count"])
+        m = self.disagreement_matrix.copy()
+        np.fill_diagonal(m, 0)
+        a, b = np.nonzero(m)
+        out = pd.DataFrame({"first": np.array(self.labels, dtype=object)[a],
+                            "second": np.array(self.labels, dtype=object)[b], "count": m[a, b]})
+        return out.sort_values("count", ascending=False).head(top).reset_index(drop=True)
+
+    def summary(self):
+        """One row per model: accuracy and macro F1."""
+        return pd.DataFrame([{"model": name, "accuracy": self.accuracy(name), "macro_f1": self.macro_f1(name)}
+                             for name in self.matrices])
@@ -0,0 +1,94 @@
+# orange_io.py — Orange-format CSV loader (type/flag header rows → dtypes) with a Parquet cache
+
+import os
+import io
+import csv
+import hashlib
+
+import pandas as pd
+
+ORANGE_CACHE_DIR = os.path.join("cache", "orange")
+
+CONTINUOUS = {"continuous", "c"}
+DISCRETE = {"discrete", "d"}
+STRING = {"string", "s", "text", "time", "t"}
+FLAGS = {"", "class", "c", "meta", "m", "ignore", "i", "weight", "w"}
+
+
+def _read_bytes(source):
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def orange_schema(data: bytes):
+    """
+    (names, types, flags) when the first three rows are an Orange header, else None.
+    A type is 'continuous', 'discrete' or 'string'; a space-separated value list
+    (Orange's explicit discrete domain) counts as discrete.
+    """
+    head = io.StringIO(data[:1 << 16].decode("utf-8", errors="replace"))
+    rows = list(zip(range(3), csv.reader(head)))
+    if len(rows) < 3:
+        return None
+    names, types, flags = (r for _, r in rows)
+    types = [t.strip().lower() for t in types] + [""] * (len(names) - len(types))
+    flags = [f.strip().lower() for f in flags] + [""] * (len(names) - len(flags))
+    if not set(flags) <= FLAGS or not any(t in CONTINUOUS | DISCRETE | STRING for t in types):
+        return None
+    kinds = []
+    for t in types:
+        if t in CONTINUOUS:
+            kinds.append("continuous")
+        elif t in STRING or not t:
+            kinds.append("string")
+        else:
+            kinds.append("discrete")
+    return names[:len(kinds)], kinds, flags[:len(kinds)]
+
+
+def parse_orange_csv(data: bytes) -> pd.DataFrame:
+    """
+    Parse CSV bytes. Orange files lose their type/flag rows and get typed columns:
+    continuous → float32, discrete → category, string → str. Plain CSVs are read as is.
+    """
+    schema = orange_schema(data)
+    if schema is None:
+        return pd.read_csv(io.BytesIO(data), low_memory=False)
+    names, kinds, _ = schema
+    dtype = {n: ("category" if k == "discrete" else str) for n, k in zip(names, kinds) if k != "continuous"}
+    df = pd.read_csv(io.BytesIO(data), skiprows=[1, 2], dtype=dtype, low_memory=False)
+    for n, k in zip(names, kinds):
+        if k == "continuous" and n in df.columns:
+            df[n] = pd.to_numeric(df[n], errors="coerce").astype("float32")
+    return df
+
+
+def read_orange_csv(source, cache_dir=ORANGE_CACHE_DIR) -> pd.DataFrame:
+    """
+    Load a path or raw bytes through parse_orange_csv, caching the parsed frame as
+    Parquet keyed by the content hash (re-uploads and reruns skip parsing).
+    Without pyarrow the cache is skipped.
+    """
+    data = _read_bytes(source)
+    key = hashlib.sha1(data).hexdigest()[:20]
+    path = os.path.join(cache_dir, f"{key}.parquet")
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return parse_orange_csv(data)
+    if os.path.exists(path):
+        try:
+            return pd.read_parquet(path)
+        except Exception:
+            pass
+    df = parse_orange_csv(data)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"⚠️ Could not cache parsed CSV: {e}")
+    return df
@@ -0,0 +1,287 @@
+# prepositioning.py — Multi-period pre-positioning LP: predicted incidents x current stock x transport cost
+
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linprog
+from scipy.sparse import coo_matrix
+
+from blood_redistribution import REGION_CENTROIDS, UNKNOWN_DISTANCE_KM
+from deployment import normalize_key
+from geo_cost import distance_matrix
+
+# Kits needed per predicted incident (the Ops Planner's former fixed rules)
+PER_INCIDENT = {"Trucks": 1 / 20, "MedKits": 10.0, "WaterKits": 10.0}
+
+# Share of the requirement used up by an incident; trucks come back, kits do not
+CONSUMED = {"Trucks": 0.0, "MedKits": 1.0, "WaterKits": 1.0}
+
+# Cost per unit and km moved between countries, per unit bought in, per unit held for a year
+TRANSPORT_COST_PER_KM = {"Trucks": 0.5, "MedKits": 0.002, "WaterKits": 0.004}
+PROCURE_COST = {"Trucks": 2_000.0, "MedKits": 25.0, "WaterKits": 15.0}
+HOLD_COST = {"Trucks": 100.0, "MedKits": 1.0, "WaterKits": 1.0}
+UNMET_FACTOR = 10.0        # an uncovered unit costs this many times its purchase price
+
+K_NEAREST = 8              # destination countries each country can ship to
+
+# Approximate country centroids (lat, lon); countries not listed fall back to their region centroid
+COUNTRY_CENTROIDS = {
+    "Afghanistan": (33.9, 67.7), "Armenia": (40.1, 45.0), "Azerbaijan": (40.1, 47.6), "Bahrain": (26.0, 50.6),
+    "Bangladesh": (23.7, 90.4), "Bhutan": (27.5, 90.4), "Brunei Darussalam": (4.5, 114.7),
+    "Cambodia": (12.6, 105.0), "China": (35.9, 104.2), "Cyprus": (35.1, 33.4), "Georgia": (42.3, 43.4),
+    "Hong Kong": (22.3, 114.2), "India": (20.6, 79.0), "Indonesia": (-0.8, 113.9), "Iran": (32.4, 53.7),
+    "Iraq": (33.2, 43.7), "Israel": (31.0, 34.9), "Japan": (36.2, 138.3), "Jordan": (30.6, 36.2),
+    "Kazakhstan": (48.0, 66.9), "Korea": (35.9, 127.8), "North Korea": (40.3, 127.5), "Kuwait": (29.3, 47.5),
+    "Kyrgyzstan": (41.2, 74.8), "Lao People's Democratic Republic": (19.9, 102.5), "Lebanon": (33.9, 35.9),
+    "Malaysia": (4.2, 101.98), "Maldives": (3.2, 73.2), "Mongolia": (46.9, 103.8), "Myanmar": (21.9, 95.96),
+    "Nepal": (28.4, 84.1), "Oman": (21.5, 55.9), "Pakistan": (30.4, 69.3), "Palestine": (31.9, 35.2),
+    "Philippines": (12.9, 121.8), "Qatar": (25.4, 51.2), "Saudi Arabia": (23.9, 45.1), "Singapore": (1.35, 103.8),
+    "Sri Lanka": (7.9, 80.8), "Syrian Arab Republic": (34.8, 39.0), "Taiwan": (23.7, 121.0),
+    "Tajikistan": (38.9, 71.3), "Thailand": (15.9, 100.99), "Timor-Leste": (-8.9, 125.7), "Turkey": (39.0, 35.2),
+    "Turkmenistan": (38.97, 59.6), "United Arab Emirates": (23.4, 53.8), "Uzbekistan": (41.4, 64.6),
+    "Viet Nam": (14.1, 108.3), "Yemen": (15.6, 48.5),
+}
+_CENTROID_BY_KEY = {k.lower(): v for k, v in COUNTRY_CENTROIDS.items()}
+
+PLAN_COLUMNS = ["Year", "Region", "Country", "Item", "Incidents", "Required", "Start", "Procure",
+                "Received", "Sent", "Unmet", "End"]
+SHIPMENT_COLUMNS = ["Year", "Item", "From Region", "From Country", "To Region", "To Country",
+                    "Quantity", "Distance_km"]
+
+
+def incident_demand(predictions, region_col="Region", country_col="Country", year_col="Year"):
+    """Predicted incidents per (Region, Country, Year); one row per prediction. Without years: one period."""
+    df = pd.DataFrame({"Region": predictions[region_col], "Country": predictions[country_col],
+                       "Year": predictions[year_col] if year_col in predictions.columns else 0})
+    df["Year"] = pd.to_numeric(df["Year"], errors="coerce").fillna(0).astype(int)
+    return df.groupby(["Region", "Country", "Year"], dropna=False, observed=True).size().reset_index(name="Incidents")
+
+
+def _locations(demand, stock):
+    """Country locations (by normalized name) with display names, region and coordinates."""
+    frames = [demand[["Region", "Country"]]]
+    if stock is not None and len(stock):
+        frames.append(stock[["Region", "Country"]])
+    loc = pd.concat(frames, ignore_index=True).astype(object).where(lambda d: d.notna(), "")
+    loc["key"] = normalize_key(loc["Country"])
+    loc = loc[loc["key"] != ""].drop_duplicates("key").reset_index(drop=True)
+    centroid = [_CENTROID_BY_KEY.get(k) or REGION_CENTROIDS.get(str(r).strip(), (np.nan, np.nan))
+                for k, r in zip(loc["key"], loc["Region"])]
+    loc["lat"] = [c[0] for c in centroid]
+    loc["lon"] = [c[1] for c in centroid]
+    return loc
+
+
+def _distances(loc):
+    d = distance_matrix(loc["lat"].to_numpy(), loc["lon"].to_numpy(), loc["lat"].to_numpy(), loc["lon"].to_numpy())
+    d = np.where(np.isnan(d), UNKNOWN_DISTANCE_KM, d)
+    np.fill_diagonal(d, 0.0)
+    return d
+
+
+def plan_prepositioning(demand, stock=None, items=None, per_incident=None, procure_per_year=None,
+                        k=K_NEAREST):
+    """
+    Decide, year by year, how many units of each item to buy, where to place them and
+    which country-to-country transfers to make so that predicted incidents are covered
+    at least total cost.
+
+    demand: incident_demand() frame (Region, Country, Year, Incidents)
+    stock:  read_resources_df() balances (Region, Country + item columns), the opening stock
+    procure_per_year: optional {item: max units bought per year across all countries}
+
+    One LP over all items, years and countries (solved with HiGHS): per (item, year,
+    country) the stock carried in + bought + received - sent - consumed use is the stock
+    carried out; reusable items (trucks) must be on hand at the required level, consumed
+    ones (kits) are used up. Each country can ship to its k nearest countries. Costs are
+    transport per unit-km, purchase, and holding per unit-year times the years until the
+    next period (one year after the last); shortfalls cost UNMET_FACTOR times the
+    purchase price. Demand rows without a country cannot be placed and are left out.
+
+    Returns (plan, shipments, summary): plan has one row per (Year, Country, Item),
+    shipments one row per transfer, summary the totals (incidents planned for and
+    dropped_incidents left out) and solve time.
+    """
+    t0 = time.perf_counter()
+    per_incident = {**PER_INCIDENT, **(per_incident or {})}
+    items = list(items or per_incident)
+    procure_per_year = procure_per_year or {}
+    demand = demand[demand["Incidents"] > 0]
+    if demand.empty or not items:
+        return (pd.DataFrame(columns=PLAN_COLUMNS), pd.DataFrame(columns=SHIPMENT_COLUMNS),
+                {"cost": 0.0, "procured": 0, "shipped": 0, "unmet": 0, "incidents": 0, "dropped_incidents": 0,
+                 "variables": 0, "seconds": 0.0})
+
+    loc = _locations(demand, stock)
+    years = np.sort(demand["Year"].unique())
+    n_i, n_t, n_n = len(items), len(years), len(loc)
+
+    # Requirement [item, year, country] and opening stock [item, country]
+    j = pd.Index(loc["key"]).get_indexer(normalize_key(demand["Country"]))
+    t = np.searchsorted(years, demand["Year"].to_numpy())
+    incidents = np.zeros((n_t, n_n))
+    ok = j >= 0                                                     # rows without a country are left out
+    np.add.at(incidents, (t[ok], j[ok]), demand["Incidents"].to_numpy(dtype=float)[ok])
+    dropped = int(demand["Incidents"].to_numpy()[~ok].sum())
+    rate = np.array([per_incident.get(it, 0.0) for it in items])
+    need = rate[:, None, None] * incidents[None]
+    need = np.where(np.array([CONSUMED.get(it, 1.0) for it in items])[:, None, None] < 1, np.ceil(need), need)
+    stock0 = np.zeros((n_i, n_n))
+    if stock is not None and len(stock):
+        sj = pd.Index(loc["key"]).get_indexer(normalize_key(stock["Country"]))
+        ok = sj >= 0
+        for a, it in enumerate(items):
+            if it in stock.columns:
+                np.add.at(stock0[a], sj[ok], pd.to_numeric(stock[it], errors="coerce").fillna(0).to_numpy()[ok])
+
+    # Shipping edges: each country to its k nearest others
+    dist = _distances(loc)
+    k = min(k, n_n - 1)
+    if k > 0:
+        order = np.argsort(np.where(np.eye(n_n, dtype=bool), np.inf, dist), axis=1, kind="stable")[:, :k]
+        src, dst = np.repeat(np.arange(n_n), k), order.ravel()
+    else:
+        src = dst = np.zeros(0, dtype=np.int64)
+    n_e = len(src)
+
+    # Variables: ship [i, t, e] | buy [i, t, n] | hold [i, t, n] | unmet [i, t, n]
+    n_ship, n_node = n_i * n_t * n_e, n_i * n_t * n_n
+    o_buy, o_hold, o_unmet = n_ship, n_ship + n_node, n_ship + 2 * n_node
+    n_var = n_ship + 3 * n_node
+    consumed = np.array([CONSUMED.get(it, 1.0) for it in items])
+    ii, tt = np.arange(n_i)[:, None], np.arange(n_t)[None, :]
+    block = (ii * n_t + tt)                                        # [i, t] -> node row block
+    node = (block[:, :, None] * n_n + np.arange(n_n)).ravel()       # row of every (i, t, n)
+
+    cell = np.arange(n_node)
+    ship_block = np.repeat(block.ravel(), n_e)
+    ship_var = np.arange(n_ship)
+    carry = (cell % (n_t * n_n)) >= n_n                              # hold[t-1] enters the balance of t
+    rows = [ship_block * n_n + np.tile(dst, n_i * n_t),              # received
+            ship_block * n_n + np.tile(src, n_i * n_t),              # sent
+            node, node, node[carry], node]                           # buy, hold, carried in, unmet
+    cols = [ship_var, ship_var, o_buy + cell, o_hold + cell, o_hold + cell[carry] - n_n, o_unmet + cell]
+    vals = [np.full(n_ship, -1.0), np.full(n_ship, 1.0), np.full(n_node, -1.0), np.full(n_node, 1.0),
+            np.full(int(carry.sum()), -1.0), -np.repeat(consumed, n_t * n_n)]
+    a_eq = coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                      shape=(n_node, n_var)).tocsr()
+    b_eq = (-consumed[:, None, None] * need).copy()
+    b_eq[:, 0, :] += stock0
+    b_eq = b_eq.ravel()
+
+    # Reusable items: carried stock must cover the covered requirement; purchase caps per year
+    ub_rows, ub_cols, ub_vals, b_ub = [], [], [], []
+    reuse = np.flatnonzero(consumed < 1)
+    if len(reuse):
+        idx = (reuse[:, None, None] * n_t * n_n + np.arange(n_t * n_n).reshape(1, n_t, n_n)).ravel()
+        r = np.arange(len(idx))
+        share = np.repeat(1 - consumed[reuse], n_t * n_n)
+        ub_rows += [r, r]
+        ub_cols += [o_hold + idx, o_unmet + idx]
+        ub_vals += [np.full(len(idx), -1.0), -share]
+        b_ub.append(-share * need.ravel()[idx])
+    capped = [(a, float(procure_per_year[it])) for a, it in enumerate(items) if procure_per_year.get(it) is not None]
+    base = sum(len(x) for x in b_ub)
+    for c, (a, cap) in enumerate(capped):
+        r0 = base + c * n_t
+        idx = np.arange(n_t * n_n)
+        ub_rows.append(r0 + idx // n_n)
+        ub_cols.append(o_buy + a * n_t * n_n + idx)
+        ub_vals.append(np.ones(len(idx)))
+        b_ub.append(np.full(n_t, cap))
+    a_ub = b_ub_vec = None
+    if b_ub:
+        b_ub_vec = np.concatenate(b_ub)
+        a_ub = coo_matrix((np.concatenate(ub_vals), (np.concatenate(ub_rows), np.concatenate(ub_cols))),
+                          shape=(len(b_ub_vec), n_var)).tocsr()
+
+    procure = np.array([PROCURE_COST.get(it, 1.0) for it in items])
+    gap = np.diff(years, append=years[-1] + 1).clip(min=1)          # years each period's closing stock is held
+    hold_cost = np.array([HOLD_COST.get(it, 0.0) for it in items])[:, None, None] * gap[None, :, None]
+    c = np.concatenate([
+        (np.array([TRANSPORT_COST_PER_KM.get(it, 0.0) for it in items])[:, None, None] * dist[src, dst][None, None, :]
+         * np.ones((1, n_t, 1))).ravel(),
+        np.repeat(procure, n_t * n_n),
+        np.broadcast_to(hold_cost, (n_i, n_t, n_n)).ravel(),
+        np.repeat(UNMET_FACTOR * procure, n_t * n_n),
+    ])
+    bounds = np.column_stack([np.zeros(n_var), np.full(n_var, np.inf)])
+    bounds[o_unmet:, 1] = need.ravel()
+    res = linprog(c, A_ub=a_ub, b_ub=b_ub_vec, A_eq=a_eq, b_eq=b_eq, bounds=bounds, method="highs")
+    if res.status != 0:
+        raise RuntimeError(f"Pre-positioning planner failed: {res.message}")
+
+    x = np.round(res.x, 6)
+    ship = x[:n_ship].reshape(n_i, n_t, n_e)
+    buy = x[o_buy:o_hold].reshape(n_i, n_t, n_n)
+    hold = x[o_hold:o_unmet].reshape(n_i, n_t, n_n)
+    unmet = x[o_unmet:].reshape(n_i, n_t, n_n)
+    received = np.zeros((n_i, n_t, n_n))
+    sent = np.zeros((n_i, n_t, n_n))
+    np.add.at(received, (slice(None), slice(None), dst), ship)
+    np.add.at(sent, (slice(None), slice(None), src), ship)
+    start = np.concatenate([stock0[:, None, :], hold[:, :-1, :]], axis=1)
+
+    plan = pd.DataFrame({
+        "Year": np.tile(np.repeat(years, n_n), n_i),
+        "Region": np.tile(loc["Region"].to_numpy(), n_i * n_t),
+        "Country": np.tile(loc["Country"].to_numpy(), n_i * n_t),
+        "Item": np.repeat(items, n_t * n_n),
+        "Incidents": np.tile(incidents.ravel(), n_i).astype(int),
+        "Required": need.ravel(), "Start": start.ravel(), "Procure": buy.ravel(),
+        "Received": received.ravel(), "Sent": sent.ravel(), "Unmet": unmet.ravel(), "End": hold.ravel(),
+    })
+    qty = ["Required", "Start", "Procure", "Received", "Sent", "Unmet", "End"]
+    plan[qty] = np.round(plan[qty].to_numpy()).astype(int)
+    active = (plan[["Incidents"] + qty].to_numpy() != 0).any(axis=1)
+    plan = plan[active].sort_values(["Year", "Region", "Country", "Item"], kind="stable").reset_index(drop=True)
+
+    i_s, t_s, e_s = np.nonzero(ship > 0.5)
+    shipments = pd.DataFrame({
+        "Year": years[t_s], "Item": np.array(items, dtype=object)[i_s],
+        "From Region": loc["Region"].to_numpy()[src[e_s]], "From Country": loc["Country"].to_numpy()[src[e_s]],
+        "To Region": loc["Region"].to_numpy()[dst[e_s]], "To Country": loc["Country"].to_numpy()[dst[e_s]],
+        "Quantity": np.round(ship[i_s, t_s, e_s]).astype(int), "Distance_km": np.round(dist[src[e_s], dst[e_s]], 1),
+    }, columns=SHIPMENT_COLUMNS)
+    summary = {"cost": round(float(res.fun), 2), "procured": int(round(buy.sum())),
+               "shipped": int(round(ship.sum())), "unmet": int(round(unmet.sum())),
+               "incidents": int(incidents.sum()), "dropped_incidents": dropped,
+               "variables": n_var, "seconds": round(time.perf_counter() - t0, 3)}
+    return plan, shipments, summary
+
+
+def _synthetic(years=range(2025, 2051), seed=0):
+    """Incidents for every country in COUNTRY_CENTROIDS and year, plus a random opening stock."""
+    rng = np.random.default_rng(seed)
+    countries = list(COUNTRY_CENTROIDS)
+    region = {c: min(REGION_CENTROIDS, key=lambda r: np.hypot(REGION_CENTROIDS[r][0] - COUNTRY_CENTROIDS[c][0],
+                                                             REGION_CENTROIDS[r][1] - COUNTRY_CENTROIDS[c][1]))
+              for c in countries}
+    years = list(years)
+    demand = pd.DataFrame({
+        "Region": [region[c] for c in countries for _ in years],
+        "Country": [c for c in countries for _ in years],
+        "Year": years * len(countries),
+        "Incidents": rng.poisson(3, len(countries) * len(years)),
+    })
+    stock = pd.DataFrame({"Region": [region[c] for c in countries], "Country": countries,
+                          "Trucks": rng.integers(0, 5, len(countries)),
+                          "MedKits": rng.integers(0, 500, len(countries)),
+                          "WaterKits": rng.integers(0, 500, len(countries))})
+    return demand, stock
+
+
+def benchmark(seed=0):
+    """Timing for every country in COUNTRY_CENTROIDS over 2025-2050 (3 items), with and without purchase caps."""
+    demand, stock = _synthetic(seed=seed)
+    _, _, free = plan_prepositioning(demand, stock)
+    _, _, capped = plan_prepositioning(demand, stock, procure_per_year={"MedKits": 800, "WaterKits": 800, "Trucks": 5})
+    return {"countries": len(COUNTRY_CENTROIDS), "years": demand["Year"].nunique(),
+            "uncapped": free, "capped": capped}
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        print(benchmark())
@@ -0,0 +1,153 @@
+# shelter_allocation.py — Batch case-to-shelter allocation as sparse min-cost matching of cases to shelter places
+
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from assignment import match_slots
+from blood_redistribution import REGION_CENTROIDS
+from geo_cost import EARTH_RADIUS_KM, haversine_km, eta_hours
+
+K_NEAREST = 16             # candidate shelters per case
+SLOTS_PER_EDGE = 16        # places of a shelter each case is linked to
+MAX_ROUNDS = 6             # re-link rounds for cases left over while places remain
+UNPLACED_KM = 1e5          # leaving a case without a shelter costs more than any trip
+
+
+def _located(records, id_col):
+    """(ids, lat, lon) using each record's coordinates, else its region centroid; unlocated rows dropped."""
+    ids, lat, lon = [], [], []
+    for r in records:
+        a, b = r.get("latitude"), r.get("longitude")
+        if a is None or b is None or pd.isna(a) or pd.isna(b):
+            a, b = REGION_CENTROIDS.get((r.get("region") or "").strip(), (None, None))
+        if a is not None:
+            ids.append(r[id_col])
+            lat.append(float(a))
+            lon.append(float(b))
+    return np.array(ids, dtype=object), np.array(lat, dtype=float), np.array(lon, dtype=float)
+
+
+def _unit_vectors(lat, lon):
+    """Points on the unit sphere; chord distance orders neighbours like great-circle distance."""
+    la, lo = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(la) * np.cos(lo), np.cos(la) * np.sin(lo), np.sin(la)])
+
+
+def _place_edges(c_xyz, rows, s_xyz, shelters, spare, k, max_km):
+    """
+    Case -> place edges: each case in rows is linked to its k nearest shelters (among
+    `shelters`, optionally within max_km) and each such edge fans out to
+    SLOTS_PER_EDGE of the shelter's spare places, picked round-robin by case index so
+    cases near a big shelter spread over all of its places.
+    Returns (case row, place index, shelter of each place).
+    """
+    first = np.concatenate([[0], np.cumsum(spare[shelters])])
+    owner = np.repeat(shelters, spare[shelters])
+    k = min(k, len(shelters))
+    limit = np.inf if max_km is None else 2 * np.sin(max_km / EARTH_RADIUS_KM / 2)
+    _, nb = cKDTree(s_xyz[shelters]).query(c_xyz[rows], k=k, distance_upper_bound=limit)
+    nb = nb.reshape(len(rows), k)
+    r, j = np.repeat(rows, k), nb.ravel()
+    ok = j < len(shelters)                 # missing neighbours come back as index len(shelters)
+    r, j = r[ok], j[ok]
+    n = np.diff(first)[j]
+    fan = np.minimum(n, SLOTS_PER_EDGE)
+    r2, j2, n2 = np.repeat(r, fan), np.repeat(j, fan), np.repeat(n, fan)
+    step = np.arange(fan.sum()) - np.repeat(np.cumsum(fan) - fan, fan)
+    place = first[j2] + (r2 * SLOTS_PER_EDGE + step) % n2
+    return r2, place, owner
+
+
+def allocate_shelters(cases, shelters, k=K_NEAREST, max_km=None, max_rounds=MAX_ROUNDS, chain_km=None):
+    """
+    Place open, unsheltered cases (list_cases() dicts) into shelters (list_shelters()
+    dicts), minimizing total distance while each shelter takes at most its `available`
+    places. This is a transportation problem with unit demands: each shelter is
+    expanded into its places and cases are matched to places over a sparse graph of
+    their k nearest shelters (optionally within max_km) with scipy's sparse LAPJV.
+    Cases left over while places remain elsewhere are re-linked to the nearest shelters
+    that still have room and matched again.
+
+    chain_km (opt-in, default exact) trades distance for speed on tight capacity: the
+    first round then leaves a case open rather than add more than chain_km to the total
+    (its own trip plus other cases shifted away) and the re-link rounds place it
+    afterwards, so the plan is no longer distance-minimal.
+
+    Returns (placements, unplaced): placements has case_id, shelter_id, distance_km,
+    eta_h; unplaced lists case_id and reason.
+    """
+    cols = ["case_id", "shelter_id", "distance_km", "eta_h"]
+    c_ids, c_lat, c_lon = _located(cases, "case_id")
+    located = set(c_ids)
+    no_loc = [c["case_id"] for c in cases if c["case_id"] not in located]
+    free = [s for s in shelters if int(s.get("available") or 0) > 0]
+    s_ids, s_lat, s_lon = _located(free, "shelter_id")
+    by_id = {s["shelter_id"]: int(s.get("available") or 0) for s in free}
+    spare = np.array([by_id[sid] for sid in s_ids], dtype=np.int64)
+
+    def unplaced_frame(ids, reason):
+        return pd.DataFrame({"case_id": list(ids), "reason": reason}, columns=["case_id", "reason"])
+
+    c_xyz, s_xyz = _unit_vectors(c_lat, c_lon), _unit_vectors(s_lat, s_lon)
+    case_of, shelter_of = [np.zeros(0, np.int64)], [np.zeros(0, np.int64)]
+    open_rows = np.arange(len(c_ids))
+    for rnd in range(max_rounds):
+        has_room = np.flatnonzero(spare > 0)
+        if len(open_rows) == 0 or len(has_room) == 0:
+            break
+        r, place, owner = _place_edges(c_xyz, open_rows, s_xyz, has_room, spare, k, max_km)
+        km = haversine_km(c_lat[r], c_lon[r], s_lat[owner[place]], s_lon[owner[place]])
+        pos = np.full(len(c_ids), -1)
+        pos[open_rows] = np.arange(len(open_rows))
+        rows, places = match_slots(len(open_rows), len(owner), pos[r], place, -km,
+                                   bonus=chain_km if rnd == 0 and chain_km else UNPLACED_KM)
+        if len(rows) == 0:
+            if rnd:
+                break
+            continue
+        case_of.append(open_rows[rows])
+        shelter_of.append(owner[places])
+        spare -= np.bincount(owner[places], minlength=len(spare))
+        open_rows = np.setdiff1d(open_rows, open_rows[rows])
+
+    ci, si = np.concatenate(case_of), np.concatenate(shelter_of)
+    km = haversine_km(c_lat[ci], c_lon[ci], s_lat[si], s_lon[si])
+    placements = pd.DataFrame({"case_id": c_ids[ci], "shelter_id": s_ids[si], "distance_km": np.round(km, 1),
+                               "eta_h": np.round(eta_hours(km), 1)}, columns=cols)
+    reason = "no shelter place in reach" if len(s_ids) else "no shelter with free places"
+    unplaced = pd.concat([unplaced_frame(c_ids[open_rows], reason), unplaced_frame(no_loc, "no location")],
+                         ignore_index=True)
+    return placements.sort_values("distance_km", kind="stable").reset_index(drop=True), unplaced
+
+
+def _synthetic(n_cases, n_shelters, seed=0):
+    rng = np.random.default_rng(seed)
+    cases = [{"case_id": f"C{i}", "latitude": rng.uniform(-10, 50), "longitude": rng.uniform(60, 140)}
+             for i in range(n_cases)]
+    shelters = [{"shelter_id": f"S{i}", "latitude": rng.uniform(-10, 50), "longitude": rng.uniform(60, 140),
+                 "available": int(rng.integers(0, 6))} for i in range(n_shelters)]
+    return cases, shelters
+
+
+def benchmark(n_cases=5_000, n_shelters=2_000, seed=0, chain_km=None):
+    """Timing for a synthetic instance (default 5k cases x 2k shelters)."""
+    cases, shelters = _synthetic(n_cases, n_shelters, seed)
+    t0 = time.perf_counter()
+    placed, unplaced = allocate_shelters(cases, shelters, chain_km=chain_km)
+    t1 = time.perf_counter()
+    load = placed["shelter_id"].value_counts()
+    avail = {s["shelter_id"]: s["available"] for s in shelters}
+    return {"cases": n_cases, "shelters": n_shelters, "capacity": sum(avail.values()),
+            "placed": len(placed), "unplaced": len(unplaced),
+            "over_capacity": int((load > load.index.map(avail)).sum()),
+            "total_km": round(float(placed["distance_km"].sum())), "solve_s": round(t1 - t0, 3)}
+
+
+if __name__ == "__main__":
+    import sys
+    if "--bench" in sys.argv:
+        print(benchmark())
+        print(benchmark(chain_km=1_000.0))
@@ -6,9 +6,18 @@ import random
 import numpy as np
 import pandas as pd
 from datetime import datetime
+from functools import lru_cache
 from get_weather import get_weather_data
+from weather_provider import default_provider
+from db import append_alerts
+from history_cube import HistoryCube
+from orange_io import read_orange_csv
 
 MODELS_DIR = "models"
+HISTORY_CSV = "Asia_1900_2021_DISASTERS.csv"
+
+# Per-event numeric inputs of tree_baseline; future events use each country's historical median
+TREE_NUMERIC = ["Start Month", "Start Day", "Total Deaths", "No Injured", "No Affected", "Total Affected"]
 
 def load_model():
     """
@@ -58,6 +67,176 @@ def load_model():
             raise Exception(f"❌ Could not load models from either Orange or joblib: {e2}")
 
 
+@lru_cache(maxsize=4)
+def load_location_profiles(path=HISTORY_CSV):
+    """
+    One row per country summarising its disaster history: region, mean known coordinates,
+    coastal share, event counts (country and region) and medians of the tree's numeric inputs.
+    """
+    df = read_orange_csv(path)
+    coord = lambda c: pd.to_numeric(df[c].astype(str).str.extract(r"(-?\d+\.?\d*)")[0], errors="coerce")
+    hist = pd.DataFrame({
+        "Country": df["Country"].astype(object), "Region": df["Region"].astype(object),
+        "Latitude": coord("Latitude"), "Longitude": coord("Longitude"),
+        "Coastal": df["Location"].astype(str).str.contains("coast", case=False).astype(float),
+        **{c: pd.to_numeric(df[c], errors="coerce") for c in TREE_NUMERIC},
+    })
+    prof = hist.groupby("Country").agg(
+        Region=("Region", lambda r: r.mode().iat[0]),
+        Latitude=("Latitude", "mean"), Longitude=("Longitude", "mean"),
+        Coastal=("Coastal", "mean"),
+        **{c: (c, "median") for c in TREE_NUMERIC},
+    )
+    # Event counts come straight from the aggregate cube
+    cube = HistoryCube.for_csv(path)
+    prof["Country_Disaster_Frequency"] = prof.index.map(cube.rollup("country").set_index("country")["events"])
+    prof["Region_Disaster_Frequency"] = prof["Region"].map(cube.rollup("region").set_index("region")["events"])
+    return prof.fillna(0.0)
+
+
+def _encode(encoder, values):
+    """LabelEncoder codes for values; unseen labels fall back to 0."""
+    classes = np.asarray(encoder.classes_)
+    values = np.asarray(values, dtype=object)
+    idx = np.clip(np.searchsorted(classes, values), 0, len(classes) - 1)
+    return np.where(classes[idx] == values, idx, 0)
+
+
+def build_features(countries, regions, years, encoders, meta, profiles=None):
+    """
+    Feature matrices for a batch of future (country, region, year) rows.
+
+    Returns (nn_X, tree_X): nn_X is a float array in meta["feature_columns"] order
+    (unscaled), tree_X a DataFrame with the tree pipeline's input columns.
+    Year_Sin/Year_Cos use a 100-year period, which reproduces the training scaler's
+    statistics; coordinates are the country's mean historical event location.
+    """
+    profiles = load_location_profiles() if profiles is None else profiles
+    countries = np.asarray(countries, dtype=object)
+    regions = np.asarray(regions, dtype=object)
+    year = np.asarray(years, dtype=float)
+    prof = profiles.reindex(countries)
+    known = prof["Region"].notna().to_numpy()
+    # Unknown countries keep the caller's region and get zero-filled history features
+    region = np.where(known, prof["Region"].to_numpy(dtype=object), regions)
+    prof = prof.drop(columns="Region").fillna(0.0)
+
+    lat = prof["Latitude"].to_numpy()
+    lat_abs = np.abs(lat)
+    cols = {
+        "Year": year,
+        "Year_Sin": np.sin(2 * np.pi * year / 100),
+        "Year_Cos": np.cos(2 * np.pi * year / 100),
+        "Decade": (year // 10) * 10,
+        "Years_Since_2000": year - 2000,
+        "Latitude": lat,
+        "Longitude": prof["Longitude"].to_numpy(),
+        "Lat_Abs": lat_abs,
+        "Tropical_Zone": ((lat_abs > 0) & (lat_abs <= 23.5)).astype(float),
+        "Temperate_Zone": ((lat_abs > 23.5) & (lat_abs <= 66.5)).astype(float),
+        "Polar_Zone": (lat_abs > 66.5).astype(float),
+        "Coastal": prof["Coastal"].to_numpy(),
+        "Region_Disaster_Frequency": prof["Region_Disaster_Frequency"].to_numpy(),
+        "Country_Disaster_Frequency": prof["Country_Disaster_Frequency"].to_numpy(),
+        "Region_Encoded": _encode(encoders["region"], region),
+        "Country_Encoded": _encode(encoders["country"], countries),
+    }
+    nn_X = np.column_stack([cols[c] for c in meta["feature_columns"]]).astype(float)
+
+    tree_X = pd.DataFrame({
+        "Start Year": year,
+        **{c: prof[c].to_numpy() for c in TREE_NUMERIC},
+        "Country": countries,
+        "Region": region,
+        "Continent": "Asia",
+        "Disaster Group": "Natural",
+    })
+    return nn_X, tree_X
+
+
+def _ensemble_weights():
+    """Tree/NN weights from the validation accuracy in models/metrics.json (equal if missing)."""
+    try:
+        with open(os.path.join(MODELS_DIR, "metrics.json"), "r") as f:
+            m = json.load(f)["models"]
+        w = np.array([m["decision_tree"]["ca"], m["neural_network"]["ca"]], dtype=float)
+        return w / w.sum()
+    except Exception:
+        return np.array([0.5, 0.5])
+
+
+def predict_batch(locations, years, models, encoders, scaler, meta, selected_disaster=None, profiles=None):
+    """
+    Run both models once over every row of locations (country, region) x years.
+
+    years may be a scalar (one year for all rows) or an array aligned with locations.
+    Returns one row per input row with tree/NN predictions and confidences, the
+    ensemble prediction and confidence (weighted average of class probabilities),
+    the alert level and a p_<class> column per disaster type.
+    """
+    tree_model, nn_model = models
+    n = len(locations)
+    years = np.broadcast_to(np.asarray(years), (n,))
+    nn_X, tree_X = build_features(locations["country"], locations["region"], years, encoders, meta, profiles)
+
+    labels = list(meta["disaster_types"])
+    col = {c: i for i, c in enumerate(labels)}
+    p_tree = np.zeros((n, len(labels)))
+    p_tree[:, [col[c] for c in tree_model.classes_]] = tree_model.predict_proba(tree_X)
+    p_nn = np.zeros((n, len(labels)))
+    nn_labels = encoders["target"].inverse_transform(nn_model.classes_)
+    p_nn[:, [col[c] for c in nn_labels]] = nn_model.predict_proba(
+        scaler.transform(pd.DataFrame(nn_X, columns=meta["feature_columns"])))
+
+    w_tree, w_nn = _ensemble_weights()
+    p_ens = w_tree * p_tree + w_nn * p_nn
+
+    # ✅ Respect user-selected disaster(s): pick the most probable of those
+    pick = p_ens
+    if selected_disaster and selected_disaster != "(All)":
+        chosen = selected_disaster if isinstance(selected_disaster, list) else [selected_disaster]
+        mask = np.isin(np.array(labels, dtype=object), chosen)
+        if mask.any():
+            pick = np.where(mask, p_ens, -1.0)
+
+    labels_arr = np.array([c.strip() for c in labels], dtype=object)
+    rows = np.arange(n)
+    final = pick.argmax(axis=1)
+    confidence = np.round(p_ens[rows, final] * 100, 2)
+    tree_idx, nn_idx = p_tree.argmax(axis=1), p_nn.argmax(axis=1)
+
+    out = pd.DataFrame({
+        "country": np.asarray(locations["country"]),
+        "region": np.asarray(locations["region"]),
+        "year": years,
+        "predicted_disaster": labels_arr[final],
+        "confidence": confidence,
+        "alert_level": np.select([confidence >= 80, confidence >= 60], ["HIGH", "MEDIUM"], "LOW"),
+        "tree_prediction": labels_arr[tree_idx],
+        "nn_prediction": labels_arr[nn_idx],
+        "tree_confidence": np.round(p_tree[rows, tree_idx] * 100, 2),
+        "nn_confidence": np.round(p_nn[rows, nn_idx] * 100, 2),
+    })
+    probs = pd.DataFrame(np.round(p_ens, 4), columns=[f"p_{c}" for c in labels_arr])
+    return pd.concat([out, probs], axis=1)
+
+
+def predict_grid(models, encoders, scaler, meta, years=range(2025, 2051), profiles=None):
+    """Every known country x every year in years, in one batched inference pass."""
+    profiles = load_location_profiles() if profiles is None else profiles
+    years = np.asarray(list(years))
+    locs = pd.DataFrame({
+        "country": np.repeat(profiles.index.to_numpy(), len(years)),
+        "region": np.repeat(profiles["Region"].to_numpy(), len(years)),
+    })
+    return predict_batch(locs, np.tile(years, len(profiles)), models, encoders, scaler, meta, profiles=profiles)
+
+
+def _has_batch_models(models, encoders, scaler, meta):
+    """True for the joblib (sklearn) artifacts; Orange models keep the simulated draws."""
+    return models is not None and encoders is not None and scaler is not None and meta is not None
+
+
 def simulate_future_prediction(row, models=None, encoders=None, scaler=None, meta=None, year=None, selected_disaster=None):
     """
     Simulate future disaster prediction with weather data integration
@@ -67,34 +246,6 @@ def simulate_future_prediction(row, models=None, encoders=None, scaler=None, met
         year: Future year to predict for
         selected_disaster: Optional disaster type filter
     """
-    # Base simulated confidences
-    conf_tree = np.random.uniform(40, 90)
-    conf_nn = np.random.uniform(40, 90)
-    conf_avg = (conf_tree + conf_nn) / 2
-
-    # 🌍 Random predictions to mimic variation
-    possible_disasters = ["Flood", "Earthquake", "Epidemic", "Storm", "Drought"]
-    tree_pred = random.choice(possible_disasters)
-    nn_pred = random.choice(possible_disasters)
-
-    # ✅ Respect user-selected disaster(s)
-    if selected_disaster and selected_disaster != "(All)":
-        if isinstance(selected_disaster, list):
-            final_prediction = random.choice(selected_disaster)
-        else:
-            final_prediction = selected_disaster
-    else:
-        # fallback: combine model guesses
-        final_prediction = tree_pred if tree_pred == nn_pred else random.choice(possible_disasters)
-
-    # Assign alert level based on confidence
-    if conf_avg >= 80:
-        alert = "HIGH"
-    elif conf_avg >= 60:
-        alert = "MEDIUM"
-    else:
-        alert = "LOW"
-
     # Extract country and region - handle both dict and Series
     if isinstance(row, dict):
         country = row.get("Country", "Myanmar")
@@ -103,6 +254,41 @@ def simulate_future_prediction(row, models=None, encoders=None, scaler=None, met
         # It's a pandas Series
         country = row["Country"] if "Country" in row.index else "Myanmar"
         region = row["Region"] if "Region" in row.index else "Unknown"
+
+    if _has_batch_models(models, encoders, scaler, meta):
+        pred = predict_batch(pd.DataFrame({"country": [country], "region": [region]}), year,
+                             models, encoders, scaler, meta, selected_disaster).iloc[0]
+        final_prediction, alert = pred["predicted_disaster"], pred["alert_level"]
+        tree_pred, nn_pred = pred["tree_prediction"], pred["nn_prediction"]
+        conf_avg, conf_tree, conf_nn = pred["confidence"], pred["tree_confidence"], pred["nn_confidence"]
+    else:
+        # Base simulated confidences
+        conf_tree = np.random.uniform(40, 90)
+        conf_nn = np.random.uniform(40, 90)
+        conf_avg = (conf_tree + conf_nn) / 2
+
+        # 🌍 Random predictions to mimic variation
+        possible_disasters = ["Flood", "Earthquake", "Epidemic", "Storm", "Drought"]
+        tree_pred = random.choice(possible_disasters)
+        nn_pred = random.choice(possible_disasters)
+
+        # ✅ Respect user-selected disaster(s)
+        if selected_disaster and selected_disaster != "(All)":
+            if isinstance(selected_disaster, list):
+                final_prediction = random.choice(selected_disaster)
+            else:
+                final_prediction = selected_disaster
+        else:
+            # fallback: combine model guesses
+            final_prediction = tree_pred if tree_pred == nn_pred else random.choice(possible_disasters)
+
+        # Assign alert level based on confidence
+        if conf_avg >= 80:
+            alert = "HIGH"
+        elif conf_avg >= 60:
+            alert = "MEDIUM"
+        else:
+            alert = "LOW"
     
     # Get weather data with error handling
     try:
@@ -133,15 +319,132 @@ def simulate_future_prediction(row, models=None, encoders=None, scaler=None, met
         "weather": weather,
     }
 
-    # Optional logging
+    # Optional logging (append-only alert store)
     try:
-        os.makedirs("alerts", exist_ok=True)
-        pd.DataFrame([{
-            "timestamp": datetime.now().isoformat(),
-            **result
-        }]).to_csv(f"alerts/alert_{country}_{year}.csv", index=False)
+        append_alerts([{"timestamp": datetime.now().isoformat(), **result}])
         print(f"🌍 {country} ({region}) {year} → {final_prediction} ({alert})")
     except Exception as e:
         print(f"⚠️ Could not save alert log: {e}")
     
-    return result
\ No newline at end of file
+    return result
+
+
+POSSIBLE_DISASTERS = ["Flood", "Earthquake", "Epidemic", "Storm", "Drought"]
+WEATHER_COLUMNS = ["temperature", "humidity", "wind_speed", "weather"]
+
+
+def simulation_locations(df):
+    """Unique (country, region) pairs in df with the number of historical rows behind each."""
+    country = df["Country"].astype(object).fillna("Myanmar") if "Country" in df.columns else pd.Series("Myanmar", index=df.index)
+    region = df["Region"].astype(object).fillna("Unknown") if "Region" in df.columns else pd.Series("Unknown", index=df.index)
+    locs = pd.DataFrame({"country": country.to_numpy(), "region": region.to_numpy()})
+    return locs.groupby(["country", "region"], sort=False).size().rename("records").reset_index()
+
+
+def _country_weather(country, weather_fetcher):
+    try:
+        weather_df = weather_fetcher(country)
+        if weather_df.empty:
+            return dict.fromkeys(WEATHER_COLUMNS)
+        return {c: weather_df[c].iloc[0] for c in WEATHER_COLUMNS}
+    except Exception as e:
+        print(f"⚠️ Weather API error for {country}: {e}")
+        return dict.fromkeys(WEATHER_COLUMNS)
+
+
+def _iter_country_weather(countries, weather_fetcher=None):
+    """(country, weather) pairs; the default provider fetches uncached countries concurrently."""
+    if weather_fetcher is None:
+        for country, rec in default_provider().iter_many(countries):
+            yield country, {c: rec.get(c) for c in WEATHER_COLUMNS}
+    else:
+        for country in countries:
+            yield country, _country_weather(country, weather_fetcher)
+
+
+def _yield_by_country(result, weather_fetcher):
+    groups = result.groupby("country", sort=False).indices
+    for country, weather in _iter_country_weather(list(groups), weather_fetcher):
+        yield result.iloc[groups[country]].assign(**weather)
+
+
+def iter_simulate_batch(df, year, selected_disaster=None, seed=None, weather_fetcher=None,
+                        models=None, encoders=None, scaler=None, meta=None):
+    """
+    Batched counterpart of simulate_future_prediction.
+
+    Predictions for every unique location are computed up front in one pass (batched
+    model inference with the joblib models, simulated draws otherwise); weather is
+    then fetched once per country and each country's rows are yielded as soon as its
+    weather arrives, so callers can render partial results.
+    """
+    locs = simulation_locations(df)
+    n = len(locs)
+    if n == 0:
+        return
+    if _has_batch_models(models, encoders, scaler, meta):
+        result = predict_batch(locs, year, models, encoders, scaler, meta, selected_disaster)
+        result.insert(10, "records", locs["records"].to_numpy())
+        yield from _yield_by_country(result, weather_fetcher)
+        return
+    rng = np.random.default_rng(seed)
+    choices = np.array(POSSIBLE_DISASTERS, dtype=object)
+
+    # Base simulated confidences
+    conf_tree = rng.uniform(40, 90, n)
+    conf_nn = rng.uniform(40, 90, n)
+    conf_avg = (conf_tree + conf_nn) / 2
+
+    tree_pred = choices[rng.integers(0, len(choices), n)]
+    nn_pred = choices[rng.integers(0, len(choices), n)]
+
+    # ✅ Respect user-selected disaster(s)
+    if selected_disaster and selected_disaster != "(All)":
+        if isinstance(selected_disaster, list):
+            pool = np.array(selected_disaster, dtype=object)
+            final_prediction = pool[rng.integers(0, len(pool), n)]
+        else:
+            final_prediction = np.full(n, selected_disaster, dtype=object)
+    else:
+        fallback = choices[rng.integers(0, len(choices), n)]
+        final_prediction = np.where(tree_pred == nn_pred, tree_pred, fallback)
+
+    result = pd.DataFrame({
+        "country": locs["country"],
+        "region": locs["region"],
+        "year": year,
+        "predicted_disaster": final_prediction,
+        "confidence": np.round(conf_avg, 2),
+        "alert_level": np.select([conf_avg >= 80, conf_avg >= 60], ["HIGH", "MEDIUM"], "LOW"),
+        "tree_prediction": tree_pred,
+        "nn_prediction": nn_pred,
+        "tree_confidence": np.round(conf_tree, 2),
+        "nn_confidence": np.round(conf_nn, 2),
+        "records": locs["records"],
+    })
+
+    yield from _yield_by_country(result, weather_fetcher)
+
+
+def save_batch_alerts(results, year):
+    """Append a whole simulation run to the alert store in one batch; returns rows written."""
+    try:
+        n = append_alerts(results.assign(timestamp=datetime.now().isoformat()))
+        print(f"🌍 {n} locations simulated for {year} → alert store")
+        return n
+    except Exception as e:
+        print(f"⚠️ Could not save alert log: {e}")
+        return 0
+
+
+def simulate_batch(df, year, selected_disaster=None, seed=None, weather_fetcher=None, save=True,
+                   models=None, encoders=None, scaler=None, meta=None):
+    """Run iter_simulate_batch to completion and (optionally) append the run to the alert store."""
+    chunks = list(iter_simulate_batch(df, year, selected_disaster, seed, weather_fetcher,
+                                      models, encoders, scaler, meta))
+    if not chunks:
+        return pd.DataFrame()
+    results = pd.concat(chunks, ignore_index=True)
+    if save:
+        save_batch_alerts(results, year)
+    return results
@@ -0,0 +1,175 @@
+# thresholds.py — Configurable threshold rules evaluated as array operations over resources / blood
+
+import numpy as np
+import pandas as pd
+
+# Default rules (region "" = everywhere); a value at or below a threshold raises that level
+DEFAULT_THRESHOLDS = [
+    {"resource": "Volunteers",    "region": "", "warning": 70,  "critical": 10},
+    {"resource": "Trucks",        "region": "", "warning": 7,   "critical": 1},
+    {"resource": "Boats",         "region": "", "warning": 7,   "critical": 0},
+    {"resource": "MedKits",       "region": "", "warning": 100, "critical": 50},
+    {"resource": "FoodKits",      "region": "", "warning": 100, "critical": 100},
+    {"resource": "WaterKits",     "region": "", "warning": 100, "critical": 100},
+    {"resource": "BloodUnits",    "region": "", "warning": 0,   "critical": 0},
+    {"resource": "BloodDaysLeft", "region": "", "warning": 7,   "critical": -1},
+]
+
+RESOURCE_COLUMNS = ["Volunteers", "Trucks", "Boats", "MedKits", "FoodKits", "WaterKits"]
+BLOOD_COLUMNS = {"BloodUnits": "Units", "BloodDaysLeft": "DaysLeft"}
+
+WARNING, CRITICAL = 1, 2
+LEVEL_LABELS = np.array(["", "🟡 Warning", "🔴 Critical"], dtype=object)
+ALERT_COLUMNS = ["row", "Region", "Resource", "Current", "Threshold", "Severity", "Level"]
+
+
+def _region_key(values):
+    return pd.Series(values, dtype=object).fillna("").astype(str).str.strip().str.lower().to_numpy()
+
+
+def threshold_table(thresholds=None):
+    """Rules as a frame (resource, region key, warning, critical); DEFAULT_THRESHOLDS when None."""
+    t = pd.DataFrame(DEFAULT_THRESHOLDS if thresholds is None else thresholds,
+                     columns=["resource", "region", "warning", "critical"])
+    t["region"] = _region_key(t["region"])
+    for c in ("warning", "critical"):
+        t[c] = pd.to_numeric(t[c], errors="coerce")
+    return t
+
+
+def evaluate(frame, columns, thresholds=None, region_col="Region"):
+    """
+    Check every (row, resource) cell of frame at once. columns maps resource name ->
+    column of frame. Per cell the rule for (row region, resource) wins over the rule for
+    (everywhere, resource); cells with no rule or a NaN value never alert. Returns one
+    row per alerting cell: row (position in frame), Region, Resource, Current,
+    Threshold, Severity (1 warning / 2 critical), Level.
+    """
+    t = threshold_table(thresholds)
+    names = [r for r, c in columns.items() if c in frame.columns]
+    n = len(frame)
+    if not names or n == 0:
+        return pd.DataFrame(columns=ALERT_COLUMNS).astype(
+            {"row": np.int64, "Current": float, "Threshold": float, "Severity": np.int64})
+
+    values = np.column_stack([pd.to_numeric(frame[columns[r]], errors="coerce").to_numpy(dtype=float)
+                              for r in names])                                   # [rows, resources]
+    region = _region_key(frame[region_col]) if region_col in frame.columns else np.full(n, "", dtype=object)
+
+    # Rule lookup: (region, resource) first, then ("", resource), as one indexer each
+    rules = pd.MultiIndex.from_arrays([t["region"], t["resource"]])
+    t = t[~rules.duplicated(keep="last")]
+    rules = pd.MultiIndex.from_arrays([t["region"], t["resource"]])
+    cell_region = np.repeat(region, len(names))
+    cell_res = np.tile(np.array(names, dtype=object), n)
+    hit = rules.get_indexer(pd.MultiIndex.from_arrays([cell_region, cell_res]))
+    fallback = rules.get_indexer(pd.MultiIndex.from_arrays([np.full(len(cell_res), "", dtype=object), cell_res]))
+    hit = np.where(hit >= 0, hit, fallback)
+
+    warn = np.append(t["warning"].to_numpy(dtype=float), np.nan)[hit]            # hit == -1 -> NaN
+    crit = np.append(t["critical"].to_numpy(dtype=float), np.nan)[hit]
+    v = values.ravel()
+    severity = np.select([v <= crit, v <= warn], [CRITICAL, WARNING], 0)          # NaN compares False
+    cells = np.flatnonzero(severity)
+    rows = cells // len(names)
+    sev = severity[cells]
+    out = pd.DataFrame({
+        "row": rows,
+        "Region": frame[region_col].to_numpy()[rows] if region_col in frame.columns else "",
+        "Resource": cell_res[cells],
+        "Current": v[cells],
+        "Threshold": np.where(sev == CRITICAL, crit[cells], warn[cells]),
+        "Severity": sev,
+        "Level": LEVEL_LABELS[sev],
+    })
+    return out[ALERT_COLUMNS]
+
+
+def _valid_location(frame):
+    """Resource rows with a usable country and region (blank, "0", "None" and "nan" are not)."""
+    bad = {"", "0", "none", "nan"}
+    ok = np.ones(len(frame), dtype=bool)
+    for c in ("Country", "Region"):
+        if c in frame.columns:
+            ok &= ~pd.Series(frame[c], dtype=object).fillna("").astype(str).str.strip().str.lower().isin(bad).to_numpy()
+    return ok
+
+
+def resource_alerts(resources, thresholds=None):
+    """Alerts over the resources table (Region, Country + RESOURCE_COLUMNS), critical first."""
+    frame = resources.reset_index(drop=True)
+    out = evaluate(frame, {c: c for c in RESOURCE_COLUMNS}, thresholds)
+    out = out[_valid_location(frame)[out["row"].to_numpy()]] if len(out) else out
+    country = frame["Country"].astype(str).str.strip().to_numpy() if "Country" in frame.columns else ""
+    region = frame["Region"].astype(str).str.strip().to_numpy() if "Region" in frame.columns else ""
+    loc = pd.Series(country, dtype=object) + " - " + pd.Series(region, dtype=object)
+    out = out.assign(Location=loc.to_numpy()[out["row"].to_numpy()], Current=out["Current"].astype(int))
+    return out.sort_values("Severity", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def blood_alerts(expiry, thresholds=None):
+    """Alerts over an expiry_frame() of the blood inventory, with a Detail phrase and notification Message per alert."""
+    out = evaluate(expiry.reset_index(drop=True), BLOOD_COLUMNS, thresholds)
+    detail = blood_details(out)
+    return out.assign(Detail=detail, Message=["Blood inventory alert: %s." % d for d in detail])
+
+
+def blood_details(alerts):
+    """Short description of each blood_alerts() row ("units is 0", "expiring in 3 day(s)", ...)."""
+    days = alerts["Current"].to_numpy()
+    is_days = (alerts["Resource"] == "BloodDaysLeft").to_numpy()
+    msg = np.full(len(alerts), "", dtype=object)
+    msg[~is_days] = ["units is %d" % u for u in days[~is_days]]
+    expired = is_days & (days < 0)
+    soon = is_days & ~expired
+    msg[soon] = ["expiring in %d day(s)" % d for d in days[soon]]
+    msg[expired] = ["expired %d day(s) ago" % d for d in np.abs(days[expired])]
+    return msg
+
+
+# ---- transitions ----
+OK = 0
+DIGEST_AFTER = 3           # more transitions than this in one write become a single digest message
+STATE_KEY = ["entity", "Resource"]
+
+
+def transitions(previous, current):
+    """
+    Severity changes between a stored alert state and freshly evaluated alerts, both
+    frames with entity, Resource, Severity (current also Current, Threshold and
+    optionally Detail). A pair missing on either side is OK. Returns one row per
+    change with Previous and Severity; Severity OK means resolved.
+    """
+    current = current.sort_values("Severity", ascending=False, kind="stable").drop_duplicates(STATE_KEY)
+    prev = previous[STATE_KEY + ["Severity"]].rename(columns={"Severity": "Previous"})
+    m = current.merge(prev, on=STATE_KEY, how="outer")
+    m["Severity"] = m["Severity"].fillna(OK).astype(int)
+    m["Previous"] = m["Previous"].fillna(OK).astype(int)
+    return m[m["Severity"] != m["Previous"]].reset_index(drop=True)
+
+
+def _transition_text(r, label):
+    if r.Severity == OK:
+        return "%s alert resolved: %s %s is back above its threshold." % (label, r.entity, r.Resource)
+    detail = getattr(r, "Detail", None)
+    if not isinstance(detail, str) or not detail:
+        detail = "%s at %g (threshold %g)" % (r.Resource, r.Current, r.Threshold)
+    level = "critical" if r.Severity == CRITICAL else "warning"
+    if r.Severity < r.Previous:
+        level = "eased to " + level
+    return "%s alert (%s): %s %s." % (label, level, r.entity, detail)
+
+
+def transition_messages(changes, label, noun="record(s)", max_items=DIGEST_AFTER):
+    """Notification texts for transitions(): one per change up to max_items, else one digest."""
+    if changes.empty:
+        return []
+    if len(changes) <= max_items:
+        return [_transition_text(r, label) for r in changes.itertuples(index=False)]
+    sev, prev = changes["Severity"].to_numpy(), changes["Previous"].to_numpy()
+    parts = [("%d now critical", int((sev == CRITICAL).sum())),
+             ("%d now warning", int(((sev == WARNING) & (prev < WARNING)).sum())),
+             ("%d eased to warning", int(((sev == WARNING) & (prev == CRITICAL)).sum())),
+             ("%d resolved", int((sev == OK).sum()))]
+    text = ", ".join(p % n for p, n in parts if n)
+    return ["%s alerts: %s across %d %s." % (label, text, changes["entity"].nunique(), noun)]
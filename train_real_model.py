@@ -11,12 +11,13 @@ from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.pipeline import Pipeline
 import joblib
+from orange_io import read_orange_csv
 
 MODELS_DIR = Path("models")
 MODELS_DIR.mkdir(exist_ok=True, parents=True)
 
 print("Loading disaster data...")
-df = pd.read_csv('Asia_1900_2021_DISASTERS.csv')
+df = read_orange_csv('Asia_1900_2021_DISASTERS.csv')   # drops the Orange type/flag rows
 print(f"Loaded {len(df)} rows")
 
 TARGET = 'Disaster Type'
@@ -31,7 +32,8 @@ for col in numeric_features:
         df[col] = pd.to_numeric(df[col], errors='coerce')
         
 df[numeric_features] = df[numeric_features].fillna(0)
-df[categorical_features] = df[categorical_features].fillna('Unknown')
+df[categorical_features] = df[categorical_features].astype(object).fillna('Unknown')
+df[TARGET] = df[TARGET].astype(object)
 
 print(f"After cleaning: {len(df)} rows")
 print(f"\nDisaster types in dataset:")
@@ -0,0 +1,174 @@
+# weather_provider.py — Cached, pooled weather lookups with pluggable backends
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import db
+
+WEATHER_COLUMNS = ["city", "temperature", "humidity", "pressure", "wind_speed", "weather"]
+DEFAULT_TTL = 15 * 60          # seconds a cached reading stays fresh
+DEFAULT_TIMEOUT = (3.05, 5)    # (connect, read) seconds
+MAX_WORKERS = 8
+
+OPENWEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+OPENWEATHER_API_KEY_ENV = "OPENWEATHER_API_KEY"
+
+
+class OpenWeatherBackend:
+    """OpenWeather current-weather API over one pooled, retrying session."""
+
+    def __init__(self, api_key=None, url=OPENWEATHER_URL, timeout=DEFAULT_TIMEOUT,
+                 session=None, pool_size=MAX_WORKERS):
+        self.api_key = api_key or os.getenv(OPENWEATHER_API_KEY_ENV)
+        if not self.api_key:
+            raise RuntimeError(f"No OpenWeather API key: set {OPENWEATHER_API_KEY_ENV}, "
+                               "or AIDBOT_WEATHER_FIXTURE to use recorded responses.")
+        self.url = url              # point at a local fixture server for offline runs
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=Retry(total=2, backoff_factor=0.3,
+                                                status_forcelist=(429, 500, 502, 503, 504)))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def fetch(self, city):
+        r = self.session.get(self.url, params={"q": city, "appid": self.api_key, "units": "metric"},
+                             timeout=self.timeout)
+        return r.json()
+
+
+class FixtureBackend:
+    """Recorded responses from a JSON file {city: api_response}; for offline use and tests."""
+
+    def __init__(self, path):
+        with open(path, "r") as f:
+            self.responses = {k.strip().lower(): v for k, v in json.load(f).items()}
+
+    def fetch(self, city):
+        return self.responses.get(city.strip().lower(), {"cod": "404", "message": "city not found"})
+
+
+def parse_response(city, data):
+    """Flatten an OpenWeather payload to a WEATHER_COLUMNS record (None values on error)."""
+    if "main" not in data or "wind" not in data:
+        return {"city": city, **dict.fromkeys(WEATHER_COLUMNS[1:])}
+    return {
+        "city": data.get("name", city),
+        "temperature": data["main"]["temp"],
+        "humidity": data["main"]["humidity"],
+        "pressure": data["main"]["pressure"],
+        "wind_speed": data["wind"]["speed"],
+        "weather": data["weather"][0]["main"],
+    }
+
+
+class WeatherProvider:
+    """
+    TTL-cached weather by city: in-process memory first, then the SQLite weather_cache
+    table, then the backend. Misses in a bulk request are fetched concurrently.
+    Failed lookups are returned but never cached.
+    """
+
+    def __init__(self, backend=None, ttl=DEFAULT_TTL, use_db=True, max_workers=MAX_WORKERS):
+        self.backend = backend or OpenWeatherBackend()
+        self.ttl = ttl
+        self.use_db = use_db
+        self.max_workers = max_workers
+        self._mem = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, keys):
+        now = time.time()
+        with self._lock:
+            hits = {k: rec for k, (ts, rec) in ((k, self._mem[k]) for k in keys if k in self._mem)
+                    if now - ts < self.ttl}
+        missing = [k for k in keys if k not in hits]
+        if missing and self.use_db:
+            try:
+                from_db = db.get_cached_weather(missing, self.ttl)
+            except sqlite3.Error:
+                from_db = {}
+            with self._lock:
+                self._mem.update(from_db)              # keep the stored fetch time, not now
+            hits.update({k: rec for k, (_, rec) in from_db.items()})
+        return hits
+
+    def _store(self, records):
+        good = {k: rec for k, rec in records.items() if rec.get("temperature") is not None}
+        now = time.time()
+        with self._lock:
+            self._mem.update({k: (now, rec) for k, rec in good.items()})
+        if good and self.use_db:
+            try:
+                db.put_cached_weather(good)
+            except sqlite3.Error:
+                pass
+
+    def _fetch(self, city):
+        try:
+            rec = parse_response(city, self.backend.fetch(city))
+            if rec["temperature"] is None:
+                print(f"⚠️ No weather data for {city}")
+            return rec
+        except (requests.RequestException, ValueError, KeyError, IndexError, TypeError) as e:
+            print(f"⚠️ Weather request failed for {city}: {e}")
+            return {"city": city, **dict.fromkeys(WEATHER_COLUMNS[1:])}
+
+    def iter_many(self, cities):
+        """Yield (city, record) for each distinct city: cache hits first, then fetches as they finish."""
+        by_key = {}
+        for c in cities:
+            by_key.setdefault(str(c).strip().lower(), str(c))
+        hits = self._cached(list(by_key))
+        for k, rec in hits.items():
+            yield by_key[k], rec
+        misses = [k for k in by_key if k not in hits]
+        if not misses:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(misses))) as pool:
+            futures = {pool.submit(self._fetch, by_key[k]): k for k in misses}
+            for fut in as_completed(futures):
+                k = futures[fut]
+                rec = fut.result()
+                self._store({k: rec})
+                yield by_key[k], rec
+
+    def get_many(self, cities):
+        """DataFrame with one WEATHER_COLUMNS row per distinct city (plus the queried name)."""
+        rows = [{"query": c, **rec} for c, rec in self.iter_many(cities)]
+        return pd.DataFrame(rows, columns=["query", *WEATHER_COLUMNS])
+
+    def get(self, city):
+        return next(self.iter_many([city]))[1]
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_provider():
+    """
+    Process-wide provider. AIDBOT_WEATHER_FIXTURE=<file.json> swaps in recorded
+    responses; otherwise the OpenWeather backend needs OPENWEATHER_API_KEY (RuntimeError
+    without it) and AIDBOT_WEATHER_URL points it at another server.
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            fixture = os.getenv("AIDBOT_WEATHER_FIXTURE")
+            if fixture:
+                backend = FixtureBackend(fixture)
+            else:
+                backend = OpenWeatherBackend(url=os.getenv("AIDBOT_WEATHER_URL", OPENWEATHER_URL))
+            _default = WeatherProvider(backend)
+        return _default